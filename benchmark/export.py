@@ -0,0 +1,126 @@
+"""
+Time a full export against a synthetic foundation.
+
+    python -m benchmark.export --orgs 20 --spaces 10 --users 2000 --latency 0.005
+
+The fake CF and UAA APIs run in a separate process, so that neither
+their CPU time nor their memory is accounted to the exporter.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import requests
+from cfconfigurator.cf import CF
+
+from exporter.exporter import Exporter
+from exporter.transport import Transport
+from exporter.profiling import timings
+from exporter.mutations import TerraformMutation, CFConfiguratorMutation
+from exporter.pipeline import MutationPipeline
+from exporter.writers import TerraformWriter, ManifestWriter
+from exporter.run import env
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+def serve(args, queue):
+    foundation = FakeFoundation(orgs=args.orgs, spaces=args.spaces, users=args.users,
+                                security_groups=args.security_groups)
+    server = FakeAPIServer(foundation, latency=args.latency)
+    queue.put(server.url)
+    server.serve_forever()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Timer(object):
+
+    def __init__(self):
+        self.phases = []
+
+    def __call__(self, name, fn, *args, **kwargs):
+        start = time.time()
+        result = fn(*args, **kwargs)
+        self.phases.append((name, time.time() - start))
+        return result
+
+
+def run(args, api_url):
+    output = tempfile.mkdtemp(prefix="exporter-benchmark-")
+    timer = Timer()
+    try:
+        client = timer("info", CF, api_url)
+        timer("login", client.login, "admin", "admin")
+        exp = Exporter(client, concurrency=args.concurrency, page_size=args.page_size,
+                       transport=Transport(pool_size=max(args.concurrency, 10)))
+        timer("generate_manifest", exp.generate_manifest)
+        with open(os.path.join(output, "manifest.yml"), "w") as stream:
+            pipeline = MutationPipeline()
+            pipeline.register(TerraformMutation(exp.manifest), TerraformWriter(
+                os.path.join(output, "terraform"), env, "benchmark"))
+            pipeline.register(CFConfiguratorMutation(exp.manifest), ManifestWriter(
+                stream, env.get_template('manifest.j2')))
+            timer("mutate_and_write", pipeline.run, exp.manifest)
+    finally:
+        shutil.rmtree(output)
+    return timer.phases
+
+
+def report(args, phases, stats):
+    print("Foundation: %i orgs x %i spaces, %i users, latency %.1fms, concurrency %i" % (
+        args.orgs, args.spaces, args.users, args.latency * 1000, args.concurrency))
+    for name, elapsed in phases:
+        print("  %-26s %9.3fs" % (name, elapsed))
+    print("  %-26s %9.3fs" % ("total", sum(elapsed for name, elapsed in phases)))
+    print(timings.report(sum(elapsed for name, elapsed in phases)))
+    print("Requests: %i (%.1f KB)" % (stats["requests"], stats["bytes"] / 1024.0))
+    for endpoint, count in sorted(stats["endpoints"].items(), key=lambda e: -e[1]):
+        print("  %-52s %7i" % (endpoint, count))
+    print("Peak RSS: %.1f MB" % peak_rss_mb())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orgs", type=int, default=10)
+    parser.add_argument("--spaces", type=int, default=5, help="spaces per org")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--security-groups", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to every API request")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(args, queue))
+    server.daemon = True
+    server.start()
+    try:
+        api_url = queue.get(timeout=300)
+        phases = run(args, api_url)
+        stats = requests.get(api_url + "/_stats").json()
+    finally:
+        server.terminate()
+
+    if args.json:
+        print(json.dumps({"phases": dict(phases), "requests": stats,
+                          "peak_rss_mb": peak_rss_mb()}, indent=2))
+    else:
+        report(args, phases, stats)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Synthetic Cloud Foundry and UAA APIs for benchmarking the exporter.
+
+The responses are rendered with the fixture templates and the `*APIMock`
+classes used by the unit tests, the foundation generated has `orgs` orgs
+with `spaces` spaces each and `users` users spread over those spaces.
+"""
+import re
+import json
+import time
+import threading
+import collections
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs, urlencode
+
+from test.test_helper import (
+    UserAPIMock, UserUAAAPIMock, FeatureFlagsAPIMock, OrganizationAPIMock,
+    SpaceAPIMock, QuotaAPIMock, SecGroupAPIMock, SecGroupsAPIMock,
+    PrivateDomainAPIMock, OrgSpacesAPIMock
+)
+
+GUID_RE = re.compile(r"/[0-9a-z]+-[0-9a-z-]+")
+QUERY_RE = re.compile(r"^(\w+)(:| IN )(.*)$")
+UAA_ID_RE = re.compile(r'id eq "([^"]+)"')
+ROLE_LISTING_RE = re.compile(
+    r"^/v2/(organizations|spaces)/[^/]+/(users|managers|billing_managers|auditors|developers)$")
+
+USER_RELATIONS = [
+    "organizations", "managed_organizations", "billing_managed_organizations",
+    "audited_organizations", "spaces", "managed_spaces", "audited_spaces"
+]
+SECURITY_GROUP_RELATIONS = ["spaces", "staging_spaces"]
+
+# like the CF API, relations holding more resources are left as urls
+MAX_INLINE_RELATIONS = 50
+
+
+def listing(resources):
+    return {
+        "total_results": len(resources),
+        "total_pages": 1,
+        "prev_url": None,
+        "next_url": None,
+        "resources": resources
+    }
+
+
+def reference(guid, name):
+    return {"metadata": {"guid": guid}, "entity": {"name": name}}
+
+
+class FakeFoundation(object):
+
+    """
+    @brief      Generate the API responses of a synthetic foundation
+    """
+
+    space_roles = ["developers", "managers", "auditors"]
+
+    def __init__(self, orgs=2, spaces=2, users=10, security_groups=3):
+        self.responses = {}
+        self.uaa_users = collections.OrderedDict()
+        self._relations = collections.defaultdict(list)
+
+        user_configs = [{
+            "guid": "user-%06i-guid" % i,
+            "userName": "user-%06i@example.com" % i,
+            "email": "user-%06i@example.com" % i,
+            "externalId": "user-%06i" % i,
+            "space_guid": "space-%04i-%04i-guid" % (i % orgs, (i // orgs) % spaces)
+        } for i in range(users)]
+
+        asg_configs = [{
+            "guid": "asg-%04i-guid" % i,
+            "name": "asg-%04i" % i,
+            "running_default": i == 0
+        } for i in range(security_groups)]
+
+        quota = {"guid": "quota-0000-guid", "name": "default"}
+        self.register_response(
+            "/v2/quota_definitions", listing([QuotaAPIMock(quota, self).dump()]))
+        self.register_response(
+            "/v2/security_groups",
+            json.loads(SecGroupsAPIMock().get_response(asg_configs)))
+
+        org_bodies = []
+        space_configs = []
+        for o in range(orgs):
+            org_config = {
+                "guid": "org-%04i-guid" % o,
+                "name": "org-%04i" % o,
+                "quota_guid": quota["guid"]
+            }
+            mock_org = OrganizationAPIMock(org_config, self)
+            org_users = user_configs[o::orgs]
+            mock_org.add_users(org_users)
+            mock_org.add_managers(org_users[:1])
+            mock_org.add_billing_managers([])
+            mock_org.add_auditors(org_users[1:2])
+            self.add_relations(org_users, "organizations", org_config)
+            self.add_relations(org_users[:1], "managed_organizations", org_config)
+            self.add_relations(org_users[1:2], "audited_organizations", org_config)
+            mock_org.add_domain(PrivateDomainAPIMock({
+                "guid": "domain-%04i-guid" % o,
+                "name": "org-%04i.example.com" % o,
+                "org_guid": org_config["guid"]
+            }, self))
+
+            for s in range(spaces):
+                space_config = {
+                    "guid": "space-%04i-%04i-guid" % (o, s),
+                    "name": "space-%04i" % s,
+                    "org_guid": org_config["guid"]
+                }
+                mock_space = SpaceAPIMock(space_config, self)
+                space_users = org_users[s::spaces]
+                for r, role in enumerate(self.space_roles):
+                    members = space_users[r::len(self.space_roles)]
+                    getattr(mock_space, "add_%s" % role)(members)
+                    relation = "spaces" if role == "developers" else (
+                        "managed_spaces" if role == "managers" else "audited_spaces")
+                    self.add_relations(members, relation, space_config)
+                for asg in asg_configs:
+                    mock_space.add_sec_group(SecGroupAPIMock(asg, self))
+                mock_space.dump()
+                mock_org.add_space(mock_space)
+                space_configs.append(space_config)
+
+            body = mock_org.dump()
+            # the organization fixture has a hard coded name
+            body["entity"]["name"] = org_config["name"]
+            org_bodies.append(body)
+
+        self.register_response("/v2/organizations", listing(org_bodies))
+        spaces = json.loads(OrgSpacesAPIMock().get_response(space_configs))
+        self.register_response("/v2/spaces", spaces)
+        # every space is bound to every group
+        for asg in asg_configs:
+            self.register_response(
+                "/v2/security_groups/%s/spaces" % asg["guid"], spaces)
+            self.register_response(
+                "/v2/security_groups/%s/staging_spaces" % asg["guid"], listing([]))
+
+        cf_users = []
+        for user in user_configs:
+            cf_user = json.loads(UserAPIMock().get_response(user))
+            cf_user["entity"]["username"] = user["userName"]
+            cf_users.append(cf_user)
+            self.register_response("/v2/users/%s" % user["guid"], cf_user)
+            self.uaa_users[user["guid"]] = json.loads(UserUAAAPIMock().get_response(user))
+            for relation in USER_RELATIONS:
+                self.register_response(
+                    "/v2/users/%s/%s" % (user["guid"], relation),
+                    listing(self._relations[(user["guid"], relation)]))
+        self.register_response("/v2/users", listing(cf_users))
+        # the role listings hold the same user resources as /v2/users
+        cf_users_by_guid = {user["metadata"]["guid"]: user for user in cf_users}
+        for url, response in self.responses.items():
+            if ROLE_LISTING_RE.match(url):
+                response["resources"] = [cf_users_by_guid[user["metadata"]["guid"]]
+                                         for user in response["resources"]]
+
+        self.register_response("/v2/config/feature_flags", json.loads(
+            FeatureFlagsAPIMock().get_response([
+                {"name": "user_org_creation", "enabled": False},
+                {"name": "diego_docker", "enabled": True}
+            ])))
+        self.register_response("/v2/config/environment_variable_groups/staging", {})
+        self.register_response("/v2/config/environment_variable_groups/running", {})
+        self.register_response("/v2/shared_domains", listing(
+            [reference("shared-domain-guid", "apps.example.com")]))
+
+    def register_response(self, url, response):
+        self.responses[url] = response
+
+    def add_relations(self, users, relation, config):
+        for user in users:
+            self._relations[(user["guid"], relation)].append(
+                reference(config["guid"], config["name"]))
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, avoid waiting on delayed acks
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.path.startswith("/uaa/oauth/token"):
+            return self.reply({"token_type": "bearer", "access_token": "fake-token"})
+        return self.not_found()
+
+    def do_GET(self):
+        self.server.delay()
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        path = parsed.path
+
+        if path == "/_stats":
+            return self.reply(self.server.stats())
+        if path == "/v2/info":
+            return self.reply({"token_endpoint": self.server.url + "/uaa"})
+        if path.startswith("/uaa/Users"):
+            return self.uaa_users(path, params)
+
+        body = self.server.foundation.responses.get(path)
+        if body is None:
+            return self.not_found()
+        if "resources" in body:
+            body = self.page(path, body, params)
+        return self.reply(body)
+
+    def page(self, path, body, params):
+        per_page = int(params.get("results-per-page", 50))
+        page = int(params.get("page", 1))
+        resources = body["resources"]
+        if "q" in params:
+            field, operator, value = QUERY_RE.match(params["q"]).groups()
+            values = value.split(",") if operator == " IN " else [value]
+            resources = [r for r in resources if r["entity"].get(field) in values]
+            body = dict(body, total_results=len(resources))
+        total_pages = max(1, (len(resources) + per_page - 1) // per_page)
+        resources = resources[(page - 1) * per_page:page * per_page]
+
+        if params.get("inline-relations-depth") == "1":
+            if path == "/v2/users" or ROLE_LISTING_RE.match(path):
+                resources = self.inline(resources, "/v2/users", USER_RELATIONS)
+            elif path == "/v2/security_groups":
+                resources = self.inline(resources, path, SECURITY_GROUP_RELATIONS)
+
+        def page_url(number):
+            query = dict(params, page=number)
+            query["results-per-page"] = per_page
+            return "%s?%s" % (path, urlencode(sorted(query.items())))
+
+        return dict(body, resources=resources, total_pages=total_pages,
+                    next_url=page_url(page + 1) if page < total_pages else None,
+                    prev_url=page_url(page - 1) if page > 1 else None)
+
+    def inline(self, resources, path, relations):
+        responses = self.server.foundation.responses
+        inlined = []
+        for resource in resources:
+            entity = dict(resource["entity"])
+            for relation in relations:
+                url = "%s/%s/%s" % (path, resource["metadata"]["guid"], relation)
+                related = responses[url]["resources"]
+                if len(related) <= MAX_INLINE_RELATIONS:
+                    entity[relation] = related
+            inlined.append(dict(resource, entity=entity))
+        return inlined
+
+    def uaa_users(self, path, params):
+        users = self.server.foundation.uaa_users
+        if path == "/uaa/Users":
+            start = int(params.get("startIndex", 1))
+            count = int(params.get("count", 100))
+            resources = list(users.values())
+            ids = UAA_ID_RE.findall(params.get("filter", ""))
+            if ids:
+                resources = [users[user_id] for user_id in ids if user_id in users]
+            total = len(resources)
+            resources = resources[start - 1:start - 1 + count]
+            return self.reply({"resources": resources, "startIndex": start,
+                               "itemsPerPage": count, "totalResults": total})
+        user = users.get(path.rsplit("/", 1)[1])
+        if user is None:
+            return self.not_found()
+        return self.reply(user)
+
+    def not_found(self):
+        self.reply({"code": 10000, "description": "Unknown request",
+                    "error_code": "CF-NotFound"}, 404)
+
+    def reply(self, body, code=200):
+        payload = json.dumps(body).encode("utf-8")
+        self.server.record(self.path, len(payload))
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeAPIServer(ThreadingMixIn, HTTPServer):
+
+    """
+    @brief      Serve a FakeFoundation over HTTP, adding `latency` seconds per request
+
+    Requests are counted by endpoint and can be read from `/_stats`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, foundation, latency=0.0, host="127.0.0.1", port=0):
+        HTTPServer.__init__(self, (host, port), FakeAPIHandler)
+        self.foundation = foundation
+        self.latency = latency
+        self.url = "http://%s:%i" % self.server_address
+        self._lock = threading.Lock()
+        self._requests = collections.Counter()
+        self._bytes = 0
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def record(self, path, size):
+        if path.startswith("/_stats"):
+            return
+        endpoint = GUID_RE.sub("/:guid", urlparse(path).path)
+        with self._lock:
+            self._requests[endpoint] += 1
+            self._bytes += size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": sum(self._requests.values()),
+                "bytes": self._bytes,
+                "endpoints": dict(self._requests)
+            }
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,85 @@
+"""
+Time the field mappings of the mutations, interpreted and planned.
+
+    python -m benchmark.mutations --records 100000
+
+Every record goes through the spec of the Terraform users, quotas and
+spaces, once with `ManifestMutation.map_fields`, which interprets the
+spec for every field of every record, and once with its `FieldMapping`.
+"""
+import gc
+import sys
+import json
+import time
+import argparse
+import collections
+
+from exporter.mutations import ManifestMutation, TerraformMutation
+
+
+def records(kind, count):
+    for i in range(count):
+        if kind == "user_fields":
+            yield {"guid": "user-%06i-guid" % i, "name": "user-%06i@example.com" % i,
+                   "password": "None", "origin": "uaa", "given_name": "Given %i" % i,
+                   "family_name": "Family %i" % i, "email": "user-%06i@example.com" % i}
+        elif kind == "quota_fields":
+            yield {"guid": "quota-%06i-guid" % i, "name": "quota-%06i" % i,
+                   "non_basic_services_allowed": bool(i % 2), "memory_limit": 10240,
+                   "total_routes": 1000, "total_services": 100,
+                   "instance_memory_limit": -1, "app_instance_limit": -1}
+        else:
+            roles = [{"name": "user-%06i@example.com" % (i + r)} for r in range(3)]
+            yield {"guid": "space-%06i-guid" % i, "name": "space-%06i" % i,
+                   "quota": None, "allow_ssh": True, "security_groups": ["public"],
+                   "managers": roles, "developers": roles, "auditors": roles}
+
+
+def interpreted(mapping, sources):
+    mutation = ManifestMutation({})
+    dests = []
+    for source in sources:
+        dest = collections.OrderedDict()
+        mutation.map_fields(dest, source, mapping.fields)
+        mutation.map_list_fields(dest, source, mapping.list_fields)
+        dests.append(dest)
+    return dests
+
+
+def planned(mapping, sources):
+    return mapping.apply_all(sources)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    report = collections.OrderedDict()
+    for kind in ("user_fields", "quota_fields", "space_fields"):
+        mapping = getattr(TerraformMutation({}), kind)
+        sources = list(records(kind, args.records))
+        timings = collections.OrderedDict()
+        for name, run in (("interpreted", interpreted), ("planned", planned)):
+            # like timeit, leave the garbage collector out of the measure
+            gc.collect()
+            gc.disable()
+            start = time.time()
+            run(mapping, sources)
+            timings[name] = time.time() - start
+            gc.enable()
+        timings["speedup"] = timings["interpreted"] / timings["planned"]
+        report[kind] = timings
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for kind, timings in report.items():
+            print("%-14s %i records: interpreted %.3fs, planned %.3fs (%.1fx)" % (
+                kind, args.records, timings["interpreted"], timings["planned"],
+                timings["speedup"]))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
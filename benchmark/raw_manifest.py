@@ -0,0 +1,90 @@
+"""
+Time the raw manifest saved and loaded as JSON and in the binary format.
+
+    python -m benchmark.raw_manifest --orgs 20 --spaces 10 --users 20000
+
+The raw manifest is exported once from the fake API, then saved to and
+loaded from a `.json` and a `.bin` file with `save_raw_manifest` and
+`load_raw_manifest`.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import collections
+
+from cfconfigurator.cf import CF
+
+from exporter.exporter import Exporter
+from exporter.manifest import save_raw_manifest, load_raw_manifest
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+def export(args):
+    foundation = FakeFoundation(orgs=args.orgs, spaces=args.spaces, users=args.users)
+    server = FakeAPIServer(foundation).start()
+    try:
+        client = CF(server.url)
+        client.login("admin", "admin")
+        exp = Exporter(client, concurrency=8)
+        exp.generate_manifest()
+        return exp.manifest, exp.exported_at
+    finally:
+        server.stop()
+
+
+def measure(fn, *args):
+    # like timeit, leave the garbage collector out of the measure
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.time()
+        result = fn(*args)
+        return result, time.time() - start
+    finally:
+        gc.enable()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orgs", type=int, default=20)
+    parser.add_argument("--spaces", type=int, default=10, help="spaces per org")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    manifest, exported_at = export(args)
+    folder = tempfile.mkdtemp()
+    report = collections.OrderedDict()
+    try:
+        for extension in (".json", ".bin"):
+            path = os.path.join(folder, "raw" + extension)
+            _, save_seconds = measure(save_raw_manifest, path, manifest, exported_at)
+            (loaded, _), load_seconds = measure(load_raw_manifest, path)
+            report[extension] = collections.OrderedDict([
+                ("bytes", os.path.getsize(path)),
+                ("save", save_seconds),
+                ("load", load_seconds),
+                ("identical", loaded == manifest)
+            ])
+    finally:
+        shutil.rmtree(folder)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for extension, r in report.items():
+            print("%-5s %9i bytes: save %.3fs, load %.3fs, %s" % (
+                extension, r["bytes"], r["save"], r["load"],
+                "identical" if r["identical"] else "DIFFERENT"))
+    return 0 if all(r["identical"] for r in report.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
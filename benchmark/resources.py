@@ -0,0 +1,103 @@
+"""
+Time and measure the memory of loading resources from API bodies.
+
+    python -m benchmark.resources --users 50000 --rules 100000
+
+No API is involved: the bodies are generated in memory and the resources
+are loaded the way the Exporter does, keeping only their `asdict()`.
+"""
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+from exporter.exporter import User, SecurityGroup
+
+
+class NoFetcher(object):
+
+    def get_entities(self, url):
+        raise AssertionError("unexpected request for %s" % url)
+
+
+def user_bodies(count):
+    for i in range(count):
+        guid = "user-%06i-guid" % i
+        cf_user = {"metadata": {"guid": guid},
+                   "entity": {"username": "user-%06i@example.com" % i}}
+        uaa_user = {
+            "id": guid,
+            "userName": "user-%06i@example.com" % i,
+            "externalId": "user-%06i" % i,
+            "origin": "uaa",
+            "active": True,
+            "name": {"givenName": "Given %i" % i, "familyName": "Family %i" % i},
+            "emails": [{"value": "user-%06i@example.com" % i, "primary": False}],
+            "groups": [{"value": "group-%i" % g, "display": "group.%i" % g} for g in range(10)],
+            "meta": {"version": 0, "created": "2017-01-01T00:00:00.000Z"}
+        }
+        yield uaa_user, cf_user
+
+
+def security_group_bodies(groups, rules):
+    for g in range(groups):
+        yield {
+            "metadata": {"guid": "asg-%04i-guid" % g},
+            "entity": {
+                "name": "asg-%04i" % g,
+                "running_default": False,
+                "staging_default": False,
+                "rules": [{
+                    "protocol": "tcp",
+                    "destination": "10.%i.%i.0/24" % (g % 256, r % 256),
+                    "ports": "443",
+                    "description": "rule %i" % r
+                } for r in range(rules // groups)]
+            }
+        }
+
+
+def load_all(args):
+    fetcher = NoFetcher()
+    users = []
+    for uaa_user, cf_user in user_bodies(args.users):
+        u = User(uaa_user, cf_response=cf_user, fetcher=fetcher)
+        u.load()
+        users.append(u.asdict())
+    groups = []
+    for group in security_group_bodies(args.groups, args.rules):
+        g = SecurityGroup(group['entity'], group['metadata'])
+        g.load()
+        groups.append(g.asdict())
+    return users, groups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--rules", type=int, default=100000)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    load_all(args)
+    elapsed = time.time() - start
+
+    tracemalloc.start()
+    manifest = load_all(args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report = {"load_seconds": elapsed, "retained_mb": current / 2.0 ** 20,
+              "peak_mb": peak / 2.0 ** 20}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("Loaded %i users and %i rules in %.3fs" % (args.users, args.rules, elapsed))
+        print("Retained %.1f MB, peak %.1f MB" % (report["retained_mb"], report["peak_mb"]))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
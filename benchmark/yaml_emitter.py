@@ -0,0 +1,102 @@
+"""
+Time the YAML of the CF configurator manifest, pyaml against the fast emitter.
+
+    python -m benchmark.yaml_emitter --users 20000 --orgs 200 --spaces 10
+
+The records are shaped like the ones of the CFConfiguratorMutation,
+every section is dumped by `pyaml.dump` and by `dump_section`, and
+both outputs must be byte for byte the same.
+"""
+import gc
+import sys
+import json
+import time
+import argparse
+import collections
+
+import pyaml
+
+from exporter.yaml_emitter import dump_section
+
+OrderedDict = collections.OrderedDict
+
+
+def users(count):
+    return [OrderedDict([
+        ("name", "user-%06i@example.com" % i),
+        ("origin", "uaa"),
+        ("given_name", "Given %i" % i),
+        ("family_name", "Family %i" % i),
+        ("email", "user-%06i@example.com" % i)
+    ]) for i in range(count)]
+
+
+def orgs(count, spaces, users):
+    def roles(seed):
+        return [{"name": "user-%06i@example.com" % ((seed + r) % max(users, 1))}
+                for r in range(3)]
+
+    return [OrderedDict([
+        ("name", "org-%04i" % o),
+        ("quota", "default"),
+        ("managers", roles(o)),
+        ("billing_managers", roles(o + 1)),
+        ("auditors", roles(o + 2)),
+        ("spaces", [OrderedDict([
+            ("org", "org-%04i" % o),
+            ("name", "space-%02i" % s),
+            ("allow_ssh", bool(s % 2)),
+            ("security_groups", ["public_networks", "dns"]),
+            ("managers", roles(o + s)),
+            ("developers", roles(o + s + 1)),
+            ("auditors", roles(o + s + 2))
+        ]) for s in range(spaces)])
+    ]) for o in range(count)]
+
+
+def measure(fn, *args):
+    # like timeit, leave the garbage collector out of the measure
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.time()
+        result = fn(*args)
+        return result, time.time() - start
+    finally:
+        gc.enable()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--orgs", type=int, default=200)
+    parser.add_argument("--spaces", type=int, default=10, help="spaces per org")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    report = OrderedDict()
+    for section, records in (("cf_users", users(args.users)),
+                             ("cf_orgs", orgs(args.orgs, args.spaces, args.users))):
+        expected, pyaml_seconds = measure(pyaml.dump, {section: records})
+        actual, emitter_seconds = measure(dump_section, section, records)
+        report[section] = OrderedDict([
+            ("records", len(records)),
+            ("bytes", len(actual)),
+            ("pyaml", pyaml_seconds),
+            ("emitter", emitter_seconds),
+            ("speedup", pyaml_seconds / emitter_seconds),
+            ("identical", actual == expected)
+        ])
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for section, r in report.items():
+            print("%-9s %6i records, %9i bytes: pyaml %.3fs, emitter %.3fs (%.1fx), %s" % (
+                section, r["records"], r["bytes"], r["pyaml"], r["emitter"], r["speedup"],
+                "identical" if r["identical"] else "DIFFERENT"))
+    return 0 if all(r["identical"] for r in report.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+Asyncio counterpart of the blocking exporter.
+
+The whole tree of API resources is fetched ahead, from a single thread,
+with at most `concurrency` requests in flight, then the manifest is
+built by the regular resource classes out of the prefetched responses.
+The HTTP client is aiohttp, which is an optional dependency.
+"""
+import time
+import asyncio
+import functools
+import itertools
+import collections
+
+from cfconfigurator.uaa import UAAException
+
+from .exceptions import ExporterException
+from .cache import ResponseCache
+from .profiling import current_timings, recording
+from .exporter import (
+    Exporter, ResourceFetcher, UAAResourceFetcher, ResourceParser,
+    Organization, Space, RoleIndex, SecurityGroupIndex, SpaceDirectory, PreviousExport,
+    paged_url, uaa_user_filters, TIMESTAMP_FORMAT
+)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncResourceFetcher(object):
+
+    """
+    @brief      Non blocking fetcher of CF (or UAA) API responses
+
+    Every url is requested once, the response, with all the pages of a
+    listing concatenated like `CF.request` does, is kept for the
+    lifetime of the fetcher. The pages after the first one are
+    requested concurrently.
+    """
+
+    def __init__(self, client, page_size=None, concurrency=100, relogin=None):
+        self._client = client
+        self._page_size = page_size
+        self._concurrency = concurrency
+        self._relogin = relogin or getattr(client, '_login', None)
+        self._semaphore = None
+        self._login_lock = None
+        self._session = None
+        self._responses = collections.OrderedDict()
+
+    @property
+    def responses(self):
+        """
+        @brief      The `(body, status_code)` responses fetched so far, by url
+        """
+        return collections.OrderedDict(
+            (url, future.result()) for url, future in self._responses.items()
+            if future.done() and future.exception() is None)
+
+    async def get_raw(self, resource_url):
+        response = await self.response(resource_url)
+        return response[0]
+
+    async def get_resources(self, resource_url):
+        body = await self.get_raw(resource_url)
+        return ResourceParser.extract_resources(body)
+
+    async def get_entities(self, resource_url):
+        body = await self.get_raw(resource_url)
+        return ResourceParser.extract_entities(body)
+
+    def response(self, resource_url):
+        """
+        @brief      Future of the `(body, status_code)` response for `resource_url`
+        """
+        future = self._responses.get(resource_url)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(resource_url))
+            self._responses[resource_url] = future
+        return future
+
+    async def wait(self):
+        """
+        @brief      Wait for all the requests started so far
+        """
+        await asyncio.gather(*list(self._responses.values()))
+
+    async def _fetch(self, resource_url):
+        url = paged_url(resource_url, self._page_size)
+        body, code = await self.request(url)
+        if code != 200 or 'resources' not in body or not body.get('next_url'):
+            return body, code
+        separator = '&' if '?' in url else '?'
+        pages = await asyncio.gather(*[
+            self.request("%s%spage=%i" % (url, separator, page))
+            for page in range(2, body.get('total_pages', 1) + 1)])
+        resources = list(body['resources'])
+        for page_body, page_code in pages:
+            if page_code != 200:
+                return page_body, page_code
+            resources.extend(page_body['resources'])
+        body = dict(body, resources=resources, next_url=None, prev_url=None)
+        return body, 200
+
+    async def request(self, url, params=None):
+        """
+        @brief      Request a single url, logging in again once if the token expired
+        """
+        if url.startswith('/'):
+            url = self._client.api_url + url
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._login_lock = asyncio.Lock()
+        async with self._semaphore:
+            headers = dict(self._client.session.headers)
+            body, code = await self._http_get(url, params, headers)
+            if code == 401 and self._relogin is not None:
+                await self._login(headers)
+                headers = dict(self._client.session.headers)
+                body, code = await self._http_get(url, params, headers)
+        return body, code
+
+    async def _login(self, stale_headers):
+        async with self._login_lock:
+            # another request may have renewed the token meanwhile
+            if self._client.session.headers.get('Authorization') == \
+                    stale_headers.get('Authorization'):
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(None, self._relogin)
+
+    async def _http_get(self, url, params, headers):
+        session = self._get_session()
+        async with session.get(url, params=params, headers=headers) as resp:
+            try:
+                body = await resp.json(content_type=None)
+            except ValueError:
+                body = {}
+            return body or {}, resp.status
+
+    def _get_session(self):
+        if aiohttp is None:
+            raise ExporterException(
+                "The asyncio exporter requires the aiohttp package")
+        if self._session is None:
+            ssl = None if self._client.session.verify else False
+            connector = aiohttp.TCPConnector(limit=self._concurrency, ssl=ssl)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncUAAResourceFetcher(AsyncResourceFetcher):
+
+    """
+    @brief      Non blocking fetcher of UAA users
+    """
+
+    def __init__(self, client, page_size=500, concurrency=100, relogin=None):
+        super(AsyncUAAResourceFetcher, self).__init__(
+            client, concurrency=concurrency, relogin=relogin)
+        self._page_size = page_size
+        self.users = {}
+        self.errors = {}
+
+    async def index_users(self, modified_since=None, ids=None):
+        """
+        @brief      Index by id all the UAA users, or the ones modified since a date
+
+        The first page gives the number of users, the others are then
+        requested concurrently. With `ids`, only those users are listed.
+        """
+        filters = uaa_user_filters(modified_since, ids, UAAResourceFetcher.ids_per_filter)
+        index = {}
+        for pages in await asyncio.gather(*[self.list_users(f) for f in filters]):
+            for body, code in pages:
+                if code != 200:
+                    raise UAAException(body, code)
+                for user in body.get('resources', []):
+                    index[user['id']] = user
+        return index
+
+    async def list_users(self, scim_filter):
+        url = self._client.api_url + self._client.user_url
+        params = {'startIndex': 1, 'count': self._page_size}
+        if scim_filter is not None:
+            params['filter'] = scim_filter
+        body, code = await self.request(url, params)
+        return [(body, code)] + await asyncio.gather(*[
+            self.request(url, dict(params, startIndex=start))
+            for start in range(1 + self._page_size,
+                               body.get('totalResults', 0) + 1, self._page_size)])
+
+    async def get_user(self, user_id):
+        url = self._client.api_url + self._client.user_url + '/' + str(user_id)
+        body, code = await self.request(url)
+        if code == 200:
+            self.users[user_id] = body
+        else:
+            self.errors[user_id] = (body, code)
+        return body
+
+
+class PrefetchedResourceFetcher(ResourceFetcher):
+
+    """
+    @brief      ResourceFetcher serving the responses of an AsyncResourceFetcher
+
+    Listings are served as a single page, urls which were not prefetched,
+    or whose request failed, are requested with the blocking client.
+    """
+
+    def __init__(self, client, responses, page_size=None):
+        super(PrefetchedResourceFetcher, self).__init__(
+            client, page_size=page_size, cache=ResponseCache(sizer=None))
+        for url, response in responses.items():
+            if response[1] == 200:
+                self.cache.put(url, response)
+
+    def iter_pages(self, resource_url):
+        if resource_url not in self.cache:
+            for page in super(PrefetchedResourceFetcher, self).iter_pages(resource_url):
+                yield page
+            return
+        yield self.get_resources(resource_url) or []
+
+
+class PrefetchedUAAFetcher(UAAResourceFetcher):
+
+    """
+    @brief      UAAResourceFetcher serving the users of an AsyncUAAResourceFetcher
+    """
+
+    def __init__(self, client, index, users, errors, page_size=500):
+        super(PrefetchedUAAFetcher, self).__init__(client, page_size=page_size)
+        self._index = index
+        self._users = users
+        self._errors = errors
+
+    def index_users(self, modified_since=None, ids=None):
+        return self._index
+
+    def get_user(self, user_id):
+        if user_id in self._users:
+            return self._users[user_id]
+        if user_id in self._errors:
+            raise UAAException(*self._errors[user_id])
+        return super(PrefetchedUAAFetcher, self).get_user(user_id)
+
+
+class AsyncExporter(Exporter):
+
+    """
+    @brief      Exporter whose `generate_manifest` is a coroutine
+
+    `concurrency` bounds the number of requests in flight, the resources
+    are then built out of the prefetched responses in the default executor
+    of the loop, which keeps serving other tasks meanwhile. Call `close`
+    once done with the exporter.
+    """
+
+    def __init__(self, client, concurrency=100, page_size=None, uaa_page_size=500,
+                 **kwargs):
+        super(AsyncExporter, self).__init__(
+            client, page_size=page_size, uaa_page_size=uaa_page_size, **kwargs)
+        self._page_size = page_size
+        self._uaa_page_size = uaa_page_size
+        self.async_fetcher = AsyncResourceFetcher(
+            client, page_size=page_size, concurrency=concurrency)
+        self.async_uaa_fetcher = AsyncUAAResourceFetcher(
+            client.uaa, page_size=uaa_page_size, concurrency=concurrency,
+            relogin=client._login)
+
+    async def generate_manifest(self, previous=None, since=None):
+        # stamped before any listing is fetched, the changes made while the
+        # prefetch runs are newer and the next incremental export sees them
+        self.exported_at = time.strftime(TIMESTAMP_FORMAT, time.gmtime())
+        if previous is not None and since is not None:
+            self._previous = PreviousExport(previous, since)
+        uaa_index = await self.prefetch()
+        self.fetcher = PrefetchedResourceFetcher(
+            self._client, self.async_fetcher.responses, page_size=self._page_size)
+        self.uaa_fetcher = PrefetchedUAAFetcher(
+            self._uaa_client, uaa_index, self.async_uaa_fetcher.users,
+            self.async_uaa_fetcher.errors, page_size=self._uaa_page_size)
+        # blocking, the urls which were not prefetched are requested as well
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, functools.partial(
+            self._export_sections, current_timings()))
+
+    def _export_sections(self, timer):
+        # the phases go to the timer of the thread running the loop
+        with recording(timer):
+            self.export_sections()
+
+    async def prefetch(self):
+        """
+        @brief      Fetch every response the export needs, level by level
+
+        @return     the UAA users index
+        """
+        fetcher = self.async_fetcher
+        selection = self.selection
+        query = ""
+        if self._bulk_roles:
+            query = "?inline-relations-depth=1"
+        for resource_type, url in [
+                ("feature_flags", "/v2/config/feature_flags"),
+                ("staging_environment_variables",
+                 "/v2/config/environment_variable_groups/staging"),
+                ("running_environment_variables",
+                 "/v2/config/environment_variable_groups/running"),
+                ("shared_domains", "/v2/shared_domains")]:
+            if selection.includes_type(resource_type):
+                fetcher.response(url)
+        # the spaces look their groups up in this listing
+        fetcher.response(SecurityGroupIndex.url)
+        if self._previous is not None or (
+                selection.includes_type("users") and not selection.selects_orgs):
+            fetcher.response("/v2/spaces")
+
+        orgs, quotas = await asyncio.gather(
+            fetcher.get_resources(selection.orgs_url()),
+            fetcher.get_resources("/v2/quota_definitions"))
+        orgs = [org for org in orgs or [] if selection.includes_org(org['entity']['name'])]
+        users, ids = [], None
+        directory = SpaceDirectory()
+        if selection.includes_type("users"):
+            if selection.selects_orgs:
+                users = await self.prefetch_org_users(orgs, query)
+                ids = [user['metadata']['guid'] for user in users]
+                spaces = await asyncio.gather(*[
+                    fetcher.get_resources(org['entity']['spaces_url']) for org in orgs])
+            else:
+                users = await fetcher.get_resources("/v2/users" + query)
+                spaces = [await fetcher.get_resources("/v2/spaces")]
+            # the same directory the users resolve their default space in
+            for org in orgs:
+                directory.add_org(org)
+            for space in itertools.chain.from_iterable(s or [] for s in spaces):
+                directory.add_space(space)
+        if not selection.includes_type("orgs"):
+            orgs = []
+
+        uaa_index = {}
+        if self._uaa_bulk and selection.includes_type("users"):
+            since = self._previous.since if self._previous else None
+            uaa_index = await self.async_uaa_fetcher.index_users(
+                modified_since=since, ids=ids)
+
+        if self._previous is not None:
+            spaces = await fetcher.get_resources("/v2/spaces")
+            self._previous.detect_changed_orgs(spaces or [], quotas or [])
+
+        for group in await fetcher.get_resources(SecurityGroupIndex.url) or []:
+            if 'spaces' not in group['entity'] and 'spaces_url' in group['entity']:
+                fetcher.response(group['entity']['spaces_url'])
+        await asyncio.gather(
+            *[self.prefetch_user(user, uaa_index, directory) for user in users or []] +
+            [self.prefetch_org(org) for org in orgs])
+        await fetcher.wait()
+        return uaa_index
+
+    async def prefetch_org_users(self, orgs, query):
+        urls = ["%s%s" % (org['entity']["%s_url" % user_type], query)
+                for org in orgs for user_type in Organization.user_types
+                if "%s_url" % user_type in org['entity']]
+        users = collections.OrderedDict()
+        for listing in await asyncio.gather(*[self.async_fetcher.get_resources(url)
+                                              for url in urls]):
+            for user in listing or []:
+                users.setdefault(user['metadata']['guid'], user)
+        return list(users.values())
+
+    async def prefetch_user(self, user, uaa_index, directory):
+        guid = user['metadata']['guid']
+        entity = user['entity']
+        if guid not in uaa_index:
+            if self._previous is not None and \
+                    self._previous.previous_user(user) is not None:
+                return
+            await self.async_uaa_fetcher.get_user(guid)
+        if self._bulk_roles and 'username' in entity:
+            for relation in RoleIndex.relations:
+                if relation not in entity and "%s_url" % relation in entity:
+                    self.async_fetcher.response(entity["%s_url" % relation])
+        if 'default_space_url' in entity and \
+                directory.names(entity.get('default_space_guid')) is None:
+            space = await self.async_fetcher.get_entities(entity['default_space_url'])
+            if space and 'organization_url' in space:
+                await self.async_fetcher.response(space['organization_url'])
+
+    async def prefetch_org(self, org):
+        previous = None
+        if self._previous is not None:
+            previous = self._previous.previous_org(org)
+        fetcher = self.async_fetcher
+        entity = org['entity']
+        urls = ["private_domains_url"]
+        if previous is None:
+            urls.append("quota_definition_url")
+        if not self._bulk_roles:
+            urls += ["%s_url" % user_type for user_type in Organization.user_types]
+        for url in urls:
+            if url in entity:
+                fetcher.response(entity[url])
+        if previous is not None:
+            # the spaces are copied, their roles are read again
+            spaces = [{'entity': Organization.space_urls(space['guid'])}
+                      for space in previous.get('spaces', [])]
+        else:
+            spaces = await fetcher.get_resources(entity['spaces_url'])
+        urls = []
+        if not self._bulk_roles:
+            urls = ["%s_url" % user_type for user_type in Space.user_types]
+        for space in spaces or []:
+            for url in urls:
+                if url in space['entity']:
+                    fetcher.response(space['entity'][url])
+
+    async def close(self):
+        await self.async_fetcher.close()
+        await self.async_uaa_fetcher.close()
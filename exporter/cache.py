@@ -0,0 +1,325 @@
+import json
+import time
+import sqlite3
+import threading
+import collections
+
+
+def json_size(response):
+    """
+    @brief      Estimate the size in bytes of a `(body, status_code)` response
+    """
+    return len(json.dumps(response[0]))
+
+
+def parse_ttls(spec):
+    """
+    @brief      Parse a `prefix=seconds` list separated by `,` or `;`
+    """
+    ttls = {}
+    for expr in spec.replace(';', ',').split(','):
+        if '=' not in expr:
+            continue
+        prefix, seconds = expr.rsplit('=', 1)
+        ttls[prefix.strip()] = float(seconds)
+    return ttls
+
+
+def sort_ttls(ttls):
+    # longest prefixes first so that the most specific ttl wins
+    return sorted((ttls or {}).items(), key=lambda t: -len(t[0]))
+
+
+def prefix_ttl(sorted_ttls, key, default=None):
+    for prefix, seconds in sorted_ttls:
+        if key.startswith(prefix):
+            return seconds
+    return default
+
+
+def successful(response):
+    """
+    @brief      Only successful `(body, status_code)` responses are worth caching
+    """
+    return response[1] == 200
+
+
+class CacheStats(object):
+
+    """
+    @brief      Counters describing how a cache has been used
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    def asdict(self):
+        return collections.OrderedDict([
+            ("hits", self.hits),
+            ("misses", self.misses),
+            ("evictions", self.evictions),
+            ("bytes", self.bytes)
+        ])
+
+    def __str__(self):
+        return "%i hits, %i misses, %i evictions, %i bytes" % (
+            self.hits, self.misses, self.evictions, self.bytes)
+
+
+class _Flight(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache(object):
+
+    """
+    @brief      Thread safe LRU cache for API responses
+
+    The cache is bounded by number of entries and/or by the estimated
+    size of the stored responses, entries can expire according to the
+    TTL configured for the longest matching url prefix and concurrent
+    requests for the same key are deduplicated so that only one of
+    them reaches the API.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttls=None,
+                 sizer=json_size, cacheable=successful, clock=time.time):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttls = sort_ttls(ttls)
+        self._sizer = sizer
+        self._cacheable = cacheable
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def ttl(self, key):
+        return prefix_ttl(self._ttls, key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def get_or_fetch(self, key, fetch):
+        """
+        @brief      Return the cached value for `key`, calling `fetch` on a miss
+
+        Callers asking for a key which is already being fetched wait
+        for the outcome of that request instead of issuing their own.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.stats.hits += 1
+                return entry[0]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._in_flight[key] = flight
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+        except BaseException as exc:
+            # ExporterException derives from BaseException as well, the
+            # waiters get whatever the leader got
+            flight.error = exc
+            with self._lock:
+                del self._in_flight[key]
+            flight.event.set()
+            raise
+
+        try:
+            store = self._cacheable(flight.value)
+            size = self._size(flight.value) if store else 0
+        except BaseException as exc:
+            flight.error = exc
+            store = False
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if store:
+                    self._store(key, flight.value, size)
+            flight.event.set()
+        return flight.value
+
+    def put(self, key, value):
+        size = self._size(value)
+        with self._lock:
+            self._store(key, value, size)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.stats.bytes = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires = entry
+        if expires is not None and expires <= self._clock():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _size(self, value):
+        return self._sizer(value) if self._sizer else 0
+
+    def _store(self, key, value, size):
+        if key in self._entries:
+            self._discard(key)
+        ttl = self.ttl(key)
+        expires = self._clock() + ttl if ttl is not None else None
+        self._entries[key] = (value, size, expires)
+        self.stats.bytes += size
+        self._evict()
+
+    def _discard(self, key):
+        value, size, expires = self._entries.pop(key)
+        self.stats.bytes -= size
+
+    def _evict(self):
+        while self._entries and (
+                (self._max_entries and len(self._entries) > self._max_entries) or
+                (self._max_bytes and self.stats.bytes > self._max_bytes)):
+            key, (value, size, expires) = self._entries.popitem(last=False)
+            self.stats.bytes -= size
+            self.stats.evictions += 1
+
+
+class StoredResponse(object):
+
+    def __init__(self, url, body, stored_at):
+        self.url = url
+        self.body = body
+        self.stored_at = stored_at
+
+
+class StoreStats(object):
+
+    """
+    @brief      Counters describing how a persistent store has been used
+    """
+
+    def __init__(self):
+        self.fresh = 0
+        self.refetched = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.writes = 0
+
+    def __str__(self):
+        return ("%i fresh, %i refetched (%i changed, %i unchanged), %i writes" %
+                (self.fresh, self.refetched, self.changed, self.unchanged, self.writes))
+
+
+class ResponseStore(object):
+
+    """
+    @brief      Persistent SQLite store of API response bodies keyed by url
+
+    The store is purely time based: bodies are stored along with the time
+    they were stored, responses younger than the max age configured for
+    their url prefix are reused as they are, older ones are requested
+    again. The Cloud Controller v2 API does not answer conditional
+    requests with a 304, hence no revalidation is attempted.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            stored_at REAL NOT NULL
+        )"""
+
+    def __init__(self, path, max_age=0, ttls=None, commit_every=100,
+                 clock=time.time):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(self.schema)
+        self._max_age = max_age
+        self._ttls = sort_ttls(ttls)
+        self._commit_every = commit_every
+        self._pending = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.stats = StoreStats()
+
+    def max_age(self, url):
+        return prefix_ttl(self._ttls, url, self._max_age)
+
+    def get(self, url):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, stored_at FROM responses WHERE url = ?",
+                (url,)).fetchone()
+        if row is None:
+            return None
+        return StoredResponse(url, json.loads(row[0]), row[1])
+
+    def is_fresh(self, stored):
+        return stored.stored_at + self.max_age(stored.url) > self._clock()
+
+    def put(self, url, body):
+        row = (url, json.dumps(body), self._clock())
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (url, body, stored_at) VALUES (?, ?, ?)",
+                row)
+            self.stats.writes += 1
+            self._pending += 1
+            if self._pending >= self._commit_every:
+                self._connection.commit()
+                self._pending = 0
+
+    def fetch(self, url, request):
+        """
+        @brief      Serve `url` from the store, requesting it again when stale
+
+        `request(url)` performs the actual API call and returns a
+        `(body, status_code)` tuple.
+        """
+        stored = self.get(url)
+        if stored is not None and self.is_fresh(stored):
+            self.stats.fresh += 1
+            return stored.body, 200
+
+        body, code = request(url)
+        if stored is not None:
+            self.stats.refetched += 1
+            if code == 200:
+                if body == stored.body:
+                    self.stats.unchanged += 1
+                else:
+                    self.stats.changed += 1
+        if code == 200:
+            self.put(url, body)
+        return body, code
+
+    def close(self):
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskRunner(object):
+
+    """
+    @brief      Run independent loading tasks on a pool of worker threads
+
+    Results are always returned in the order the items were submitted,
+    regardless of the order in which the tasks complete, so that the
+    generated manifest stays deterministic.
+    A runner with a single worker runs every task in the calling thread.
+    """
+
+    def __init__(self, workers=1):
+        self._workers = workers
+        self._executor = None
+        if workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def map(self, fn, items):
+        """
+        @brief      Apply `fn` to every item and return the ordered results
+        """
+        if self._executor is None:
+            return [fn(item) for item in items]
+        return list(self._executor.map(fn, items))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
@@ -10,3 +10,35 @@ admin_password = os.environ.get("EXPORTER_ADMIN_PASSWORD", None)
 output_file = os.environ.get("EXPORTER_OUTPUT_FILE", "output")
 output_format = os.environ.get("EXPORTER_OUTPUT_FORMAT", "cf_configurator")
 exclude_env_vars = os.environ.get("EXPORTER_EXCLUDE_ENV_VARS", "")
+include_orgs = os.environ.get("EXPORTER_INCLUDE_ORGS", "")
+exclude_orgs = os.environ.get("EXPORTER_EXCLUDE_ORGS", "")
+include_types = os.environ.get("EXPORTER_INCLUDE_TYPES", "")
+exclude_types = os.environ.get("EXPORTER_EXCLUDE_TYPES", "")
+page_size = int(os.environ.get("EXPORTER_PAGE_SIZE", "100"))
+concurrency = int(os.environ.get("EXPORTER_CONCURRENCY", "1"))
+uaa_bulk = os.environ.get("EXPORTER_UAA_BULK", "true").lower() in ("true", "yes", "1")
+uaa_page_size = int(os.environ.get("EXPORTER_UAA_PAGE_SIZE", "500"))
+cache_max_entries = int(os.environ.get("EXPORTER_CACHE_MAX_ENTRIES", "0"))
+cache_max_bytes = int(os.environ.get("EXPORTER_CACHE_MAX_BYTES", "0"))
+cache_ttls = os.environ.get("EXPORTER_CACHE_TTLS", "")
+cache_db = os.environ.get("EXPORTER_CACHE_DB", None)
+cache_db_max_age = float(os.environ.get("EXPORTER_CACHE_DB_MAX_AGE", "0"))
+cache_db_ttls = os.environ.get("EXPORTER_CACHE_DB_TTLS", "")
+raw_manifest = os.environ.get("EXPORTER_RAW_MANIFEST", None)
+from_raw_manifest = os.environ.get("EXPORTER_FROM_RAW_MANIFEST", "false").lower() in ("true", "yes", "1")
+incremental = os.environ.get("EXPORTER_INCREMENTAL", "false").lower() in ("true", "yes", "1")
+bulk_roles = os.environ.get("EXPORTER_BULK_ROLES", "false").lower() in ("true", "yes", "1")
+pool_size = int(os.environ.get("EXPORTER_POOL_SIZE", str(max(concurrency, 10))))
+http_compression = os.environ.get("EXPORTER_HTTP_COMPRESSION", "true").lower() in ("true", "yes", "1")
+metrics_file = os.environ.get("EXPORTER_METRICS_FILE", None)
+profile = os.environ.get("EXPORTER_PROFILE", None)
+profile_file = os.environ.get("EXPORTER_PROFILE_FILE", None)
+targets_file = os.environ.get("EXPORTER_TARGETS_FILE", None)
+targets_concurrency = int(os.environ.get("EXPORTER_TARGETS_CONCURRENCY", "0"))
+max_requests = int(os.environ.get("EXPORTER_MAX_REQUESTS", "0"))
+rate_limit = float(os.environ.get("EXPORTER_RATE_LIMIT", "0"))
+rate_burst = int(os.environ.get("EXPORTER_RATE_BURST", "0"))
+max_retries = int(os.environ.get("EXPORTER_MAX_RETRIES", "5"))
+retry_backoff = float(os.environ.get("EXPORTER_RETRY_BACKOFF", "0.5"))
+snapshot = os.environ.get("EXPORTER_SNAPSHOT", None)
+replay = os.environ.get("EXPORTER_REPLAY", None)
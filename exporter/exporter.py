@@ -1,16 +1,34 @@
 from cfconfigurator.cf import CFException
 from cfconfigurator.uaa import UAAException
 from .exceptions import ExporterException
+from .concurrency import TaskRunner
+from .cache import ResponseCache
+from .profiling import timed_phases
+from .selection import Selection, RESOURCE_TYPES
 
 import re
 import sys
+import time
 import logging
+import calendar
 import collections
 import functools
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def paged_url(resource_url, page_size):
+    """
+    @brief      Add a page size to a listing url, unless it has one already
+    """
+    if not page_size or 'results-per-page=' in resource_url:
+        return resource_url
+    separator = '&' if '?' in resource_url else '?'
+    return "%s%sresults-per-page=%i" % (resource_url, separator, page_size)
+
 
 class ResourceParser(object):
 
@@ -31,36 +49,19 @@ class ResourceParser(object):
         return [obj['metadata'] for obj in body['resources']]
 
 
-class Memoize(object):
-
-    def __init__(self, make_request):
-        self.make_request = make_request
-        self.memo = {}
-
-    def __call__(self, o_self, resource_url):
-        if resource_url not in self.memo:
-            response = self.make_request(o_self, resource_url)
-
-            if response[1] == 200:
-                self.memo[resource_url] = response
-            else:
-                return response
-
-        return self.memo[resource_url]
-
-    def __get__(self, instance, owner):
-        from functools import partial
-        return partial(self.__call__, instance)
-
-
 class ResourceFetcher(object):
 
     """
     @brief      Help fetching resources from Cloudfoundry
     """
 
-    def __init__(self, client):
+    def __init__(self, client, page_size=None, cache=None, store=None):
         self._client = client
+        self._page_size = page_size
+        if cache is None:
+            cache = ResponseCache()
+        self.cache = cache
+        self.store = store
 
     def get_raw(self, resource_url):
         response = self.response(resource_url)
@@ -90,21 +91,282 @@ class ResourceFetcher(object):
         body = response[0]
         return ResourceParser.extract_metadata(body)
 
-    @Memoize
+    def iter_pages(self, resource_url):
+        """
+        @brief      Lazily walk a paginated listing following `next_url`
+
+        Every page is requested only when the previous one has been
+        consumed, so that at most one page of resources is held in memory.
+        """
+        url = self.paged_url(resource_url)
+        while url:
+            body = self.page(url)
+            yield ResourceParser.extract_resources(body) or []
+            url = body.get('next_url')
+
+    def iter_resources(self, resource_url):
+        """
+        @brief      Stream the `resources` of a listing, page by page
+        """
+        for page in self.iter_pages(resource_url):
+            for resource in page:
+                yield resource
+
+    def iter_entities(self, resource_url):
+        """
+        @brief      Stream the `entities` of a listing, page by page
+        """
+        for resource in self.iter_resources(resource_url):
+            yield resource['entity']
+
+    def paged_url(self, resource_url):
+        """
+        @brief      Add the configured page size to a listing url
+        """
+        return paged_url(resource_url, self._page_size)
+
+    def page(self, page_url):
+        """
+        @brief      Fetch a single page of a listing without following `next_url`
+
+        `CF.request` eagerly concatenates all the pages of a listing, hence
+        the lower level `CF._request` is used here.
+        """
+        url = page_url
+        if url.startswith('/'):
+            url = self._client.api_url + url
+        try:
+            body, code = self._client._request("GET", url)
+        except CFException as cfe:
+            logger.error(str(cfe))
+            raise
+        if code != 200:
+            raise CFException(body, code)
+        return body
+
     def response(self, resource_url):
+        """
+        @brief      Get the `(body, status_code)` response, successful ones are cached
+        """
+        return self.cache.get_or_fetch(
+            resource_url, functools.partial(self.request, resource_url))
+
+    def request(self, resource_url):
+        """
+        @brief      Request `resource_url`, going through the persistent store if any
+        """
+        if self.store is not None:
+            return self.store.fetch(resource_url, self._get)
+        return self._get(resource_url)
+
+    def _get(self, resource_url):
         try:
             return self._client.request("GET", resource_url)
         except CFException as cfe:
-            logger.err(str(cfe))
+            logger.error(str(cfe))
             raise
 
 
+class UAAResourceFetcher(object):
+
+    """
+    @brief      Help fetching users from UAA
+    """
+
+    # ids listed per SCIM filter, which keeps the query string short
+    ids_per_filter = 50
+
+    def __init__(self, client, page_size=500):
+        self._client = client
+        self._page_size = page_size
+
+    def get_user(self, user_id):
+        return self._client.user_get(user_id)
+
+    def iter_users(self, scim_filter=None):
+        """
+        @brief      Lazily walk the SCIM `/Users` listing
+
+        Pages are requested by `startIndex` and `count` until
+        `totalResults` users have been returned.
+        """
+        url = self._client.api_url + self._client.user_url
+        start_index = 1
+        while True:
+            params = {'startIndex': start_index, 'count': self._page_size}
+            if scim_filter is not None:
+                params['filter'] = scim_filter
+            try:
+                body, code = self._client._request("GET", url, params)
+            except UAAException as uaaexp:
+                logger.error(str(uaaexp))
+                raise
+            users = body.get('resources', [])
+            for user in users:
+                yield user
+            start_index += len(users)
+            if len(users) == 0 or start_index > body.get('totalResults', 0):
+                return
+
+    def index_users(self, modified_since=None, ids=None):
+        """
+        @brief      Index by id all the UAA users, or the ones modified since a date
+
+        With `ids`, only those users are listed, a chunk of them at a time.
+        """
+        index = {}
+        for scim_filter in uaa_user_filters(modified_since, ids, self.ids_per_filter):
+            index.update((user['id'], user) for user in self.iter_users(scim_filter))
+        return index
+
+
+def uaa_user_filters(modified_since=None, ids=None, ids_per_filter=50):
+    """
+    @brief      The SCIM filters listing the users modified since a date, or some users only
+    """
+    since_filter = None
+    if modified_since is not None:
+        since_filter = 'meta.lastModified gt "%s"' % modified_since
+    if ids is None:
+        return [since_filter]
+    filters = []
+    for start in range(0, len(ids), ids_per_filter):
+        scim_filter = " or ".join(
+            'id eq "%s"' % user_id for user_id in ids[start:start + ids_per_filter])
+        if since_filter is not None:
+            scim_filter = "(%s) and %s" % (scim_filter, since_filter)
+        filters.append(scim_filter)
+    return filters
+
+
+class RoleIndex(object):
+
+    """
+    @brief      Inverted index from org and space guids to their users by role
+
+    The index is fed with the resources of `/v2/users?inline-relations-depth=1`,
+    which inline the orgs and spaces where every user holds a role, so that
+    orgs and spaces do not need to list their users role by role.
+    """
+
+    relations = collections.OrderedDict([
+        ("organizations", "users"),
+        ("managed_organizations", "managers"),
+        ("billing_managed_organizations", "billing_managers"),
+        ("audited_organizations", "auditors"),
+        ("spaces", "developers"),
+        ("managed_spaces", "managers"),
+        ("audited_spaces", "auditors")
+    ])
+
+    def __init__(self):
+        self._roles = collections.defaultdict(list)
+
+    def add_user(self, user, fetcher):
+        """
+        @brief      Index the roles of a `/v2/users` resource
+
+        Relations holding too many resources to be inlined by the API
+        are fetched from their url.
+        """
+        entity = user['entity']
+        if 'username' not in entity:
+            return
+        for relation, role in self.relations.items():
+            if relation in entity:
+                resources = entity[relation]
+            elif "%s_url" % relation in entity:
+                resources = fetcher.iter_resources(entity["%s_url" % relation])
+            else:
+                continue
+            for resource in resources:
+                self._roles[(resource['metadata']['guid'], role)].append(
+                    entity['username'])
+
+    def users(self, guid, role):
+        return [{'name': name} for name in self._roles.get((guid, role), [])]
+
+
+class SecurityGroupIndex(object):
+
+    """
+    @brief      Index from space guids to the security groups bound to them
+
+    The index is fed with the resources of `url`, which inline the spaces
+    every group is bound to, so that spaces do not need to list their
+    groups one by one. The running default groups apply to every space,
+    they are left out like when listed from the spaces.
+    """
+
+    url = "/v2/security_groups?inline-relations-depth=1"
+
+    def __init__(self, groups, fetcher):
+        self._names = collections.defaultdict(list)
+        for group in groups:
+            entity = group['entity']
+            if entity['running_default'] is not False:
+                continue
+            if 'spaces' in entity:
+                spaces = entity['spaces']
+            elif 'spaces_url' in entity:
+                spaces = fetcher.iter_resources(entity['spaces_url'])
+            else:
+                continue
+            for space in spaces:
+                self._names[space['metadata']['guid']].append(entity['name'])
+
+    def groups(self, space_guid):
+        return [{'name': name} for name in self._names.get(space_guid, [])]
+
+
+class SpaceDirectory(object):
+
+    """
+    @brief      Names of the spaces and of their orgs, by space guid
+
+    Filled from the spaces and orgs listings, so that users resolve their
+    default space and org without requesting them one by one.
+    """
+
+    def __init__(self):
+        self._orgs = {}
+        self._spaces = {}
+
+    def __len__(self):
+        return len(self._spaces)
+
+    def add_org(self, org):
+        self._orgs[org['metadata']['guid']] = org['entity']['name']
+
+    def add_space(self, space):
+        entity = space['entity']
+        self._spaces[space['metadata']['guid']] = (entity['name'], entity['organization_guid'])
+
+    def names(self, space_guid):
+        """
+        @return     the `(space name, org name)` of a space, None if not listed
+        """
+        space = self._spaces.get(space_guid)
+        if space is None or space[1] not in self._orgs:
+            return None
+        return space[0], self._orgs[space[1]]
+
+
 class BaseResource(object):
 
     """
     @brief      Base Class for a generic CF Resource
+
+    Resources are slotted and their properties are loaded into a plain
+    dict, the API bodies and the fetcher are released once loaded, so
+    that only the `asdict()` of the many resources of a foundation is
+    kept around.
     """
 
+    __slots__ = ('_prop_dict', '_fetcher', '_config')
+
+    properties = []
+
     def __init__(self, *config_dicts, **kwargs):
         """
         @brief      Constructs the Resource object.
@@ -113,10 +375,24 @@ class BaseResource(object):
         @param      config_dicts  The configuration dicts
         @param      fetcher       The fetcher
         """
-        self._prop_dict = collections.OrderedDict()
+        self._prop_dict = {}
         self._fetcher = kwargs.get('fetcher', None)
         self._config = config_dicts
 
+    @classmethod
+    def accessors(cls):
+        """
+        @brief      The `(property, computed)` pairs to load, computed once per class
+
+        Properties which are not defined by the class are read from the
+        configuration dicts directly instead of going through `__getattr__`.
+        """
+        accessors = cls.__dict__.get('_accessors')
+        if accessors is None:
+            accessors = tuple((prop, hasattr(cls, prop)) for prop in cls.properties)
+            cls._accessors = accessors
+        return accessors
+
     def lookup(self, name):
         """
         @brief         looks up the name variable
@@ -138,6 +414,9 @@ class BaseResource(object):
         Try to find the variable in the list of dictionaries passed to this
         instance contructor begore raising a AttributeError
         """
+        if name.startswith('_'):
+            # an unset slot, never a configuration variable
+            raise AttributeError(name)
         return self.lookup(name)
 
     def load(self):
@@ -145,12 +424,23 @@ class BaseResource(object):
         Parse the configuration and load the variables into the
         self._prop_dict instance dictionary
         """
-        for prop in self.properties:
+        prop_dict = self._prop_dict
+        for prop, computed in self.accessors():
             try:
-                value = getattr(self, prop)
-                self._prop_dict[prop] = value
+                if computed:
+                    prop_dict[prop] = getattr(self, prop)
+                else:
+                    prop_dict[prop] = self.lookup(prop)
             except AttributeError as ate:
                 pass
+        self.release()
+
+    def release(self):
+        """
+        @brief      Drop the references to the API bodies and the fetcher
+        """
+        self._config = ()
+        self._fetcher = None
 
     def asdict(self):
         """
@@ -167,6 +457,9 @@ class FeatureFlag(BaseResource):
 
     https://docs.cloudfoundry.org/adminguide/listing-feature-flags.html
     """
+
+    __slots__ = ()
+
     properties = ["name",
                   "value"
                   ]
@@ -188,6 +481,9 @@ class Vars(BaseResource):
     `name`: `value` pairs where name is the name of the variable
     and value its value
     """
+
+    __slots__ = ('exclude_vars',)
+
     properties = []
 
     def __init__(self, *config_dicts, **kwargs):
@@ -221,6 +517,8 @@ class Quota(BaseResource):
     Docs: https://docs.cloudfoundry.org/adminguide/quota-plans.html
      """
 
+    __slots__ = ()
+
     properties = [
         "guid",
                             "name",
@@ -246,6 +544,10 @@ class Space(BaseResource):
 
     Docs: https://docs.cloudfoundry.org/concepts/roles.html#spaces
     """
+
+    __slots__ = ('_roles', '_security_group_index', '_security_groups',
+                 'developers', 'managers', 'auditors')
+
     user_types = [
         "developers",
                             "managers",
@@ -264,6 +566,8 @@ class Space(BaseResource):
 
     def __init__(self, *config_dicts,  **kwargs):
         super(Space, self).__init__(*config_dicts, **kwargs)
+        self._roles = kwargs.get('roles', None)
+        self._security_group_index = kwargs.get('security_groups', None)
         self._security_groups = []
 
     @property
@@ -274,6 +578,9 @@ class Space(BaseResource):
         """
         @brief      extract and parse the security groups
         """
+        if self._security_group_index is not None:
+            self._security_groups = self._security_group_index.groups(self.lookup("guid"))
+            return
         url = self.lookup("security_groups_url")
         groups = self._fetcher.get_entities(url)
         if groups is None:
@@ -294,17 +601,20 @@ class Space(BaseResource):
         @brief      extract and parse the users for this space
         """
         for user_type in self.user_types:
-            url_string = "%s_url" % user_type
-            try:
-                url = self.lookup(url_string)
-                users = self._fetcher.get_entities(url)
-            except AttributeError as ate:
-                logger.err(str(ate))
-                continue
-            user_list = []
-            for user in users:
-                if 'username' in user:
-                    user_list.append({'name': user['username']})
+            if self._roles is not None:
+                user_list = self._roles.users(self.lookup("guid"), user_type)
+            else:
+                url_string = "%s_url" % user_type
+                try:
+                    url = self.lookup(url_string)
+                    users = self._fetcher.get_entities(url)
+                except AttributeError as ate:
+                    logger.error(str(ate))
+                    continue
+                user_list = []
+                for user in users:
+                    if 'username' in user:
+                        user_list.append({'name': user['username']})
             if len(user_list) > 0:
                 setattr(self, user_type, user_list)
 
@@ -313,12 +623,21 @@ class Space(BaseResource):
         self.load_security_groups()
         BaseResource.load(self)
 
+    def release(self):
+        BaseResource.release(self)
+        self._roles = None
+        self._security_group_index = None
+
 
 class Organization(BaseResource):
 
     """
     @brief      Describe a CF organization
     """
+
+    __slots__ = ('_runner', '_roles', '_security_group_index', '_spaces', '_quota',
+                 '_domains_private', 'users', 'managers', 'billing_managers', 'auditors')
+
     user_types = [
         "users",
                             "managers",
@@ -340,6 +659,9 @@ class Organization(BaseResource):
 
     def __init__(self, *config_dicts, **kwargs):
         super(Organization, self).__init__(*config_dicts, **kwargs)
+        self._runner = kwargs.get('runner', None) or TaskRunner()
+        self._roles = kwargs.get('roles', None)
+        self._security_group_index = kwargs.get('security_groups', None)
         self._spaces = []
 
     @property
@@ -380,18 +702,27 @@ class Organization(BaseResource):
         @brief      Loads all the spaces for this org.
         """
         url = self.lookup("spaces_url")
-        spaces = self._fetcher.get_resources(url)
-        for space in spaces:
-            new_space = Space(
-                space['entity'], space['metadata'], fetcher=self._fetcher)
-            new_space.load()
-            self._spaces.append(new_space.asdict())
+        spaces = [Space(space['entity'], space['metadata'],
+                        fetcher=self._fetcher, roles=self._roles,
+                        security_groups=self._security_group_index)
+                  for space in self._fetcher.get_resources(url)]
+        self._spaces = self._runner.map(self.load_space, spaces)
+
+    @staticmethod
+    def load_space(space):
+        space.load()
+        return space.asdict()
 
     def load_users(self):
         """
         @brief      Loads all the users for this org.
         """
         for user_type in self.user_types:
+            if self._roles is not None:
+                user_list = self._roles.users(self.lookup("guid"), user_type)
+                if len(user_list) > 0:
+                    setattr(self, user_type, user_list)
+                continue
             url = "%s_url" % user_type
             try:
                 self.lookup(url)
@@ -412,6 +743,45 @@ class Organization(BaseResource):
         self.load_users()
         BaseResource.load(self)
 
+    def refresh(self, previous):
+        """
+        @brief      Load an unchanged org, copying what can be from its `previous` export
+
+        Granting a role, sharing a private domain or binding a security
+        group updates neither the org nor its spaces, hence those are
+        always read again. The quota and the spaces themselves are
+        copied from the previous export.
+        """
+        self.load_private_domains()
+        if 'quota' in previous:
+            self._quota = previous['quota']
+        spaces = [Space(self.previous_space(space), self.space_urls(space['guid']),
+                        fetcher=self._fetcher, roles=self._roles,
+                        security_groups=self._security_group_index)
+                  for space in previous.get('spaces', [])]
+        self._spaces = self._runner.map(self.load_space, spaces)
+        self.load_users()
+        BaseResource.load(self)
+
+    @staticmethod
+    def previous_space(space):
+        stale = set(Space.user_types)
+        stale.add('security_groups')
+        return {key: value for key, value in space.items() if key not in stale}
+
+    @staticmethod
+    def space_urls(guid):
+        urls = {"%s_url" % user_type: "/v2/spaces/%s/%s" % (guid, user_type)
+                for user_type in Space.user_types}
+        urls['security_groups_url'] = "/v2/spaces/%s/security_groups" % guid
+        return urls
+
+    def release(self):
+        BaseResource.release(self)
+        self._runner = None
+        self._roles = None
+        self._security_group_index = None
+
 
 class SecurityGroup(BaseResource):
 
@@ -419,6 +789,8 @@ class SecurityGroup(BaseResource):
     @brief      Describe a global security group
     """
 
+    __slots__ = ('_rules',)
+
     properties = [
         "guid",
                             "name",
@@ -462,6 +834,8 @@ class SecurityRule(BaseResource):
     @brief:     Describe a security rule.
     """
 
+    __slots__ = ('_name_generator',)
+
     properties = [
         "name",
                             "protocol",
@@ -502,6 +876,9 @@ class User(BaseResource):
     @brief      Describe a CF user.
     """
 
+    __slots__ = ('_cf_response', '_cf_metadata', '_spaces', '_default_space',
+                 '_default_organization')
+
     properties = [
         "guid",
                             "name",
@@ -529,6 +906,7 @@ class User(BaseResource):
         super(User, self).__init__(*config_dicts, **kwargs)
         self._cf_response = cf_response['entity']
         self._cf_metadata = cf_response['metadata']
+        self._spaces = kwargs.get('spaces', None)
 
     def lookup_cf_response(self, name):
         config = self._cf_response
@@ -586,10 +964,25 @@ class User(BaseResource):
         self.load_default_space_and_org()
         BaseResource.load(self)
 
+    def release(self):
+        BaseResource.release(self)
+        self._cf_response = None
+        self._cf_metadata = None
+        self._spaces = None
+
     def load_default_space_and_org(self):
         """
         @brief      Loads a default space and organization.
+
+        They are looked up in the space directory, if any, and only
+        requested when the space is not listed there.
         """
+        space_guid = self._cf_response.get("default_space_guid")
+        if self._spaces is not None and space_guid is not None:
+            names = self._spaces.names(space_guid)
+            if names is not None:
+                self._default_space, self._default_organization = names
+                return
         try:
             space_url = self.lookup_cf_response("default_space_url")
         except AttributeError:
@@ -604,28 +997,140 @@ class User(BaseResource):
                 self._default_space = space['name']
 
 
+class PreviousExport(object):
+
+    """
+    @brief      Raw manifest of a previous run an incremental export builds upon
+
+    Resources whose `updated_at` is older than the previous export
+    can be copied from its manifest instead of being loaded again. The
+    roles, private domains and security groups of the orgs copied are
+    read again all the same, changing them updates no `updated_at`.
+    """
+
+    # margin absorbing the clock skew between this host and the Cloud Controller
+    skew = 300
+
+    def __init__(self, manifest, exported_at):
+        self.manifest = manifest
+        self.exported_at = exported_at
+        since = time.strptime(exported_at, TIMESTAMP_FORMAT)
+        self.since = time.strftime(
+            TIMESTAMP_FORMAT, time.gmtime(calendar.timegm(since) - self.skew))
+        self.users = self.index(manifest.get("cf_users", []))
+        self.orgs = self.index(manifest.get("cf_orgs", []))
+        self.changed_orgs = set()
+        self.changed_quotas = set()
+
+    @staticmethod
+    def index(resources):
+        return {resource['guid']: resource for resource in resources if 'guid' in resource}
+
+    def updated(self, resource):
+        """
+        @brief      Whether a `{metadata, entity}` resource changed since the previous export
+        """
+        metadata = resource['metadata']
+        updated_at = metadata.get('updated_at') or metadata.get('created_at')
+        return updated_at is None or updated_at > self.since
+
+    def previous_user(self, user_cf):
+        if self.updated(user_cf):
+            return None
+        return self.users.get(user_cf['metadata']['guid'])
+
+    def previous_org(self, org):
+        guid = org['metadata']['guid']
+        if (self.updated(org) or guid in self.changed_orgs or
+                org['entity'].get('quota_definition_guid') in self.changed_quotas):
+            return None
+        return self.orgs.get(guid)
+
+    def detect_changed_orgs(self, spaces, quotas):
+        """
+        @brief      Find the orgs whose spaces or quota changed since the previous export
+
+        An org is reloaded when one of its spaces has been updated, added
+        or deleted, or when its quota definition has been updated.
+        """
+        org_spaces = collections.defaultdict(set)
+        for space in spaces:
+            org_guid = space['entity']['organization_guid']
+            org_spaces[org_guid].add(space['metadata']['guid'])
+            if self.updated(space):
+                self.changed_orgs.add(org_guid)
+        for guid, org in self.orgs.items():
+            previous_spaces = set(space['guid'] for space in org.get('spaces', []))
+            if org_spaces.get(guid, set()) != previous_spaces:
+                self.changed_orgs.add(guid)
+        for quota in quotas:
+            if self.updated(quota):
+                self.changed_quotas.add(quota['metadata']['guid'])
+
+
+@timed_phases("generate_", "add_")
 class Exporter:
 
-    def __init__(self, client, exclude_vars=""):
+    def __init__(self, client, exclude_vars="", page_size=None, concurrency=1,
+                 uaa_bulk=True, uaa_page_size=500, cache=None, store=None,
+                 bulk_roles=False, transport=None, snapshot=None, selection=None):
         self._client = client
         self._uaa_client = client.uaa
-        self.fetcher = ResourceFetcher(client)
+        if transport is not None:
+            transport.install(client.session)
+            transport.install(client.uaa.session)
+        if snapshot is not None:
+            snapshot.install(client)
+            snapshot.install(client.uaa)
+        self.fetcher = ResourceFetcher(client, page_size=page_size, cache=cache,
+                                       store=store)
+        self.uaa_fetcher = UAAResourceFetcher(client.uaa, page_size=uaa_page_size)
+        self._uaa_bulk = uaa_bulk
+        self._uaa_users = {}
+        self._bulk_roles = bulk_roles
+        self._roles = None
+        self._security_groups = None
+        self._spaces = None
+        self.selection = selection or Selection()
+        self._org_pages = None
+        # orgs and users are loaded on one pool while the spaces of each org
+        # get their own, so that an org waiting on its spaces never starves
+        # the workers its spaces need
+        self._runner = TaskRunner(concurrency)
+        self._space_runner = TaskRunner(concurrency)
         self.manifest = collections.OrderedDict()
+        self.exported_at = None
+        self._previous = None
         exprs = re.split(';|,', exclude_vars)
         self.exclude_vars = tuple(expr.strip().lower()
                                   for expr in exprs if len(expr) > 0)
 
-    def generate_manifest(self):
-        self.manifest["cf_feature_flags"] = self.add_feature_flags()
-        self.manifest[
-            "cf_staging_environment_variables"] = self.add_staging_environment_variables()
-        self.manifest[
-            "cf_running_environment_variables"] = self.add_running_environment_variables()
-        self.manifest["cf_shared_domains"] = self.add_shared_domains()
-        self.manifest["cf_security_groups"] = self.add_security_groups()
-        self.manifest["cf_quotas"] = self.add_quotas()
-        self.manifest["cf_users"] = self.add_users()
-        self.manifest["cf_orgs"] = self.add_orgs()
+    def generate_manifest(self, previous=None, since=None):
+        """
+        @brief      Export the configuration of the whole foundation
+
+        When the raw manifest of a `previous` export is given, along with
+        the time `since` it was exported, only the users and orgs updated
+        after that are loaded again, the others are copied from it. Users
+        are only copied along with the bulk UAA listing, which tells the
+        ones modified in UAA since then.
+        """
+        self.exported_at = time.strftime(TIMESTAMP_FORMAT, time.gmtime())
+        if previous is not None and since is not None:
+            self._previous = PreviousExport(previous, since)
+        self.export_sections()
+
+    def export_sections(self):
+        """
+        @brief      Fill every section of the manifest, in the order they are exported
+        """
+        for resource_type in RESOURCE_TYPES:
+            section = "cf_%s" % resource_type
+            if self.selection.includes_type(resource_type):
+                self.manifest[section] = getattr(self, "add_%s" % resource_type)()
+            else:
+                # left empty, the outputs expect every section
+                self.manifest[section] = []
 
     def add_feature_flags(self):
         response = self.fetcher.get_raw("/v2/config/feature_flags")
@@ -658,7 +1163,8 @@ class Exporter:
         return domain_list
 
     def add_security_groups(self):
-            response = self.fetcher.get_resources("/v2/security_groups")
+            # the same listing the spaces look their groups up in
+            response = self.fetcher.get_resources(SecurityGroupIndex.url)
             group_list = []
             for group in response:
                 g = SecurityGroup(group['entity'], group['metadata'])
@@ -676,25 +1182,128 @@ class Exporter:
         return quota_list
 
     def add_users(self):
-        response = self.fetcher.get_resources("/v2/users")
+        query = ""
+        if self._bulk_roles:
+            # the org and space roles of every user come inlined in the listing
+            query = "?inline-relations-depth=1"
+            self._roles = RoleIndex()
+        ids = None
+        if self.selection.selects_orgs:
+            # only the users holding a role in the orgs selected
+            pages = [self.org_users(query)]
+            ids = [user['metadata']['guid'] for user in pages[0]]
+        else:
+            pages = self.fetcher.iter_pages("/v2/users" + query)
+        if self._uaa_bulk:
+            since = self._previous.since if self._previous else None
+            self._uaa_users = self.uaa_fetcher.index_users(modified_since=since, ids=ids)
+        self._spaces = self.space_directory()
         user_list = []
-        for user in response:
+        for page in pages:
+            if self._roles is not None:
+                for user in page:
+                    self._roles.add_user(user, self.fetcher)
+            users = self._runner.map(self.load_user, page)
+            user_list.extend(user for user in users if user is not None)
+        self._uaa_users = {}
+        self._spaces = None
+        return user_list
+
+    def space_directory(self):
+        """
+        @brief      The directory the users resolve their default space and org in
+
+        Without any org selection every space is listed. Otherwise only
+        the spaces of the orgs selected are, which the orgs then read
+        from the cache, and the default spaces of other orgs are
+        requested one by one.
+        """
+        directory = SpaceDirectory()
+        if self.selection.selects_orgs:
+            for page in self.org_pages():
+                for org in page:
+                    directory.add_org(org)
+                    for space in self.fetcher.get_resources(org['entity']['spaces_url']):
+                        directory.add_space(space)
+            return directory
+        for org in self.fetcher.iter_resources("/v2/organizations"):
+            directory.add_org(org)
+        for space in self.fetcher.iter_resources("/v2/spaces"):
+            directory.add_space(space)
+        return directory
+
+    def org_users(self, query=""):
+        """
+        @brief      The users holding any role in the orgs selected, listed once
+
+        Space roles are only granted to the users of the org, hence the
+        org role listings hold every user of its spaces as well.
+        """
+        users = collections.OrderedDict()
+        for page in self.org_pages():
+            for org in page:
+                for user_type in Organization.user_types:
+                    url = org['entity'].get("%s_url" % user_type)
+                    if url is None:
+                        continue
+                    # cached, the org reads its roles from the same listings
+                    for user in self.fetcher.get_resources(url + query):
+                        users.setdefault(user['metadata']['guid'], user)
+        return list(users.values())
+
+    def org_pages(self):
+        """
+        @brief      The pages of the orgs listing, restricted to the orgs selected
+        """
+        if self._org_pages is not None:
+            return self._org_pages
+        selection = self.selection
+        pages = ([org for org in page if selection.includes_org(org['entity']['name'])]
+                 for page in self.fetcher.iter_pages(selection.orgs_url()))
+        if selection.selects_orgs:
+            # listed once for their users, once for themselves
+            pages = self._org_pages = list(pages)
+        return pages
+
+    def load_user(self, user_cf):
+        guid = user_cf['metadata']['guid']
+        user_uaa = self._uaa_users.get(guid)
+        if self._previous is not None and self._uaa_bulk and user_uaa is None:
+            # not modified in UAA since the previous export either
+            previous = self._previous.previous_user(user_cf)
+            if previous is not None:
+                return previous
+        if user_uaa is None:
+            # not part of the bulk listing, ask UAA for this user only
             try:
-                user_uaa = self._uaa_client.user_get(user['metadata']['guid'])
+                user_uaa = self.uaa_fetcher.get_user(guid)
             except UAAException as uaaexp:
-                continue
-            user_cf = user
-            u = User(user_uaa, cf_response=user_cf, fetcher=self.fetcher)
-            u.load()
-            user_list.append(u.asdict())
-        return user_list
+                return None
+        u = User(user_uaa, cf_response=user_cf, fetcher=self.fetcher, spaces=self._spaces)
+        u.load()
+        return u.asdict()
 
     def add_orgs(self):
-        response = self.fetcher.get_resources("/v2/organizations")
+        if self._previous is not None:
+            self._previous.detect_changed_orgs(
+                self.fetcher.iter_resources("/v2/spaces"),
+                self.fetcher.get_resources("/v2/quota_definitions"))
+        self._security_groups = SecurityGroupIndex(
+            self.fetcher.get_resources(SecurityGroupIndex.url), self.fetcher)
         org_list = []
-        for org in response:
-            o = Organization(
-                org['entity'], org['metadata'], fetcher=self.fetcher)
-            o.load()
-            org_list.append(o.asdict())
+        for page in self.org_pages():
+            org_list.extend(self._runner.map(self.load_org, page))
         return org_list
+
+    def load_org(self, org):
+        previous = None
+        if self._previous is not None:
+            previous = self._previous.previous_org(org)
+        o = Organization(org['entity'], org['metadata'],
+                         fetcher=self.fetcher, runner=self._space_runner,
+                         roles=self._roles, security_groups=self._security_groups)
+        if previous is not None:
+            o.refresh(previous)
+        else:
+            o.load()
+        return o.asdict()
@@ -0,0 +1,90 @@
+import json
+import marshal
+import collections
+
+from .exceptions import ExporterException
+
+# raw manifests saved to a file with this extension are marshalled, which
+# loads several times faster than JSON, the others are saved as JSON
+BINARY_EXTENSION = ".bin"
+BINARY_MAGIC = b"cf-exporter raw manifest"
+BINARY_VERSION = 1
+
+
+def save_raw_manifest(path, manifest, exported_at):
+    """
+    @brief      Save the raw manifest generated by the Exporter
+
+    @param      path         The file to write, in the binary format when it
+                             ends in `.bin`, as JSON otherwise
+    @param      manifest     The Exporter raw manifest
+    @param      exported_at  The time the export started
+    """
+    if path.endswith(BINARY_EXTENSION):
+        save_binary_manifest(path, manifest, exported_at)
+        return
+    document = collections.OrderedDict([
+        ("exported_at", exported_at),
+        ("manifest", manifest)
+    ])
+    with open(path, "w") as stream:
+        # json.dump encodes in pure Python, dumps in C
+        stream.write(json.dumps(document))
+
+
+def save_binary_manifest(path, manifest, exported_at):
+    """
+    @brief      Save the raw manifest with marshal, after a versioned header
+
+    marshal only writes the builtin types, the OrderedDict of the Exporter
+    manifest is saved as a plain dict, which keeps the key order as well.
+    """
+    document = {"exported_at": exported_at, "manifest": dict(manifest)}
+    try:
+        data = marshal.dumps(document, marshal.version)
+    except ValueError:
+        # an OrderedDict or another subclass deeper in the records
+        document = json.loads(json.dumps(document))
+        data = marshal.dumps(document, marshal.version)
+    with open(path, "wb") as stream:
+        stream.write(b"%s %i %i\n" % (BINARY_MAGIC, BINARY_VERSION, marshal.version))
+        stream.write(data)
+
+
+def load_raw_manifest(path):
+    """
+    @brief      Load a raw manifest saved with `save_raw_manifest`, in either format
+
+    @return     a `(manifest, exported_at)` tuple
+    """
+    with open(path, "rb") as stream:
+        data = stream.read()
+    if data.startswith(BINARY_MAGIC):
+        document = load_binary_manifest(path, data)
+    else:
+        try:
+            # plain dicts keep the key order and are much smaller than OrderedDicts
+            document = json.loads(data.decode("utf-8"))
+        except ValueError as ve:
+            raise ExporterException("Invalid raw manifest %s: %s" % (path, ve))
+    if not isinstance(document, dict) or "manifest" not in document:
+        raise ExporterException("Invalid raw manifest %s" % path)
+    return document["manifest"], document.get("exported_at")
+
+
+def load_binary_manifest(path, data):
+    header, _, body = data.partition(b"\n")
+    try:
+        _, version, marshal_version = header.rsplit(b" ", 2)
+        version, marshal_version = int(version), int(marshal_version)
+    except ValueError:
+        raise ExporterException("Invalid raw manifest header in %s" % path)
+    if version != BINARY_VERSION or marshal_version > marshal.version:
+        raise ExporterException(
+            "Raw manifest %s was saved in version %i (marshal %i), this exporter "
+            "reads version %i (marshal %i at most), export it again" % (
+                path, version, marshal_version, BINARY_VERSION, marshal.version))
+    try:
+        return marshal.loads(body)
+    except (ValueError, EOFError, TypeError) as e:
+        raise ExporterException("Invalid raw manifest %s: %s" % (path, e))
@@ -0,0 +1,167 @@
+import re
+import json
+import math
+import threading
+import collections
+
+from urllib.parse import urlparse
+
+# path segments holding a guid (CF) or an id (UAA) are the only ones with a dash
+# the guids of the CC API and the ids of UAA, only whole path segments
+ID_SEGMENT = re.compile(
+    r"/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(?=/|$)", re.IGNORECASE)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def endpoint_template(method, url):
+    """
+    @brief      Normalise a request to a `GET /v2/spaces/:guid/developers` template
+    """
+    return "%s %s" % (method, ID_SEGMENT.sub("/:guid", urlparse(url).path))
+
+
+def labels(endpoint):
+    method, path = endpoint.split(" ", 1)
+    return 'method="%s",endpoint="%s"' % (method, path.replace('"', '\\"'))
+
+
+def percentile(sorted_values, p):
+    """
+    @brief      Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = int(math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+class EndpointStats(object):
+
+    """
+    @brief      Calls, errors, bytes and latencies of a single endpoint template
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latencies = []
+
+    def record(self, elapsed, size, status_code):
+        self.count += 1
+        self.bytes += size
+        self.latencies.append(elapsed)
+        if status_code is None or status_code >= 400:
+            self.errors += 1
+
+    def asdict(self):
+        latencies = sorted(self.latencies)
+        return collections.OrderedDict([
+            ("count", self.count),
+            ("errors", self.errors),
+            ("bytes", self.bytes),
+            ("total_seconds", sum(latencies)),
+            ("p50", percentile(latencies, 50)),
+            ("p90", percentile(latencies, 90)),
+            ("p99", percentile(latencies, 99)),
+            ("max", latencies[-1] if latencies else 0.0)
+        ])
+
+    def histogram(self):
+        """
+        @brief      Cumulative `(upper_bound, count)` latency buckets
+        """
+        return [(bound, sum(1 for l in self.latencies if l <= bound))
+                for bound in LATENCY_BUCKETS]
+
+
+class RequestMetrics(object):
+
+    """
+    @brief      Thread safe per-endpoint counters of the HTTP requests issued
+
+    Requests are grouped by method and url path, with guids replaced by
+    `:guid`, so that e.g. all the `/v2/spaces/<guid>/developers` calls
+    end up in the same row.
+    """
+
+    def __init__(self):
+        self._endpoints = collections.defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+
+    def record(self, method, url, elapsed, size, status_code=200):
+        endpoint = endpoint_template(method, url)
+        with self._lock:
+            self._endpoints[endpoint].record(elapsed, size, status_code)
+
+    def asdict(self):
+        with self._lock:
+            return collections.OrderedDict(
+                (endpoint, stats.asdict())
+                for endpoint, stats in sorted(self._endpoints.items()))
+
+    def summary(self):
+        """
+        @brief      Table of the endpoints, the slowest in total first
+        """
+        rows = sorted(self.asdict().items(), key=lambda e: -e[1]["total_seconds"])
+        lines = ["%-56s %7s %6s %10s %9s %9s %9s %9s" % (
+            "endpoint", "count", "errors", "bytes", "total", "p50", "p90", "p99")]
+        for endpoint, s in rows:
+            lines.append("%-56s %7i %6i %10i %8.2fs %8.1fms %8.1fms %8.1fms" % (
+                endpoint, s["count"], s["errors"], s["bytes"], s["total_seconds"],
+                s["p50"] * 1000, s["p90"] * 1000, s["p99"] * 1000))
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """
+        @brief      Render the metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+        lines = [
+            "# HELP exporter_requests_total API requests issued by the exporter",
+            "# TYPE exporter_requests_total counter"
+        ]
+        for endpoint, stats in endpoints:
+            lines.append('exporter_requests_total{%s} %i' % (labels(endpoint), stats.count))
+        lines += [
+            "# HELP exporter_request_errors_total API requests which failed",
+            "# TYPE exporter_request_errors_total counter"
+        ]
+        for endpoint, stats in endpoints:
+            lines.append('exporter_request_errors_total{%s} %i' % (labels(endpoint), stats.errors))
+        lines += [
+            "# HELP exporter_response_bytes_total Size of the API responses",
+            "# TYPE exporter_response_bytes_total counter"
+        ]
+        for endpoint, stats in endpoints:
+            lines.append('exporter_response_bytes_total{%s} %i' % (labels(endpoint), stats.bytes))
+        lines += [
+            "# HELP exporter_request_duration_seconds Latency of the API requests",
+            "# TYPE exporter_request_duration_seconds histogram"
+        ]
+        for endpoint, stats in endpoints:
+            endpoint_labels = labels(endpoint)
+            for bound, count in stats.histogram():
+                lines.append('exporter_request_duration_seconds_bucket{%s,le="%s"} %i' % (
+                    endpoint_labels, bound, count))
+            lines.append('exporter_request_duration_seconds_bucket{%s,le="+Inf"} %i' % (
+                endpoint_labels, stats.count))
+            lines.append('exporter_request_duration_seconds_sum{%s} %f' % (
+                endpoint_labels, sum(stats.latencies)))
+            lines.append('exporter_request_duration_seconds_count{%s} %i' % (
+                endpoint_labels, stats.count))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        @brief      Write the metrics to `path`, as JSON for `.json` files
+                    and in the Prometheus text format otherwise
+        """
+        with open(path, "w") as stream:
+            if path.endswith(".json"):
+                json.dump(self.asdict(), stream, indent=2)
+            else:
+                stream.write(self.prometheus())
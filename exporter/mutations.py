@@ -1,21 +1,189 @@
 import re
+import hashlib
 import logging
 import collections
 import sys
 
 from .exceptions import FieldNotOptionalException
+from .profiling import timed_phases
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NO_MAPPING = object()
+RESOURCE_NAME_CHARS = re.compile(r"[@\.]")
+
+def to_terraform_resource_name(name):
+	return RESOURCE_NAME_CHARS.sub("_", name)
+
+class ResourceNameRegistry(object):
+
+	"""
+	@brief      Terraform resource names of CF names, computed once per name
+
+	Names are translated the first time they are seen and remembered
+	afterwards. A name is either a string or a tuple of strings, whose
+	parts are translated and joined with `_`. Different names
+	translating to the same resource name, like `a.b` and `a_b`, would
+	be the same Terraform resource: the names seen after the first one,
+	which the API lists in creation order, get a suffix hashed from
+	their own name instead. Adding names never renames the existing
+	ones, but deleting the first owner of a resource name does: on the
+	next export the suffixed name seen next takes the plain one over,
+	and Terraform recreates that resource.
+	"""
+
+	# hex digits of the suffix
+	digest_size = 8
+
+	def __init__(self, prefix=""):
+		self.prefix = prefix
+		self._names = {}
+		self._owners = {}
+
+	def __len__(self):
+		return len(self._names)
+
+	def resource_name(self, name):
+		resource_name = self._names.get(name)
+		if resource_name is None:
+			resource_name = self.register(name)
+		return resource_name
+
+	def register(self, name):
+		if isinstance(name, tuple):
+			base = "_".join(to_terraform_resource_name(part) for part in name)
+			label = "/".join(name)
+		else:
+			base, label = to_terraform_resource_name(name), name
+		base = self.prefix + base
+		resource_name = base
+		if base in self._owners:
+			digest = hashlib.sha1(label.encode("utf-8")).hexdigest()
+			size = self.digest_size
+			while resource_name in self._owners:
+				resource_name = "{}_{}".format(base, digest[:size])
+				size += 1
+			logger.warning("%s and %s are both named %s in Terraform, naming %s %s" % (
+				self._owners[base], label, base, label, resource_name))
+		self._names[name] = resource_name
+		self._owners[resource_name] = label
+		return resource_name
+
+class FieldMapping(object):
+
+	"""
+	@brief      A `fields` and `list_fields` spec planned into a single function
+
+	The spec is interpreted once, into a plan of `(dest, source, ...)`
+	tuples a single `apply(dest_dict, source_dict)` function walks the
+	way `ManifestMutation.map_fields` and `map_list_fields` do, without
+	any per field call or option lookup. Fields are mapped first, in the
+	order of the spec, then list fields.
+	"""
+
+	def __init__(self, fields=None, list_fields=None):
+		self.fields = fields or {}
+		self.list_fields = list_fields or {}
+		self.apply = self.plan(self.fields, self.list_fields)
+
+	def bind(self, obj):
+		"""
+		@brief      The same mapping, whose `key_fn` given by name are the
+		            methods of `obj` of that name
+		"""
+		list_fields = collections.OrderedDict()
+		for field, options in self.list_fields.items():
+			if isinstance(options.get("key_fn"), str):
+				options = dict(options, key_fn=getattr(obj, options["key_fn"]))
+			list_fields[field] = options
+		return FieldMapping(self.fields, list_fields)
+
+	@staticmethod
+	def convert(key_fn, fmt):
+		"""
+		@brief      The function converting an element of a list field, None for none
+		"""
+		if key_fn is not None and fmt:
+			fmt = fmt.format
+			return lambda elem: fmt(key_fn(elem))
+		if fmt:
+			return fmt.format
+		return key_fn
+
+	@classmethod
+	def plan(cls, fields, list_fields):
+		"""
+		@return     the `apply(dest_dict, source_dict)` function of the spec
+		"""
+		field_plan = []
+		for dest_field, options in fields.items():
+			field_plan.append((
+				dest_field,
+				options.get("source_field") or dest_field,
+				options.get("mapping") or None,
+				# a falsy default behaves as no default at all, as in map_field
+				options.get("default") or None,
+				not options.get("optional", False)))
+		list_plan = [(dest_field, options.get("source_field") or dest_field,
+				cls.convert(options.get("key_fn"), options.get("fmt")))
+			for dest_field, options in list_fields.items()]
+		field_plan, list_plan = tuple(field_plan), tuple(list_plan)
+
+		def apply(dest_dict, source_dict):
+			for dest, source, mapping, default, required in field_plan:
+				if source in source_dict:
+					value = source_dict[source]
+					if mapping is not None:
+						mapped = mapping.get(value, NO_MAPPING)
+						if mapped is not NO_MAPPING:
+							dest_dict[dest] = mapped
+							continue
+					if value is not None:
+						dest_dict[dest] = value
+				elif default is not None:
+					dest_dict[dest] = default
+				elif required:
+					raise FieldNotOptionalException("Field {} is not optional".format(dest))
+			for dest, source, convert in list_plan:
+				if source not in source_dict:
+					dest_dict[dest] = []
+				elif convert is None:
+					dest_dict[dest] = list(source_dict[source])
+				else:
+					dest_dict[dest] = [convert(elem) for elem in source_dict[source]]
+			return dest_dict
+
+		return apply
+
+	def apply_all(self, source_dicts):
+		"""
+		@brief      Map every record into a new OrderedDict
+		"""
+		apply = self.apply
+		OrderedDict = collections.OrderedDict
+		return [apply(OrderedDict(), source_dict) for source_dict in source_dicts]
+
 class ManifestMutation(object):
 
 	def __init__(self, cf_dict):
 		self.cf_dict = cf_dict
 
+	# manifest section -> method mutating a single record of the section
+	record_mutators = {}
+
 	def mutate_manifest(self):
 		return self.cf_dict
 
+	def record_mutator(self, section):
+		"""
+		@brief      The function mutating a single record of `section`, None if
+		            the mutation has no output for it. The function returns
+		            None for the records to leave out.
+		"""
+		name = self.record_mutators.get(section)
+		return getattr(self, name) if name else None
+
 	def map_flags(self, flags, source_flags):
 		dest_flags = []
 
@@ -75,12 +243,118 @@ class ManifestMutation(object):
 			elem = fmt.format(key_fn(elem)) if fmt else key_fn(elem)
 			dest_dict[dest_field].append(elem)
 
+@timed_phases("mutate_")
 class TerraformMutation(ManifestMutation):
 
 	user_fmt = '${{cf_user.user_{}.id}}'
 
+	record_mutators = {
+		"cf_feature_flags": "transform_feature_flag",
+		"cf_security_groups": "transform_security_group",
+		"cf_quotas": "transform_quota",
+		"cf_users": "transform_user",
+		"cf_orgs": "transform_org"
+	}
+
+	flags = {
+		"user_org_creation": None,
+		"private_domain_creation": None,
+		"app_bits_upload": None,
+		"app_scaling": None,
+		"route_creation": None,
+		"service_instance_creation": None,
+		"diego_docker": None,
+		"set_roles_by_username": None,
+		"unset_roles_by_username": None,
+		"task_creation": None
+	}
+
+	security_group_fields = FieldMapping(fields={
+		"guid": {},
+		"name": {}
+	})
+
+	security_rule_fields = FieldMapping(fields={
+		"protocol": {},
+		"destination": {},
+		"ports": {"optional": True},
+		"description": {"optional": True},
+		"type": {"optional": True, "default": 0},
+		"code": {"optional": True, "default": 0},
+		"log": {"optional": True, "default": "false"}
+	})
+
+	quota_fields = FieldMapping(fields={
+		"guid": {},
+		"name": {},
+		"allow_paid_service_plans": {
+			"source_field": "non_basic_services_allowed",
+			"mapping": {True: "true", False: "false"}
+		},
+		"total_memory": {"source_field": "memory_limit"},
+		"total_routes": {},
+		"total_services": {},
+		"instance_memory": {
+			"source_field":"instance_memory_limit",
+			"optional": True,
+			"default": -1
+		},
+		"total_app_instances": {
+			"source_field": "app_instance_limit",
+			"optional": True,
+			"default": -1
+		},
+		"total_route_ports":{
+			"source_field": "total_reserved_route_ports",
+			"optional": True,
+			"default": -1
+		},
+		"total_private_domains": {
+			"optional": True,
+			"default": 0
+		}
+	})
+
+	space_fields = FieldMapping(fields={
+		"guid": {},
+		"name": {},
+		"quota": {"optional": True},
+		"allow_ssh": {"mapping": {True: "true", False: "false"}}
+	}, list_fields={
+		"asgs": {"source_field": "security_groups"},
+		"managers": {"key_fn": "user_resource_name", "fmt": user_fmt},
+		"developers": {"key_fn": "user_resource_name", "fmt": user_fmt},
+		"auditors": {"key_fn": "user_resource_name", "fmt": user_fmt}
+	})
+
+	org_fields = FieldMapping(fields={
+		"guid": {},
+		"name": {},
+		"quota": {}
+	}, list_fields={
+		"managers": {"key_fn": "user_resource_name", "fmt": user_fmt},
+		"billing_managers": {"key_fn": "user_resource_name", "fmt": user_fmt},
+		"auditors": {"key_fn": "user_resource_name", "fmt": user_fmt}
+	})
+
+	user_fields = FieldMapping(fields={
+		"guid": {},
+		"name": {},
+		"password": {"optional": True, "mapping": {"None": None}},
+		"origin": {"optional": True},
+		"given_name": {"optional": True},
+		"family_name": {"optional": True},
+		"email": {"optional": True}
+	})
+
 	def __init__(self, cf_dict):
 		self.cf_dict = cf_dict
+		self.user_names = ResourceNameRegistry()
+		self.org_names = ResourceNameRegistry()
+		self.space_names = ResourceNameRegistry()
+		# the roles name the users after the registry of this mutation
+		self.space_fields = self.space_fields.bind(self)
+		self.org_fields = self.org_fields.bind(self)
 
 	def mutate_manifest(self):
 		tf_manifest = {}
@@ -103,223 +377,145 @@ class TerraformMutation(ManifestMutation):
 		return tf_manifest
 
 	def to_terraform_resource_name(self, name):
-		return re.sub(r"[@\.]", "_", name)
+		return to_terraform_resource_name(name)
 
-	def mutate_feature_flags(self, cf_dict):
-		cf_flags = cf_dict["cf_feature_flags"]
+	def user_resource_name(self, user):
+		return self.user_names.resource_name(user["name"])
 
-		flags = {
-			"user_org_creation": None,
-			"private_domain_creation": None,
-			"app_bits_upload": None,
-			"app_scaling": None,
-			"route_creation": None,
-			"service_instance_creation": None,
-			"diego_docker": None,
-			"set_roles_by_username": None,
-			"unset_roles_by_username": None,
-			"task_creation": None
-		}
+	def space_resource_name(self, org, space):
+		# named after the resource name of their org, which is unique already
+		return self.space_names.resource_name((self.org_names.resource_name(org), space))
 
-		supported_flags = [flag for flag in cf_flags if flag['name'] in flags]
+	def mutate_feature_flags(self, cf_dict):
+		cf_flags = cf_dict["cf_feature_flags"]
+		supported_flags = [flag for flag in cf_flags if flag['name'] in self.flags]
 		
-		return self.map_flags(flags, supported_flags)
+		return self.map_flags(self.flags, supported_flags)
 
 	def mutate_security_groups(self, cf_dict):
-		cf_asgs = cf_dict["cf_security_groups"]
-		tf_asgs = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"guid": {},
-			"name": {}
-		}
-
-		for cf_asg in cf_asgs:
-			tf_asg = collections.OrderedDict()
-			self.map_fields(tf_asg, cf_asg, fields)
-			tf_asg["rules"] = self.mutate_security_rules(cf_asg["rules"])
-
-			tf_asgs.append(tf_asg)
-
-		return tf_asgs
+		return [self.transform_security_group(cf_asg)
+			for cf_asg in cf_dict["cf_security_groups"]]
 
 	def mutate_security_rules(self, rules):
-		tf_rules = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"protocol": {},
-			"destination": {},
-			"ports": {"optional": True},
-			"description": {"optional": True},
-			"type": {"optional": True, "default": 0},
-			"code": {"optional": True, "default": 0},
-			"log": {"optional": True, "default": "false"}
-		}
-
-		for cf_rule in rules:
-			tf_rule = collections.OrderedDict()
-			self.map_fields(tf_rule, cf_rule, fields)
-
-			tf_rules.append(tf_rule)
-
-		return tf_rules
+		return self.security_rule_fields.apply_all(rules)
 
 	def mutate_quotas(self, cf_dict):
-		cf_quotas = cf_dict["cf_quotas"]
-		tf_quotas = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"guid": {},
-			"name": {},
-			"allow_paid_service_plans": {
-				"source_field": "non_basic_services_allowed",
-				"mapping": {True: "true", False: "false"}
-			},
-			"total_memory": {"source_field": "memory_limit"},
-			"total_routes": {},
-			"total_services": {},
-			"instance_memory": {
-				"source_field":"instance_memory_limit",
-				"optional": True,
-				"default": -1
-			},
-			"total_app_instances": {
-				"source_field": "app_instance_limit",
-				"optional": True,
-				"default": -1
-			},
-			"total_route_ports":{
-				"source_field": "total_reserved_route_ports",
-				"optional": True,
-				"default": -1
-			},
-			"total_private_domains": {
-				"optional": True,
-				"default": 0
-			}
-		}
-
-		for cf_quota in cf_quotas:
-			tf_quota  = collections.OrderedDict()
-			self.map_fields(tf_quota, cf_quota, fields)
-			tf_quotas.append(tf_quota)
-
-		return tf_quotas
+		return self.quota_fields.apply_all(cf_dict["cf_quotas"])
 
 	def mutate_spaces(self, cf_org):
-		spaces = cf_org["spaces"]
-		org = cf_org["name"]
-		tf_spaces = []
-
-		fields = collections.OrderedDict()
-		list_fields = collections.OrderedDict()
-
-		fields = {
-			"guid": {},
-			"name": {},
-			"quota": {"optional": True},
-			"allow_ssh": {"mapping": {True: "true", False: "false"}}
-		}
-
-		list_fields = {
-			"asgs": {"source_field": "security_groups"},
-			"managers": {
-				"key_fn": lambda x: self.to_terraform_resource_name(x["name"]),
-				"fmt": self.user_fmt
-			},
-			"developers": {
-				"key_fn": lambda x: self.to_terraform_resource_name(x["name"]),
-				"fmt": self.user_fmt
-			},			
-			"auditors": {
-				"key_fn": lambda x: self.to_terraform_resource_name(x["name"]),
-				"fmt": self.user_fmt
-			}
-		}
-		for cf_space in spaces:
-			tf_space = collections.OrderedDict()
-			tf_space["org"] = org
-			tf_space["resource_name"] = '{}_{}'.format(org,
-				self.to_terraform_resource_name(cf_space["name"]))
-
-			self.map_fields(tf_space, cf_space, fields)
-			self.map_list_fields(tf_space, cf_space, list_fields)
-
-			tf_spaces.append(tf_space)
-
-		return tf_spaces
+		return [self.transform_space(cf_org, cf_space)
+			for cf_space in cf_org["spaces"]]
 
 	def mutate_orgs(self, cf_dict):
-		cf_orgs = cf_dict["cf_orgs"]
-		tf_orgs = []
+		return [self.transform_org(cf_org) for cf_org in cf_dict["cf_orgs"]]
 
-		fields = collections.OrderedDict()
-		list_fields = collections.OrderedDict()
+	def mutate_users(self, cf_dict):
+		return [self.transform_user(cf_user) for cf_user in cf_dict["cf_users"]]
 
-		fields = {
-			"guid": {},
-			"name": {},
-			"quota": {}
-		}
+	def transform_feature_flag(self, flag):
+		if flag['name'] not in self.flags:
+			return None
+		return self.map_flags(self.flags, [flag])[0]
 
-		list_fields = {
-			"managers": {
-				"key_fn": lambda x: self.to_terraform_resource_name(x["name"]),
-				"fmt": self.user_fmt
-			},
-			"billing_managers": {
-				"key_fn": lambda x: self.to_terraform_resource_name(x["name"]),
-				"fmt": self.user_fmt
-			},			
-			"auditors": {
-				"key_fn": lambda x: self.to_terraform_resource_name(x["name"]),
-				"fmt": self.user_fmt
-			}
-		}
+	def transform_security_group(self, cf_asg):
+		tf_asg = self.security_group_fields.apply(collections.OrderedDict(), cf_asg)
+		tf_asg["rules"] = self.security_rule_fields.apply_all(cf_asg["rules"])
+		return tf_asg
 
-		for cf_org in cf_orgs:
-			tf_org = collections.OrderedDict()
-			tf_org["resource_name"] = self.to_terraform_resource_name(
-				cf_org["name"])
-			
-			self.map_fields(tf_org, cf_org, fields)
-			self.map_list_fields(tf_org, cf_org, list_fields)
+	def transform_quota(self, cf_quota):
+		return self.quota_fields.apply(collections.OrderedDict(), cf_quota)
 
-			tf_org["spaces"] = self.mutate_spaces(cf_org)
-			tf_orgs.append(tf_org)
+	def transform_space(self, cf_org, cf_space):
+		org = cf_org["name"]
+		tf_space = collections.OrderedDict()
+		tf_space["org"] = org
+		tf_space["resource_name"] = self.space_resource_name(org, cf_space["name"])
 
-		return tf_orgs
+		return self.space_fields.apply(tf_space, cf_space)
 
-	def mutate_users(self, cf_dict):
-		cf_users = cf_dict["cf_users"]
-		tf_users = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"guid": {},
-			"name": {},
-			"password": {"optional": True, "mapping": {"None": None}},
-			"origin": {"optional": True},
-			"given_name": {"optional": True},
-			"family_name": {"optional": True},
-			"email": {"optional": True}
-		}
+	def transform_org(self, cf_org):
+		tf_org = collections.OrderedDict()
+		tf_org["resource_name"] = self.org_names.resource_name(cf_org["name"])
 
-		for cf_user in cf_users:
-			tf_user = collections.OrderedDict()
-			tf_user["resource_name"] = self.to_terraform_resource_name(
-				cf_user["name"])
-			self.map_fields(tf_user, cf_user, fields)
+		self.org_fields.apply(tf_org, cf_org)
 
-			tf_users.append(tf_user)
+		tf_org["spaces"] = [self.transform_space(cf_org, cf_space)
+			for cf_space in cf_org["spaces"]]
+		return tf_org
 
-		return tf_users
+	def transform_user(self, cf_user):
+		tf_user = collections.OrderedDict()
+		tf_user["resource_name"] = self.user_names.resource_name(cf_user["name"])
+		return self.user_fields.apply(tf_user, cf_user)
 
+@timed_phases("mutate_")
 class CFConfiguratorMutation(ManifestMutation):
 
+	flags = TerraformMutation.flags
+
+	record_mutators = {
+		"cf_feature_flags": "transform_feature_flag",
+		"cf_security_groups": "transform_security_group",
+		"cf_quotas": "transform_quota",
+		"cf_users": "transform_user",
+		"cf_orgs": "transform_org"
+	}
+
+	security_group_fields = FieldMapping(fields={
+		"name": {}
+	})
+
+	security_rule_fields = FieldMapping(fields={
+		"protocol": {},
+		"destination": {},
+		"ports": {"optional": True},
+		"description": {"optional": True},
+		"type": {"optional": True, "default": 0},
+		"code": {"optional": True, "default": 0},
+		"log": {"optional": True, "default": "false"}
+	})
+
+	quota_fields = FieldMapping(fields={
+		"name": {},
+		"non_basic_services_allowed": {},
+		"memory_limit": {},
+		"total_routes": {},
+		"total_services": {},
+		"instance_memory_limit":{"optional": True, "default": -1},
+		"app_instance_limit": {"optional": True, "default": -1},
+		"total_reserved_route_ports": {"optional": True, "default": -1},
+		"total_private_domains": {"optional": True, "default": 0}
+	})
+
+	space_fields = FieldMapping(fields={
+		"name": {},
+		"quota": {"optional": True},
+		"allow_ssh": {}
+	}, list_fields={
+		"security_groups": {},
+		"managers": {},
+		"developers": {},
+		"auditors": {}
+	})
+
+	org_fields = FieldMapping(fields={
+		"name": {},
+		"quota": {}
+	}, list_fields={
+		"managers": {},
+		"billing_managers": {},
+		"auditors": {}
+	})
+
+	user_fields = FieldMapping(fields={
+		"name": {},
+		"password": {"optional": True},
+		"origin": {"optional": True},
+		"given_name": {"optional": True},
+		"family_name": {"optional": True},
+		"email": {"optional": True}
+	})
+
 	def __init__(self, cf_dict):
 		self.cf_dict = cf_dict
 
@@ -345,163 +541,53 @@ class CFConfiguratorMutation(ManifestMutation):
 
 	def mutate_feature_flags(self, cf_dict):
 		cf_flags = cf_dict["cf_feature_flags"]
-		cc_flags = []
-
-		flags = {
-			"user_org_creation": None,
-			"private_domain_creation": None,
-			"app_bits_upload": None,
-			"app_scaling": None,
-			"route_creation": None,
-			"service_instance_creation": None,
-			"diego_docker": None,
-			"set_roles_by_username": None,
-			"unset_roles_by_username": None,
-			"task_creation": None
-		}
-
-		supported_flags = [flag for flag in cf_flags if flag['name'] in flags]
+		supported_flags = [flag for flag in cf_flags if flag['name'] in self.flags]
 
-		return self.map_flags(flags, supported_flags)
+		return self.map_flags(self.flags, supported_flags)
 
 	def mutate_security_groups(self, cf_dict):
-		cf_asgs = cf_dict["cf_security_groups"]
-		cc_asgs = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"name": {}
-		}
-
-		for cf_asg in cf_asgs:
-			cc_asg = collections.OrderedDict()
-			self.map_fields(cc_asg, cf_asg, fields)
-			cc_asg["rules"] = self.mutate_security_rules(cf_asg["rules"])
-
-			cc_asgs.append(cc_asg)
-
-		return cc_asgs
+		return [self.transform_security_group(cf_asg)
+			for cf_asg in cf_dict["cf_security_groups"]]
 
 	def mutate_security_rules(self, rules):
-		cc_rules = []
-		fields = collections.OrderedDict()
-		fields = {
-			"protocol": {},
-			"destination": {},
-			"ports": {"optional": True},
-			"description": {"optional": True},
-			"type": {"optional": True, "default": 0},
-			"code": {"optional": True, "default": 0},
-			"log": {"optional": True, "default": "false"}
-		}
-
-		for cf_rule in rules:
-			cc_rule = collections.OrderedDict()
-			self.map_fields(cc_rule, cf_rule, fields)
-			cc_rules.append(cc_rule)
-
-		return cc_rules
+		return self.security_rule_fields.apply_all(rules)
 
 	def mutate_quotas(self, cf_dict):
-		cf_quotas = cf_dict["cf_quotas"]
-		cc_quotas = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"name": {},
-			"non_basic_services_allowed": {},
-			"memory_limit": {},
-			"total_routes": {},
-			"total_services": {},
-			"instance_memory_limit":{"optional": True, "default": -1},
-			"app_instance_limit": {"optional": True, "default": -1},
-			"total_reserved_route_ports": {"optional": True, "default": -1},
-			"total_private_domains": {"optional": True, "default": 0}
-		}
-
-		for cf_quota in cf_quotas:
-			cc_quota  = collections.OrderedDict()
-			self.map_fields(cc_quota, cf_quota, fields)
-			cc_quotas.append(cc_quota)
-
-		return cc_quotas
+		return self.quota_fields.apply_all(cf_dict["cf_quotas"])
 
 	def mutate_spaces(self, cf_org):
-		spaces = cf_org["spaces"]
-		org = cf_org["name"]
-		cc_spaces = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"name": {},
-			"quota": {"optional": True},
-			"allow_ssh": {}
-		}
-
-		list_fields = collections.OrderedDict()
-		list_fields = {
-			"security_groups": {},
-			"managers": {},
-			"developers": {},			
-			"auditors": {}
-		}
-
-		for cf_space in spaces:
-			cc_space = collections.OrderedDict()
-			cc_space["org"] = org
-
-			self.map_fields(cc_space, cf_space, fields)
-			self.map_list_fields(cc_space, cf_space, list_fields)
-
-			cc_spaces.append(cc_space)
-
-		return cc_spaces
+		return [self.transform_space(cf_org, cf_space)
+			for cf_space in cf_org["spaces"]]
 
 	def mutate_orgs(self, cf_dict):
-		cf_orgs = cf_dict["cf_orgs"]
-		cc_orgs = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"name": {},
-			"quota": {}
-		}
-
-		list_fields = collections.OrderedDict()
-		list_fields = {
-			"managers": {},
-			"billing_managers": {},			
-			"auditors": {}
-		}
-
-		for cf_org in cf_orgs:
-			cc_org = collections.OrderedDict()
-
-			self.map_fields(cc_org, cf_org, fields)
-			self.map_list_fields(cc_org, cf_org, list_fields)
-
-			cc_org["spaces"] = self.mutate_spaces(cf_org)
-			cc_orgs.append(cc_org)
-
-		return cc_orgs
+		return [self.transform_org(cf_org) for cf_org in cf_dict["cf_orgs"]]
 
 	def mutate_users(self, cf_dict):
-		cf_users = cf_dict["cf_users"]
-		cc_users = []
-
-		fields = collections.OrderedDict()
-		fields = {
-			"name": {},
-			"password": {"optional": True},
-			"origin": {"optional": True},
-			"given_name": {"optional": True},
-			"family_name": {"optional": True},
-			"email": {"optional": True}
-		}
-
-		for cf_user in cf_users:
-			cc_user = collections.OrderedDict()
-			self.map_fields(cc_user, cf_user, fields)
-			cc_users.append(cc_user)
-
-		return cc_users
\ No newline at end of file
+		return self.user_fields.apply_all(cf_dict["cf_users"])
+
+	def transform_feature_flag(self, flag):
+		if flag['name'] not in self.flags:
+			return None
+		return self.map_flags(self.flags, [flag])[0]
+
+	def transform_security_group(self, cf_asg):
+		cc_asg = self.security_group_fields.apply(collections.OrderedDict(), cf_asg)
+		cc_asg["rules"] = self.security_rule_fields.apply_all(cf_asg["rules"])
+		return cc_asg
+
+	def transform_quota(self, cf_quota):
+		return self.quota_fields.apply(collections.OrderedDict(), cf_quota)
+
+	def transform_space(self, cf_org, cf_space):
+		cc_space = collections.OrderedDict()
+		cc_space["org"] = cf_org["name"]
+		return self.space_fields.apply(cc_space, cf_space)
+
+	def transform_org(self, cf_org):
+		cc_org = self.org_fields.apply(collections.OrderedDict(), cf_org)
+		cc_org["spaces"] = [self.transform_space(cf_org, cf_space)
+			for cf_space in cf_org["spaces"]]
+		return cc_org
+
+	def transform_user(self, cf_user):
+		return self.user_fields.apply(collections.OrderedDict(), cf_user)
@@ -0,0 +1,71 @@
+import collections
+
+from .profiling import current_timings
+
+# sections of the raw manifest, in the order the outputs expect them
+SECTIONS = ("cf_feature_flags", "cf_security_groups", "cf_quotas", "cf_users", "cf_orgs")
+
+
+class MutationPipeline(object):
+
+    """
+    @brief      Mutate a raw manifest for several outputs in a single pass
+
+    Every record of the raw manifest is visited once and handed to every
+    registered mutation, the mutated record goes straight to the writer
+    of the mutation, so no mutated manifest is ever held in memory.
+
+    A writer gets `start_section(section)` before the records of a
+    section, `add(section, record)` for every mutated record and
+    `close()` once the whole manifest went through.
+    """
+
+    def __init__(self, sections=SECTIONS):
+        self.sections = sections
+        self._outputs = []
+
+    def register(self, mutation, writer):
+        self._outputs.append((mutation, writer))
+        return self
+
+    def run(self, cf_dict):
+        for section in self.sections:
+            with current_timings().phase("mutate %s" % section):
+                self.run_section(section, cf_dict.get(section, []))
+        for mutation, writer in self._outputs:
+            writer.close()
+
+    def run_section(self, section, records):
+        outputs = []
+        for mutation, writer in self._outputs:
+            mutator = mutation.record_mutator(section)
+            if mutator is not None:
+                writer.start_section(section)
+                outputs.append((mutator, writer.add))
+
+        if not outputs:
+            return
+        for record in records:
+            for mutator, add in outputs:
+                mutated = mutator(record)
+                if mutated is not None:
+                    add(section, mutated)
+
+
+class ManifestCollector(object):
+
+    """
+    @brief      Writer collecting the mutated records into a manifest
+    """
+
+    def __init__(self):
+        self.manifest = collections.OrderedDict()
+
+    def start_section(self, section):
+        self.manifest[section] = []
+
+    def add(self, section, record):
+        self.manifest[section].append(record)
+
+    def close(self):
+        pass
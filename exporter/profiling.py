@@ -0,0 +1,169 @@
+import time
+import inspect
+import functools
+import threading
+import contextlib
+import collections
+
+from .exceptions import ExporterException
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class PhaseStats(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+
+class PhaseTimer(object):
+
+    """
+    @brief      Thread safe wall clock and CPU time accounting of named phases
+
+    Phases can be nested, the time of a phase includes the one of the
+    phases it runs. The CPU time is the one of the whole process, hence
+    it also accounts for the other threads running at the same time.
+    """
+
+    def __init__(self, clock=time.time, cpu_clock=time.process_time):
+        self._clock = clock
+        self._cpu_clock = cpu_clock
+        self._phases = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall, cpu = self._clock(), self._cpu_clock()
+        try:
+            yield
+        finally:
+            self.record(name, self._clock() - wall, self._cpu_clock() - cpu)
+
+    def record(self, name, wall, cpu):
+        with self._lock:
+            stats = self._phases.get(name)
+            if stats is None:
+                stats = self._phases[name] = PhaseStats()
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+
+    def asdict(self):
+        with self._lock:
+            return collections.OrderedDict(
+                (name, collections.OrderedDict([
+                    ("calls", stats.calls), ("wall", stats.wall), ("cpu", stats.cpu)]))
+                for name, stats in self._phases.items())
+
+    def reset(self):
+        with self._lock:
+            self._phases.clear()
+
+    def report(self, total=None):
+        """
+        @brief      Table of the phases in the order they first started
+        """
+        phases = self.asdict()
+        if total is None:
+            total = sum(p["wall"] for p in phases.values()) or 1.0
+        lines = ["%-48s %7s %10s %10s %7s" % ("phase", "calls", "wall", "cpu", "%")]
+        for name, p in phases.items():
+            lines.append("%-48s %7i %9.3fs %9.3fs %6.1f%%" % (
+                name, p["calls"], p["wall"], p["cpu"], 100.0 * p["wall"] / total))
+        return "\n".join(lines)
+
+
+timings = PhaseTimer()
+
+_recording = threading.local()
+
+
+def current_timings():
+    """
+    @brief      The timer the phases of the calling thread are accounted to
+
+    The module `timings` unless the thread runs within `recording`.
+    """
+    return getattr(_recording, "timer", None) or timings
+
+
+@contextlib.contextmanager
+def recording(timer):
+    """
+    @brief      Account the phases of the calling thread to `timer` meanwhile
+    """
+    previous = getattr(_recording, "timer", None)
+    _recording.timer = timer
+    try:
+        yield timer
+    finally:
+        _recording.timer = previous
+
+
+def timed(name):
+    """
+    @brief      Decorator accounting every call of a function to the `name` phase
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with current_timings().phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_phases(*prefixes):
+    """
+    @brief      Class decorator timing the methods whose name starts with a prefix
+
+    Every method gets its own `Class.method` phase.
+    """
+    def decorator(cls):
+        for name, method in list(vars(cls).items()):
+            if inspect.isfunction(method) and name.startswith(prefixes):
+                setattr(cls, name, timed("%s.%s" % (cls.__name__, name))(method))
+        return cls
+    return decorator
+
+
+@contextlib.contextmanager
+def profiled(profiler, path):
+    """
+    @brief      Run the enclosed block under `cprofile` or `pyinstrument`
+
+    The cProfile stats are dumped to `path` (see `pstats`), pyinstrument,
+    which is an optional dependency, writes an HTML report.
+    """
+    if profiler is None:
+        yield
+        return
+    if profiler == "cprofile":
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(path)
+    elif profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ExporterException(
+                "EXPORTER_PROFILE=pyinstrument requires the pyinstrument package")
+        profile = Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            with open(path, "w") as stream:
+                stream.write(profile.output_html())
+    else:
+        raise ExporterException("Unknown profiler %s, use one of %s" %
+                                (profiler, ", ".join(PROFILERS)))
@@ -0,0 +1,188 @@
+import time
+import random
+import threading
+import contextlib
+import email.utils
+
+THROTTLED = (429, 503)
+
+
+class TokenBucket(object):
+
+    """
+    @brief      Thread safe token bucket allowing `rate` requests per second
+
+    Up to `burst` requests can be issued at once after a quiet period,
+    `pause_until` holds every request back until a point in time.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        self._rate = float(rate)
+        self._burst = float(burst or max(rate, 1))
+        self._tokens = self._burst
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause_until(self, timestamp):
+        with self._lock:
+            self._paused_until = max(self._paused_until, timestamp)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                wait = self._reserve()
+            if wait <= 0:
+                return
+            self._sleep(wait)
+
+    def _reserve(self):
+        now = self._clock()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._rate > 0:
+            self._tokens = min(self._burst,
+                               self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self._rate
+            self._tokens -= 1
+        return 0
+
+
+class AdaptiveLimit(object):
+
+    """
+    @brief      Concurrency limit adjusted by additive increase and multiplicative decrease
+
+    The limit is halved every time the API throttles a request, and
+    raised by one after as many successful requests as the limit.
+    """
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class RateLimiter(object):
+
+    """
+    @brief      Pace the API requests after the rate limit the API advertises
+
+    Requests go through a token bucket and an adaptive concurrency
+    limit. When a response tells that no request is left until the
+    `X-RateLimit-Reset` time, no other request is sent until then.
+    """
+
+    def __init__(self, rate=0, burst=None, max_concurrency=10, max_pause=300,
+                 clock=time.time, sleep=time.sleep):
+        self.bucket = TokenBucket(rate, burst, clock=clock, sleep=sleep)
+        self.concurrency = AdaptiveLimit(max_concurrency)
+        self._max_pause = max_pause
+        self._clock = clock
+
+    @contextlib.contextmanager
+    def slot(self):
+        """
+        @brief      Wait for the right to send a request, the block yields a
+                    callable to report the response, or None on failure
+        """
+        self.bucket.acquire()
+        self.concurrency.acquire()
+        outcome = {"throttled": False}
+
+        def observe(response):
+            if response is None:
+                return
+            outcome["throttled"] = response.status_code in THROTTLED
+            self.observe_headers(response.headers)
+
+        try:
+            yield observe
+        finally:
+            self.concurrency.release(outcome["throttled"])
+
+    def observe_headers(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining, reset = int(remaining), float(reset)
+        except ValueError:
+            return
+        if remaining <= 0:
+            self.bucket.pause_until(min(reset, self._clock() + self._max_pause))
+
+
+def retry_after(headers, clock=time.time):
+    """
+    @brief      Seconds to wait according to a `Retry-After` header, if any
+    """
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0.0, email.utils.mktime_tz(parsed) - clock())
+
+
+class RetryPolicy(object):
+
+    """
+    @brief      When and how long to wait before retrying an idempotent request
+
+    Requests failing to connect or throttled by the API are retried up
+    to `max_retries` times, waiting an exponentially growing delay with
+    full jitter, or longer if the API asks so with `Retry-After`.
+    """
+
+    idempotent = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, max_retries=5, backoff=0.5, max_backoff=60, jitter=random.uniform):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._jitter = jitter
+
+    def delay(self, method, attempt, response=None):
+        """
+        @return     the seconds to wait before the next attempt, None not to retry
+        """
+        if method not in self.idempotent or attempt >= self.max_retries:
+            return None
+        if response is not None and response.status_code not in THROTTLED:
+            return None
+        delay = self._jitter(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if response is not None:
+            delay = max(delay, min(self.max_backoff, retry_after(response.headers) or 0))
+        return delay
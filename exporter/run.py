@@ -1,14 +1,28 @@
 import sys
-import pyaml
 import logging
 import os
 import re
 import json
+import time
 import uuid
+import threading
 
 from jinja2 import Environment, PackageLoader
 from . import config as cfg
 from .exporter import Exporter
+from .cache import ResponseCache, ResponseStore, parse_ttls
+from .manifest import save_raw_manifest, load_raw_manifest
+from .transport import Transport
+from .selection import Selection
+from .snapshot import SnapshotWriter, SnapshotReader, ReplayCF
+from .ratelimit import RateLimiter, RetryPolicy
+from .metrics import RequestMetrics
+from .profiling import PhaseTimer, timings, current_timings, recording, profiled, PROFILERS
+from .exceptions import ExporterException
+from .targets import Target, load_targets
+from .concurrency import TaskRunner
+from .writers import TerraformWriter, ManifestWriter, TERRAFORM_TEMPLATES
+from .pipeline import MutationPipeline, SECTIONS
 from cfconfigurator.cf import CF
 from .mutations import TerraformMutation, CFConfiguratorMutation
 
@@ -34,63 +48,290 @@ def main():
 
 			Optional env variables are:
 			EXPORTER_OUTPUT_FILE env variable to set the name of the output file (default is output)
-			EXPORTER_EXCLUDE_ENV_VARS env variable to exclude env variables."""
+			EXPORTER_EXCLUDE_ENV_VARS env variable to exclude env variables.
+			EXPORTER_INCLUDE_ORGS env variable to only export the orgs matching a list of names or globs
+			EXPORTER_EXCLUDE_ORGS env variable to skip the orgs matching a list of names or globs
+			EXPORTER_INCLUDE_TYPES env variable to only export some resource types ie. users,orgs
+			EXPORTER_EXCLUDE_TYPES env variable to skip some resource types ie. feature_flags,shared_domains
+			EXPORTER_PAGE_SIZE env variable to set the number of results per page (default is 100)
+			EXPORTER_CONCURRENCY env variable to set the number of concurrent API requests (default is 1)
+			EXPORTER_UAA_BULK env variable to list all UAA users at once instead of one by one (default is true)
+			EXPORTER_UAA_PAGE_SIZE env variable to set the number of UAA users per page (default is 500)
+			EXPORTER_CACHE_MAX_ENTRIES env variable to bound the number of cached responses (default is unbounded)
+			EXPORTER_CACHE_MAX_BYTES env variable to bound the size of cached responses (default is unbounded)
+			EXPORTER_CACHE_TTLS env variable to expire cached responses by url prefix ie. /v2/spaces=60,/v2/users=30
+			EXPORTER_CACHE_DB env variable to persist API responses between runs in a SQLite file
+			EXPORTER_CACHE_DB_MAX_AGE env variable to set how long persisted responses are reused (default is 0)
+			EXPORTER_CACHE_DB_TTLS env variable to set the max age of persisted responses by url prefix
+			EXPORTER_RAW_MANIFEST env variable to save the raw manifest to a file, in a binary format when it ends in .bin
+			EXPORTER_FROM_RAW_MANIFEST env variable to only write the outputs of the saved raw manifest, without the API
+			EXPORTER_INCREMENTAL env variable to only reload what changed since the saved raw manifest
+			EXPORTER_BULK_ROLES env variable to load org and space roles from the users listing
+			EXPORTER_POOL_SIZE env variable to set the number of pooled HTTP connections per host
+			EXPORTER_HTTP_COMPRESSION env variable to request gzip compressed responses (default is true)
+			EXPORTER_METRICS_FILE env variable to save the API request metrics to a .json or Prometheus .prom file
+			EXPORTER_PROFILE env variable to profile the run with cprofile or pyinstrument
+			EXPORTER_PROFILE_FILE env variable to set the name of the profile file
+			EXPORTER_TARGETS_FILE env variable to export the foundations listed in a YAML file instead
+			EXPORTER_TARGETS_CONCURRENCY env variable to set the number of foundations exported at once
+			EXPORTER_MAX_REQUESTS env variable to cap the API requests in flight across all the foundations
+			EXPORTER_RATE_LIMIT env variable to cap the API requests per second of a foundation (default is unbounded)
+			EXPORTER_RATE_BURST env variable to set how many requests can be sent at once within the rate limit
+			EXPORTER_MAX_RETRIES env variable to set how many times throttled or failed GETs are retried (default is 5)
+			EXPORTER_RETRY_BACKOFF env variable to set the base delay in seconds between retries (default is 0.5)
+			EXPORTER_SNAPSHOT env variable to record the API responses to a snapshot file
+			EXPORTER_REPLAY env variable to export from a snapshot file, without credentials nor network"""
 
-    if (cfg.api_url is None) or (cfg.admin_user is None) or (cfg.admin_password is None):
+    offline = cfg.replay is not None or cfg.from_raw_manifest
+    if cfg.targets_file is None and not offline and (
+            (cfg.api_url is None) or (cfg.admin_user is None) or (cfg.admin_password is None)):
         logger.critical(logger_message)
         valid_config = False
     if not valid_config:
         sys.exit(1)
 
+    if cfg.incremental and cfg.raw_manifest is None:
+        logger.critical("EXPORTER_INCREMENTAL requires EXPORTER_RAW_MANIFEST to be set")
+        sys.exit(1)
+
+    if cfg.from_raw_manifest and cfg.raw_manifest is None:
+        logger.critical("EXPORTER_FROM_RAW_MANIFEST requires EXPORTER_RAW_MANIFEST to be set")
+        sys.exit(1)
+
+    if cfg.snapshot is not None and cfg.replay is not None:
+        logger.critical("EXPORTER_SNAPSHOT and EXPORTER_REPLAY can not be set together")
+        sys.exit(1)
+
+    if cfg.targets_file is not None:
+        try:
+            targets = load_targets(cfg.targets_file)
+        except ExporterException as ee:
+            logger.critical(str(ee))
+            sys.exit(1)
+    else:
+        targets = [Target("default", cfg.api_url, cfg.admin_user, cfg.admin_password)]
+
     logger.info("Start exporting configuration...")
-    logger.info("CF api endpoint set to %s" % cfg.api_url)
+    for target in targets:
+        logger.info("CF api endpoint set to %s" % target.api_url)
+    logger.info("Loading resources with %i concurrent workers" % cfg.concurrency)
     logger.info("Excluding the following env variables from the manifest: %s" %
                 cfg.exclude_env_vars)
+    try:
+        selection = Selection(cfg.include_orgs, cfg.exclude_orgs,
+                              cfg.include_types, cfg.exclude_types)
+    except ExporterException as ee:
+        logger.critical(str(ee))
+        sys.exit(1)
+    logger.info("Exporting %s" % selection.describe())
 
-    cf_client = CF(cfg.api_url)
-    cf_client.login(cfg.admin_user, cfg.admin_password)
+    if cfg.profile is not None and cfg.profile not in PROFILERS:
+        logger.critical("EXPORTER_PROFILE must be one of %s" % ", ".join(PROFILERS))
+        sys.exit(1)
 
-    exp = Exporter(cf_client, exclude_vars=cfg.exclude_env_vars)
-    exp.generate_manifest()
+    start = time.time()
+    profile_file = cfg.profile_file or default_profile_file(cfg.profile)
+    try:
+        with profiled(cfg.profile, profile_file):
+            failed = export_targets(targets)
+    except ExporterException as ee:
+        logger.critical(str(ee))
+        sys.exit(1)
+    if cfg.profile is not None:
+        logger.info("Profile saved to '%s' file..." % profile_file)
+
+    if len(targets) == 1:
+        # the targets exported together report their phases one by one
+        logger.info("Time spent by phase:\n%s" % timings.report(time.time() - start))
+    if failed:
+        logger.critical("Export failed for: %s" % ", ".join(failed))
+        sys.exit(1)
 
-    tm = TerraformMutation(exp.manifest)
-    terraform_manifest = tm.mutate_manifest()
-    export_cf_terraform_config(terraform_manifest)
 
-    cc = CFConfiguratorMutation(exp.manifest)
-    cc_manifest = cc.mutate_manifest()
-    export_cf_configurator_config(cc_manifest)
+def default_profile_file(profiler):
+    if profiler == "pyinstrument":
+        return "exporter-profile.html"
+    return "exporter.prof"
 
 
-def export_cf_terraform_config(manifest, output_folder="output_terraform"):
+def export_targets(targets):
+    """
+    @brief      Export every target, several at once when configured so
+
+    @return     the names of the targets whose export failed
+    """
+    if len(targets) == 1:
+        export(targets[0])
+        return []
+
+    # compile the templates once, before the exports share them
+    for template_name in TERRAFORM_TEMPLATES:
+        env.get_template('terraform/' + template_name + ".j2")
+    env.get_template('manifest.j2')
+
+    limiter = None
+    if cfg.max_requests:
+        limiter = threading.BoundedSemaphore(cfg.max_requests)
+
+    def export_target(target):
+        # the phases of every target are accounted apart
+        timer, start = PhaseTimer(), time.time()
+        try:
+            with recording(timer):
+                export(target, limiter=limiter)
+            return None
+        except (Exception, ExporterException) as e:
+            logger.exception("Export of %s failed: %s" % (target.name, e))
+            return target.name
+        finally:
+            logger.info("Time spent by phase for %s:\n%s" % (
+                target.name, timer.report(time.time() - start)))
 
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    runner = TaskRunner(cfg.targets_concurrency or len(targets))
+    try:
+        return [name for name in runner.map(export_target, targets) if name is not None]
+    finally:
+        runner.shutdown()
 
-    for template_name in ["user", "org", "quota", "security_group", "config"]:
-        with open(os.path.join(output_folder, template_name + ".tf"), "w") as stream:
-            template = env.get_template('terraform/' + template_name + ".j2")
-            rendered = template.render(manifest=manifest)
-            stream.write(rendered)
 
-    with open(os.path.join(output_folder, "terraform.tfstate"), "w") as tf_state_file:
-        template = env.get_template('tfstate/tfstate.j2')
-        lineage = str(uuid.uuid4())
-        tf_state = template.render(manifest=manifest, lineage=lineage)
-        tf_state_file.write(tf_state)
+def export(target, limiter=None):
+    """
+    @brief      Export the configuration of a single foundation
+    """
+    if target.output_dir is not None and not os.path.exists(target.output_dir):
+        os.makedirs(target.output_dir)
+    raw_manifest = target.path(cfg.raw_manifest)
+    if cfg.from_raw_manifest:
+        with current_timings().phase("load_raw_manifest"):
+            manifest, exported_at = load_raw_manifest(raw_manifest)
+        logger.info("Writing the outputs of the raw manifest exported at %s from '%s' file..." % (
+            exported_at, raw_manifest))
+        write_outputs(target, manifest)
+        return
+
+    cache_db = target.path(cfg.cache_db)
+    metrics_file = target.path(cfg.metrics_file)
+    snapshot_file = target.path(cfg.snapshot)
+    replay_file = target.path(cfg.replay)
+
+    logger.info("Exporting the %s foundation..." % target.name)
+    snapshot = None
+    if replay_file is not None:
+        logger.info("Replaying the API responses of the %s snapshot" % replay_file)
+        cf_client = ReplayCF(SnapshotReader(replay_file))
+        cf_client.login(target.admin_user, target.admin_password)
+    else:
+        with current_timings().phase("login"):
+            cf_client = CF(target.api_url)
+            cf_client.login(target.admin_user, target.admin_password)
+        if snapshot_file is not None:
+            logger.info("Recording the API responses to the %s snapshot" % snapshot_file)
+            snapshot = SnapshotWriter(snapshot_file)
+    if cache_db is not None and (snapshot is not None or replay_file is not None):
+        # the snapshot has to hold, or to be the only source of, every response
+        logger.info("Not using the response store while recording or replaying a snapshot")
+        cache_db = None
+
+    cache = ResponseCache(max_entries=cfg.cache_max_entries,
+                          max_bytes=cfg.cache_max_bytes,
+                          ttls=parse_ttls(cfg.cache_ttls))
+
+    store = None
+    if cache_db is not None:
+        logger.info("Persisting API responses to %s" % cache_db)
+        store = ResponseStore(cache_db, max_age=cfg.cache_db_max_age,
+                              ttls=parse_ttls(cfg.cache_db_ttls))
+
+    selection = Selection(cfg.include_orgs, cfg.exclude_orgs,
+                          cfg.include_types, cfg.exclude_types)
+    metrics = RequestMetrics()
+    rate_limiter = RateLimiter(rate=cfg.rate_limit, burst=cfg.rate_burst,
+                               max_concurrency=cfg.pool_size)
+    transport = Transport(pool_size=cfg.pool_size, compress=cfg.http_compression,
+                          metrics=metrics, limiter=limiter, rate_limiter=rate_limiter,
+                          retry=RetryPolicy(max_retries=cfg.max_retries,
+                                            backoff=cfg.retry_backoff))
+    exp = Exporter(cf_client, exclude_vars=cfg.exclude_env_vars,
+                   page_size=cfg.page_size, concurrency=cfg.concurrency,
+                   uaa_bulk=cfg.uaa_bulk, uaa_page_size=cfg.uaa_page_size,
+                   cache=cache, store=store, bulk_roles=cfg.bulk_roles,
+                   transport=transport, snapshot=snapshot, selection=selection)
+    previous, since = None, None
+    if cfg.incremental and os.path.exists(raw_manifest):
+        previous, since = load_raw_manifest(raw_manifest)
+        logger.info("Incremental export of the changes since %s" % since)
+
+    try:
+        exp.generate_manifest(previous=previous, since=since)
+    finally:
+        if store is not None:
+            store.close()
+            logger.info("Response store: %s" % store.stats)
+        if snapshot is not None:
+            snapshot.close()
+            logger.info("%i API responses recorded to '%s' snapshot..." % (
+                len(snapshot), snapshot_file))
+
+    if raw_manifest is not None:
+        with current_timings().phase("save_raw_manifest"):
+            save_raw_manifest(raw_manifest, exp.manifest, exp.exported_at)
+        logger.info("Raw manifest saved to '%s' file..." % raw_manifest)
+
+    write_outputs(target, exp.manifest)
+
+    logger.info("Response cache: %s" % cache.stats)
+    logger.info("API requests:\n%s" % metrics.summary())
+    if metrics_file is not None:
+        metrics.dump(metrics_file)
+        logger.info("API request metrics saved to '%s' file..." % metrics_file)
+
+
+def write_outputs(target, manifest):
+    """
+    @brief      Mutate a raw manifest and write the Terraform and CF configurator outputs
+    """
+    output_terraform, output = target.path("output_terraform"), target.path("output")
+    with open(output, "w") as stream:
+        pipeline = MutationPipeline()
+        pipeline.register(TerraformMutation(manifest),
+                          TerraformWriter(output_terraform, env, str(uuid.uuid4())))
+        pipeline.register(CFConfiguratorMutation(manifest),
+                          ManifestWriter(stream, env.get_template('manifest.j2')))
+        pipeline.run(manifest)
+    logger.info("Terraform config exported to '%s' folder..." % output_terraform)
+    logger.info("Manifest exported to '%s' file..." % output)
+
+
+def export_cf_terraform_config(manifest, output_folder="output_terraform"):
+    """
+    @brief      Write the Terraform outputs of a manifest already mutated
+    """
+    with current_timings().phase("write terraform"):
+        writer = TerraformWriter(output_folder, env, str(uuid.uuid4()))
+        for section in SECTIONS:
+            if section in manifest:
+                writer.start_section(section)
+                for record in manifest[section]:
+                    writer.add(section, record)
+        writer.close()
 
     logger.info("Terraform config exported to '%s' folder..." %
                 (output_folder))
 
 
 def export_cf_configurator_config(manifest, output_file="output"):
-    manifest = {key: pyaml.dump({key: value})
-                for key, value in manifest.items()}
-
-    template = env.get_template('manifest.j2')
-    rendered = template.render(manifest=manifest)
-
-    with open(output_file, "w") as stream:
-        stream.write(rendered)
+    """
+    @brief      Write the CF configurator manifest of a manifest already mutated
+    """
+    with current_timings().phase("write manifest"):
+        with open(output_file, "w") as stream:
+            writer = ManifestWriter(stream, env.get_template('manifest.j2'))
+            for section in writer.sections:
+                if section not in manifest:
+                    continue
+                writer.start_section(section)
+                for record in manifest[section]:
+                    writer.add(section, record)
+            writer.close()
 
     logger.info("Manifest exported to '%s' file..." % (output_file))
@@ -0,0 +1,91 @@
+import re
+import fnmatch
+
+from requests.compat import quote
+
+from .exceptions import ExporterException
+
+# the sections of the raw manifest, in the order they are exported
+RESOURCE_TYPES = (
+    "feature_flags",
+    "staging_environment_variables",
+    "running_environment_variables",
+    "shared_domains",
+    "security_groups",
+    "quotas",
+    "users",
+    "orgs"
+)
+
+GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def split_list(value):
+    """
+    @brief      The items of a `,` or `;` separated list, without blanks
+    """
+    if not value:
+        return []
+    items = (item.strip() for item in re.split(';|,', value))
+    return [item for item in items if len(item) > 0]
+
+
+class Selection(object):
+
+    """
+    @brief      The orgs and resource types to export
+
+    Orgs are selected by name with shell style globs, resource types by
+    their name in `RESOURCE_TYPES`. Without any include everything is
+    included, the excludes are applied afterwards. When every org
+    included is a plain name, the selection is pushed down to the API
+    with a `name IN` query.
+    """
+
+    def __init__(self, include_orgs="", exclude_orgs="", include_types="", exclude_types=""):
+        self.include_orgs = split_list(include_orgs)
+        self.exclude_orgs = split_list(exclude_orgs)
+        self.include_types = split_list(include_types)
+        self.exclude_types = split_list(exclude_types)
+        unknown = set(self.include_types + self.exclude_types).difference(RESOURCE_TYPES)
+        if unknown:
+            raise ExporterException("Unknown resource types %s, expected some of %s" % (
+                ", ".join(sorted(unknown)), ", ".join(RESOURCE_TYPES)))
+
+    @property
+    def selects_orgs(self):
+        """
+        @brief      True when only some of the orgs are selected
+        """
+        return bool(self.include_orgs or self.exclude_orgs)
+
+    def includes_type(self, resource_type):
+        if self.include_types and resource_type not in self.include_types:
+            return False
+        return resource_type not in self.exclude_types
+
+    def includes_org(self, name):
+        if self.include_orgs and not any(
+                fnmatch.fnmatchcase(name, pattern) for pattern in self.include_orgs):
+            return False
+        return not any(fnmatch.fnmatchcase(name, pattern) for pattern in self.exclude_orgs)
+
+    def orgs_url(self, url="/v2/organizations"):
+        """
+        @brief      The orgs listing url, filtered by the API when possible
+        """
+        names = self.include_orgs
+        if not names or any(GLOB_CHARS.search(name) or "," in name for name in names):
+            return url
+        query = "name:%s" % names[0] if len(names) == 1 else "name IN %s" % ",".join(names)
+        return "%s?q=%s" % (url, quote(query, safe=":,"))
+
+    def describe(self):
+        parts = []
+        for label, values in (("orgs", self.include_orgs), ("types", self.include_types)):
+            if values:
+                parts.append("%s %s" % (label, ", ".join(values)))
+        for label, values in (("orgs", self.exclude_orgs), ("types", self.exclude_types)):
+            if values:
+                parts.append("all %s but %s" % (label, ", ".join(values)))
+        return "; ".join(parts) or "everything"
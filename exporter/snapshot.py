@@ -0,0 +1,196 @@
+"""
+Snapshots of the API responses of an export, and their offline replay.
+
+A snapshot is a zip archive holding one compressed entry per response,
+named after a hash of the requested url, so that any response can be
+read without going through the others. `index.json` lists the urls
+recorded and `snapshot.json` the API endpoints they were recorded from.
+"""
+import json
+import time
+import zipfile
+import hashlib
+import threading
+import collections
+
+import requests
+from cfconfigurator.cf import CF, CFException
+from cfconfigurator.uaa import UAA, UAAException
+
+from .exceptions import ExporterException
+
+SNAPSHOT_VERSION = 1
+EXCEPTIONS = {"CFException": CFException, "UAAException": UAAException}
+
+
+def snapshot_key(method, url, params=None):
+    """
+    @brief      The key of a request, with its query parameters sorted
+    """
+    if params:
+        url = "%s?%s" % (url, requests.compat.urlencode(sorted(params.items())))
+    return "%s %s" % (method, url)
+
+
+def entry_name(key):
+    return "responses/%s.json" % hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def exception_response(exception):
+    """
+    @brief      The response a CF or UAA exception was raised for
+    """
+    if isinstance(exception, CFException):
+        body = {"description": exception.description, "code": exception.code,
+                "error_code": exception.error_code}
+    else:
+        body = {"description": exception.description, "error": exception.error,
+                "message": exception.message}
+    return {"exception": type(exception).__name__, "body": body,
+            "code": exception.http_code}
+
+
+class SnapshotWriter(object):
+
+    """
+    @brief      Record the GET responses of the CF and UAA clients into a snapshot
+
+    `install` wraps the `_request` method of a client, the one every
+    request, paged or not, goes through. Call `close` once the export
+    is done, the archive can only be read afterwards.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self._archive = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        self._index = collections.OrderedDict()
+        self._endpoints = {}
+        self._rerecorded = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._index)
+
+    def install(self, client):
+        request = client._request
+        self._endpoints[type(client).__name__] = client.api_url
+
+        def recording_request(method, url, params=None, http_headers=None, data=None):
+            if method != "GET":
+                return request(method, url, params, http_headers, data)
+            try:
+                body, code = request(method, url, params, http_headers, data)
+            except (CFException, UAAException) as e:
+                self.record(snapshot_key(method, url, params), exception_response(e))
+                raise
+            self.record(snapshot_key(method, url, params), {"body": body, "code": code})
+            return body, code
+
+        client._request = recording_request
+
+    def record(self, key, response):
+        data = json.dumps(dict(response, key=key))
+        with self._lock:
+            # zip entries can not be replaced, a request sent again, like
+            # after a new login, gets a new entry the index points to instead
+            name = entry_name(key)
+            if key in self._index:
+                self._rerecorded += 1
+                name = "%s.%i" % (name, self._rerecorded)
+            self._archive.writestr(name, data)
+            self._index[key] = name
+
+    def close(self):
+        with self._lock:
+            metadata = {"version": SNAPSHOT_VERSION, "recorded_at": self._clock(),
+                        "api_url": self._endpoints.get("CF"),
+                        "uaa_url": self._endpoints.get("UAA")}
+            self._archive.writestr("snapshot.json", json.dumps(metadata))
+            self._archive.writestr("index.json", json.dumps(self._index))
+            self._archive.close()
+
+
+class SnapshotReader(object):
+
+    """
+    @brief      Random access by request to the responses of a snapshot
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self._archive = zipfile.ZipFile(path, "r")
+            self.metadata = json.loads(self._archive.read("snapshot.json").decode("utf-8"))
+            self.index = json.loads(self._archive.read("index.json").decode("utf-8"))
+        except (IOError, KeyError, ValueError, zipfile.BadZipfile) as e:
+            raise ExporterException("Invalid snapshot %s: %s" % (path, e))
+        if self.metadata.get("version") != SNAPSHOT_VERSION:
+            raise ExporterException("Unsupported version %s of snapshot %s" % (
+                self.metadata.get("version"), path))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def response(self, method, url, params=None):
+        """
+        @brief      The `(body, status_code)` recorded for a request, raising
+                    again the CF or UAA exception it failed with
+        """
+        key = snapshot_key(method, url, params)
+        name = self.index.get(key)
+        if name is None:
+            raise ExporterException(
+                "%s is not in the snapshot %s, replay it with the settings it was "
+                "recorded with (page sizes, bulk modes)" % (key, self.path))
+        with self._lock:
+            response = json.loads(self._archive.read(name).decode("utf-8"))
+        if "exception" in response:
+            raise EXCEPTIONS[response["exception"]](response["body"], response["code"])
+        return response["body"], response["code"]
+
+    def close(self):
+        self._archive.close()
+
+
+class ReplayUAA(UAA):
+
+    """
+    @brief      UAA client answering from a snapshot, without any network
+    """
+
+    def __init__(self, snapshot):
+        super(ReplayUAA, self).__init__(snapshot.metadata["uaa_url"])
+        self.snapshot = snapshot
+
+    def _request(self, method, url, params=None, http_headers=None, data=None):
+        return self.snapshot.response(method, url, params)
+
+    def login(self, username=None, password=''):
+        return {"token_type": "bearer", "access_token": "replay"}
+
+
+class ReplayCF(CF):
+
+    """
+    @brief      CF client answering from a snapshot, without any network
+
+    Only the requests recorded can be replayed, hence the export has to
+    run with the settings it was recorded with.
+    """
+
+    def __init__(self, snapshot):
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "User-Agent": self.user_agent})
+        self.api_url = snapshot.metadata["api_url"]
+        self.uaa = ReplayUAA(snapshot)
+        self.snapshot = snapshot
+        self.username = None
+        self.password = ''
+
+    def _request(self, method, url, params=None, http_headers=None, data=None):
+        return self.snapshot.response(method, url, params)
@@ -0,0 +1,68 @@
+import os
+import yaml
+
+from .exceptions import ExporterException
+
+
+class Target(object):
+
+    """
+    @brief      A foundation to export and the directory its outputs go to
+
+    Without an output directory the outputs are written to the
+    current one.
+    """
+
+    def __init__(self, name, api_url, admin_user, admin_password, output_dir=None):
+        self.name = name
+        self.api_url = api_url
+        self.admin_user = admin_user
+        self.admin_password = admin_password
+        self.output_dir = output_dir
+
+    def path(self, filename):
+        """
+        @brief      Path of an output file of this target, None stays None
+        """
+        if filename is None or self.output_dir is None:
+            return filename
+        return os.path.join(self.output_dir, filename)
+
+
+def load_targets(path, environ=os.environ):
+    """
+    @brief      Load the list of foundations to export from a YAML file
+
+    Every entry needs a `name`, an `api_url`, an `admin_user` and either
+    an `admin_password` or the `admin_password_env` variable holding it.
+    The outputs go to `output_dir`, which defaults to the target name.
+    """
+    with open(path) as stream:
+        try:
+            entries = yaml.safe_load(stream)
+        except yaml.YAMLError as ye:
+            raise ExporterException("Invalid targets file %s: %s" % (path, ye))
+    if not isinstance(entries, list) or not entries:
+        raise ExporterException("The targets file %s must hold a list of targets" % path)
+
+    targets = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ExporterException("Target %i in %s must be a mapping, not %r" % (
+                len(targets) + 1, path, entry))
+        missing = [key for key in ("name", "api_url", "admin_user") if not entry.get(key)]
+        if missing:
+            raise ExporterException("Target %s is missing %s" % (
+                entry.get("name", len(targets) + 1), ", ".join(missing)))
+        password = entry.get("admin_password")
+        if password is None and entry.get("admin_password_env"):
+            password = environ.get(entry["admin_password_env"])
+        if password is None:
+            raise ExporterException("No admin password for target %s" % entry["name"])
+        targets.append(Target(str(entry["name"]), entry["api_url"], entry["admin_user"],
+                              password, entry.get("output_dir", str(entry["name"]))))
+
+    names = [target.name for target in targets]
+    if len(set(names)) != len(names):
+        raise ExporterException("The target names in %s must be unique" % path)
+    return targets
@@ -0,0 +1,105 @@
+import time
+import logging
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+logger = logging.getLogger(__name__)
+
+
+class Transport(HTTPAdapter):
+
+    """
+    @brief      Pooled keep-alive HTTP transport for the CF and UAA clients
+
+    The connection pool is sized after the export concurrency and blocks
+    when all its connections are busy, so that every worker reuses an
+    established connection instead of opening (and discarding) a new one.
+    When `metrics` are given every request going through the transport
+    is recorded there, cached responses never reach it. A `limiter`
+    semaphore shared by several transports caps the number of requests
+    they have in flight altogether.
+    A `rate_limiter` paces the requests after the rate limit of the API,
+    the `limiter` is only taken once it lets a request go, and the
+    `retry` policy decides which failed requests are sent again.
+    """
+
+    def __init__(self, pool_size=10, compress=True, metrics=None, limiter=None,
+                 rate_limiter=None, retry=None, sleep=time.sleep):
+        self.pool_size = pool_size
+        self.compress = compress
+        self.metrics = metrics
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self._sleep = sleep
+        super(Transport, self).__init__(pool_connections=2,
+                                        pool_maxsize=pool_size,
+                                        pool_block=True)
+
+    def install(self, session):
+        """
+        @brief      Route all the requests of a `requests.Session` through this transport
+        """
+        session.mount("https://", self)
+        session.mount("http://", self)
+        session.headers["Connection"] = "keep-alive"
+        if self.compress:
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+        else:
+            session.headers["Accept-Encoding"] = "identity"
+
+    def send(self, request, stream=False, **kwargs):
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                response = self._throttled_send(request, stream=stream, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                error = e
+            delay = None
+            if self.retry is not None:
+                delay = self.retry.delay(request.method, attempt, response)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            logger.warning("Retrying %s %s in %.1fs after %s" % (
+                request.method, request.url, delay,
+                error if response is None else "HTTP %i" % response.status_code))
+            if response is not None:
+                response.close()
+            attempt += 1
+            self._sleep(delay)
+
+    def _throttled_send(self, request, stream=False, **kwargs):
+        # the rate limit of this foundation is waited for first, a throttled
+        # foundation never holds the requests shared with the others meanwhile
+        if self.rate_limiter is None:
+            return self._limited_send(request, stream=stream, **kwargs)
+        with self.rate_limiter.slot() as observe:
+            response = self._limited_send(request, stream=stream, **kwargs)
+            observe(response)
+            return response
+
+    def _limited_send(self, request, stream=False, **kwargs):
+        if self.limiter is None:
+            return self._send(request, stream=stream, **kwargs)
+        with self.limiter:
+            return self._send(request, stream=stream, **kwargs)
+
+    def _send(self, request, stream=False, **kwargs):
+        if self.metrics is None:
+            return super(Transport, self).send(request, stream=stream, **kwargs)
+        start = time.time()
+        try:
+            response = super(Transport, self).send(request, stream=stream, **kwargs)
+        except Exception:
+            self.metrics.record(request.method, request.url, time.time() - start, 0, None)
+            raise
+        # the session would read the body right away, do it here so that
+        # the latency includes the download
+        size = 0 if stream else len(response.content)
+        self.metrics.record(request.method, request.url, time.time() - start, size,
+                            response.status_code)
+        return response
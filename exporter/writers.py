@@ -0,0 +1,290 @@
+import os
+import re
+import json
+import collections
+
+from .yaml_emitter import dump_section
+
+
+TERRAFORM_VERSION = "0.10.2"
+
+# sections of the Terraform state, in the order they are written
+TFSTATE_SECTIONS = ("cf_security_groups", "cf_quotas", "cf_users", "cf_orgs")
+
+# Terraform templates and the manifest section each one renders
+TERRAFORM_TEMPLATES = collections.OrderedDict([
+    ("user", "cf_users"),
+    ("org", "cf_orgs"),
+    ("quota", "cf_quotas"),
+    ("security_group", "cf_security_groups"),
+    ("config", "cf_feature_flags")
+])
+
+SECTION_MARKER = "\x00section:%s\x00"
+SECTION_MARKER_RE = re.compile("\x00section:(.*?)\x00")
+
+
+def tfstate_resource(resource_type, resource_id, attributes, depends_on=True):
+    resource = collections.OrderedDict()
+    resource["type"] = resource_type
+    if depends_on:
+        resource["depends_on"] = []
+    resource["primary"] = collections.OrderedDict([
+        ("id", resource_id),
+        ("attributes", attributes),
+        ("meta", {}),
+        ("tainted", False)
+    ])
+    resource["deposed"] = []
+    resource["provider"] = ""
+    return resource
+
+
+def tfstate_resources(manifest):
+    """
+    @brief      Lazily generate the `(name, resource)` pairs of a Terraform state
+
+    @param      manifest  The manifest produced by the TerraformMutation
+    """
+    yield "cf_config.cf_config", tfstate_resource(
+        "cf_config", "config", {"id": "config"})
+
+    for section in TFSTATE_SECTIONS:
+        for record in manifest[section]:
+            for resource in record_tfstate_resources(section, record):
+                yield resource
+
+
+def record_tfstate_resources(section, record):
+    """
+    @brief      The `(name, resource)` pairs of a single record of the manifest
+                produced by the TerraformMutation
+    """
+    if section == "cf_security_groups":
+        yield "cf_asg.asg_%s" % record["name"], tfstate_resource(
+            "cf_asg", record["guid"], {"name": record["name"]})
+
+    elif section == "cf_quotas":
+        yield "cf_quota.quota_%s" % record["name"], tfstate_resource(
+            "cf_quota", record["guid"], {"name": record["name"]})
+
+    elif section == "cf_users":
+        yield "cf_user.user_%s" % record["resource_name"], tfstate_resource(
+            "cf_user", record["guid"], {"name": record["name"]})
+
+    elif section == "cf_orgs":
+        yield "cf_org.org_%s" % record["resource_name"], tfstate_resource(
+            "cf_org", record["guid"], {"name": record["name"]})
+
+        for space in record["spaces"]:
+            attributes = collections.OrderedDict([
+                ("name", space["name"]),
+                ("org", "${cf_org.org_%s.id}" % record["resource_name"])
+            ])
+            yield "cf_space.space_%s" % space["resource_name"], tfstate_resource(
+                "cf_space", space["guid"], attributes, depends_on=False)
+
+
+class TfStateWriter(object):
+
+    """
+    @brief      Write a Terraform state resource by resource
+
+    Only the resource being encoded is held in memory, the
+    rest of the state is written to `stream` as it is generated.
+    """
+
+    def __init__(self, stream, lineage):
+        self._stream = stream
+        self._encoder = json.JSONEncoder(indent=4)
+        self._separator = '\n'
+        stream.write('{\n    "version": 1,\n')
+        stream.write('    "terraform_version": %s,\n' % json.dumps(TERRAFORM_VERSION))
+        stream.write('    "serial": 1,\n')
+        stream.write('    "lineage": %s,\n' % json.dumps(lineage))
+        stream.write('    "modules": [\n    {\n')
+        stream.write('        "path": [\n            "root"\n        ],\n')
+        stream.write('        "outputs": {},\n')
+        stream.write('        "resources": {')
+        self.write_resource("cf_config.cf_config", tfstate_resource(
+            "cf_config", "config", {"id": "config"}))
+
+    def start_section(self, section):
+        pass
+
+    def add(self, section, record):
+        for name, resource in record_tfstate_resources(section, record):
+            self.write_resource(name, resource)
+
+    def write_resource(self, name, resource):
+        stream = self._stream
+        stream.write(self._separator)
+        stream.write('            %s: ' % json.dumps(name))
+        for chunk in self._encoder.iterencode(resource):
+            # encoded strings never contain raw newlines, only indentation does
+            stream.write(chunk.replace('\n', '\n            '))
+        self._separator = ',\n'
+
+    def close(self):
+        self._stream.write('\n        },\n')
+        self._stream.write('        "depends_on": []\n    }\n    ]\n}\n')
+
+
+def write_tfstate(stream, manifest, lineage):
+    """
+    @brief      Write the Terraform state of a whole manifest to `stream`
+    """
+    writer = TfStateWriter(stream, lineage)
+    for section in TFSTATE_SECTIONS:
+        for record in manifest[section]:
+            writer.add(section, record)
+    writer.close()
+
+
+class TemplateWriter(object):
+
+    """
+    @brief      Render a template looping over a manifest section, batch by batch
+
+    The template gets a manifest holding only the current batch of
+    records. What the template renders around its loop is written once,
+    which requires nothing to be rendered after the loop. Templates
+    which are not a loop over the records, like the feature flags one,
+    get all the records at once with a `batch_size` of None.
+    """
+
+    def __init__(self, stream, template, section, batch_size=500):
+        self._stream = stream
+        self._template = template
+        self._section = section
+        self._batch_size = batch_size
+        self._batch = []
+        self._prefix = None
+
+    def start_section(self, section):
+        pass
+
+    def add(self, section, record):
+        self._batch.append(record)
+        if self._batch_size is not None and len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        rendered = self._template.render(manifest={self._section: self._batch})
+        if self._prefix is None:
+            self._prefix = self._template.render(manifest={self._section: []})
+        elif self._batch_size is not None:
+            rendered = rendered[len(self._prefix):]
+        self._stream.write(rendered)
+        self._batch = []
+
+    def close(self):
+        if self._batch or self._prefix is None:
+            self.flush()
+
+
+class TerraformWriter(object):
+
+    """
+    @brief      Write the Terraform configuration and state of a manifest
+                produced by the TerraformMutation, record by record
+    """
+
+    def __init__(self, output_folder, env, lineage, batch_size=500):
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+        self._streams = []
+        self._writers = collections.defaultdict(list)
+        for template_name, section in TERRAFORM_TEMPLATES.items():
+            stream = open(os.path.join(output_folder, template_name + ".tf"), "w")
+            self._streams.append(stream)
+            template = env.get_template('terraform/' + template_name + ".j2")
+            self._writers[section].append(TemplateWriter(
+                stream, template, section,
+                None if section == "cf_feature_flags" else batch_size))
+        stream = open(os.path.join(output_folder, "terraform.tfstate"), "w")
+        self._streams.append(stream)
+        self._tfstate = TfStateWriter(stream, lineage)
+
+    def start_section(self, section):
+        pass
+
+    def add(self, section, record):
+        for writer in self._writers[section]:
+            writer.add(section, record)
+        self._tfstate.add(section, record)
+
+    def close(self):
+        try:
+            for writers in self._writers.values():
+                for writer in writers:
+                    writer.close()
+            self._tfstate.close()
+        finally:
+            for stream in self._streams:
+                stream.close()
+
+
+class SectionMarkers(object):
+
+    def __getitem__(self, section):
+        return SECTION_MARKER % section
+
+
+class ManifestWriter(object):
+
+    """
+    @brief      Write the CF configurator manifest, batch by batch
+
+    The template is rendered once with a marker in place of every
+    section, the YAML of the records of a section is then written in
+    place of its marker, `batch_size` records at a time. Sections have
+    to be written in the order the template shows them, the ones which
+    are skipped render empty.
+    """
+
+    def __init__(self, stream, template, batch_size=500):
+        self._stream = stream
+        self._batch_size = batch_size
+        self._parts = collections.deque(
+            SECTION_MARKER_RE.split(template.render(manifest=SectionMarkers())))
+        # texts and section names alternate in the parts
+        self.sections = list(self._parts)[1::2]
+        self._section = None
+        self._batch = []
+        self._started = False
+
+    def start_section(self, section):
+        self.end_section()
+        if section not in list(self._parts)[1::2]:
+            return
+        while True:
+            self._stream.write(self._parts.popleft())
+            if self._parts.popleft() == section:
+                break
+        self._section = section
+
+    def add(self, section, record):
+        if section != self._section:
+            return
+        self._batch.append(record)
+        if len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        # leave out the `section:` line once written
+        self._stream.write(dump_section(self._section, self._batch,
+                                        header=not self._started))
+        self._batch = []
+        self._started = True
+
+    def end_section(self):
+        if self._section is not None and (self._batch or not self._started):
+            self.flush()
+        self._section = None
+        self._started = False
+
+    def close(self):
+        self.end_section()
+        self._stream.write(''.join(list(self._parts)[::2]))
+        self._parts.clear()
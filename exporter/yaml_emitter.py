@@ -0,0 +1,164 @@
+"""
+Fast YAML emitter for the records of the CF configurator manifest.
+
+pyaml lays out the manifest through the pure Python PyYAML emitter,
+which dominates the time spent writing it. The records are only made
+of mappings, sequences and scalars, so their layout is written here
+directly. The most common strings, made of letters, digits and a few
+punctuation characters, are known to be written as they are, or single
+quoted when they have spaces, any other scalar is formatted by pyaml
+itself, which keeps the output byte for byte the same. Whatever this
+emitter does not lay out the same way pyaml would, like multi line or
+wrapped strings, or an object appearing twice, is left to pyaml.
+"""
+import pyaml
+import string
+import functools
+import collections
+
+SCALAR_TYPES = (str, bool, int, float, type(None))
+
+# pyaml wraps plain and quoted strings with spaces past this column
+BEST_WIDTH = 80
+
+# strings pyaml writes as they are, or single quoted when they have spaces
+PLAIN_CHARS = frozenset(string.ascii_letters + string.digits + "@._+/=-")
+QUOTED_CHARS = PLAIN_CHARS | frozenset(" ")
+
+_keys = {}
+
+
+class UnsupportedValue(Exception):
+    pass
+
+
+def format_scalar(value):
+    """
+    @brief      The text of a scalar, as pyaml writes it after `- ` or `key: `
+    """
+    if type(value) is str and value[:1] in PLAIN_CHARS and value[0] != "-":
+        if PLAIN_CHARS.issuperset(value):
+            return value
+        if QUOTED_CHARS.issuperset(value):
+            return "'%s'" % value
+    text = pyaml_scalar(type(value), value)
+    if text is None:
+        raise UnsupportedValue(value)
+    return text
+
+
+@functools.lru_cache(maxsize=10000)
+def pyaml_scalar(value_type, value):
+    """
+    @return     the text pyaml writes for a scalar, None if it takes more than a line
+    """
+    dumped = pyaml.dump([value])
+    if dumped == "-\n":
+        return ""
+    if dumped.startswith("- ") and dumped.count("\n") == 1:
+        return dumped[2:-1]
+    return None
+
+
+def format_key(key):
+    text = _keys.get(key)
+    if text is None:
+        if not isinstance(key, str):
+            raise UnsupportedValue(key)
+        dumped = pyaml.dump({key: None})
+        text = dumped[:-2]
+        if not dumped.endswith(":\n") or "\n" in text or text.startswith("?"):
+            text = False
+        _keys[key] = text
+    if text is False:
+        raise UnsupportedValue(key)
+    return text
+
+
+class Emitter(object):
+
+    """
+    @brief      Lay out mappings and sequences the way pyaml does
+
+    Sequences are indented under their key, plain dicts have their keys
+    sorted and OrderedDicts keep their order.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self._seen = set()
+
+    def line(self, prefix, text):
+        if len(prefix) + len(text) >= BEST_WIDTH and (" " in text or text[:1] in "'\""):
+            raise UnsupportedValue(text)
+        self.lines.append(prefix + " " + text if text else prefix)
+
+    def container(self, value):
+        # pyaml would write an anchor and an alias for the same object
+        if id(value) in self._seen:
+            raise UnsupportedValue(value)
+        self._seen.add(id(value))
+
+    def items(self, mapping):
+        if isinstance(mapping, collections.OrderedDict):
+            return mapping.items()
+        if type(mapping) is not dict:
+            raise UnsupportedValue(mapping)
+        return sorted(mapping.items())
+
+    def mapping(self, mapping, indent, first_prefix=None):
+        self.container(mapping)
+        prefix = first_prefix
+        for key, value in self.items(mapping):
+            if prefix is None:
+                prefix = indent
+            self.value(prefix + format_key(key) + ":", value, indent)
+            prefix = None
+
+    def sequence(self, sequence, indent):
+        self.container(sequence)
+        for item in sequence:
+            if isinstance(item, SCALAR_TYPES):
+                self.line(indent + "-", format_scalar(item))
+            elif isinstance(item, dict) and item:
+                self.mapping(item, indent + "  ", first_prefix=indent + "- ")
+            elif isinstance(item, (dict, list)) and not item:
+                self.lines.append(indent + ("- {}" if isinstance(item, dict) else "- []"))
+            else:
+                raise UnsupportedValue(item)
+
+    def value(self, prefix, value, indent):
+        if isinstance(value, SCALAR_TYPES):
+            self.line(prefix, format_scalar(value))
+        elif isinstance(value, list):
+            if not value:
+                self.lines.append(prefix + " []")
+            else:
+                self.lines.append(prefix)
+                self.sequence(value, indent + "  ")
+        elif isinstance(value, dict):
+            if not value:
+                self.lines.append(prefix + " {}")
+            else:
+                self.lines.append(prefix)
+                self.mapping(value, indent + "  ")
+        else:
+            raise UnsupportedValue(value)
+
+
+def dump_section(section, records, header=True):
+    """
+    @brief      The YAML of `{section: records}`, as `pyaml.dump` writes it
+
+    Without `header` the `section:` line is left out, to append more
+    records to a section already started.
+    """
+    try:
+        emitter = Emitter()
+        emitter.value(format_key(section) + ":", list(records), "")
+        lines = emitter.lines
+    except UnsupportedValue:
+        lines = pyaml.dump({section: records})[:-1].split("\n")
+    if not header:
+        lines = lines[1:]
+    return "\n".join(lines) + "\n"
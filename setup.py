@@ -63,7 +63,7 @@ setup(
     author="Claudio Benfatto",
     author_email="claudio.benfatto@springer.com",
     license='MIT',
-    packages=find_packages(exclude=['docs', 'test']),
+    packages=find_packages(exclude=['docs', 'test', 'benchmark']),
     download_url="https://github.com/SpringerPE/cf-configuration-exporter/releases/tag/v" + find_version('exporter/__init__.py'),
 
     # Include additional files into the package
@@ -92,10 +92,19 @@ setup(
         'License :: OSI Approved :: MIT License',
         # Specify the Python versions you support here. In particular, ensure
         # that you indicate whether you support Python 2, Python 3 or both.
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3'
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.6'
     ],
 
+    # concurrent.futures, ordered dicts and the asyncio exporter
+    python_requires='>=3.6',
+
     # Dependent packages (distributions)
     install_requires=find_requirements(),
+
+    # the asyncio exporter, `pip install cf-configuration-exporter[async]`
+    extras_require={
+        'async': ['aiohttp']
+    },
 )
@@ -0,0 +1,206 @@
+import asyncio
+import threading
+import unittest
+
+import requests
+from cfconfigurator.cf import CF
+
+from exporter.exporter import Exporter
+from exporter.metrics import RequestMetrics
+from exporter.selection import Selection
+from exporter.transport import Transport
+from exporter.aio import (
+  AsyncExporter, AsyncResourceFetcher, AsyncUAAResourceFetcher, aiohttp
+)
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+class RequestsHTTP(object):
+
+  """
+  Serve the async fetchers with blocking requests run in the default executor
+  """
+
+  async def _http_get(self, url, params, headers):
+    loop = asyncio.get_event_loop()
+    resp = await loop.run_in_executor(
+      None, lambda: requests.get(url, params=params, headers=headers))
+    return resp.json(), resp.status_code
+
+
+class RequestsResourceFetcher(RequestsHTTP, AsyncResourceFetcher):
+  pass
+
+
+class RequestsUAAResourceFetcher(RequestsHTTP, AsyncUAAResourceFetcher):
+  pass
+
+
+class ExpiringTokenFetcher(AsyncResourceFetcher):
+
+  def __init__(self, client):
+    super(ExpiringTokenFetcher, self).__init__(client, relogin=self.renew)
+    self.logins = 0
+    self.requested = []
+
+  def renew(self):
+    self.logins += 1
+    self._client.session.headers["Authorization"] = "bearer new"
+
+  async def _http_get(self, url, params, headers):
+    self.requested.append(url)
+    if headers.get("Authorization") != "bearer new":
+      return {"error_code": "CF-InvalidAuthToken"}, 401
+    return {"entity": {"name": url}}, 200
+
+
+class SessionMock(object):
+
+  def __init__(self):
+    self.headers = {"Authorization": "bearer old"}
+
+
+class ClientMock(object):
+
+  api_url = "https://api.test.example.com"
+
+  def __init__(self):
+    self.session = SessionMock()
+
+
+class ThreadRecordingExporter(AsyncExporter):
+
+  def add_feature_flags(self):
+    self.thread = threading.current_thread()
+    return super(ThreadRecordingExporter, self).add_feature_flags()
+
+
+class StampRecordingExporter(AsyncExporter):
+
+  async def prefetch(self):
+    self.stamped_before_prefetch = self.exported_at
+    # told apart from a stamp taken afterwards within the same second
+    self.exported_at = "2000-01-01T00:00:00Z"
+    return await super(StampRecordingExporter, self).prefetch()
+
+
+def run(coroutine):
+  loop = asyncio.new_event_loop()
+  try:
+    return loop.run_until_complete(coroutine)
+  finally:
+    loop.close()
+
+
+class TestAsyncExporter(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    foundation = FakeFoundation(orgs=2, spaces=3, users=12, security_groups=2)
+    cls.server = FakeAPIServer(foundation).start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.stop()
+
+  def client(self):
+    client = CF(self.server.url)
+    client.login("admin", "admin")
+    return client
+
+  def sync_export(self, **kwargs):
+    exp = Exporter(self.client(), page_size=5, **kwargs)
+    exp.generate_manifest()
+    return exp.manifest
+
+  def async_export(self, previous=None, since=None, exporter=AsyncExporter, **kwargs):
+    client = self.client()
+    # records the requests of the blocking clients
+    metrics = RequestMetrics()
+    exp = exporter(client, page_size=5, uaa_page_size=5,
+                        transport=Transport(metrics=metrics), **kwargs)
+    exp.async_fetcher = RequestsResourceFetcher(client, page_size=5, concurrency=8)
+    exp.async_uaa_fetcher = RequestsUAAResourceFetcher(
+      client.uaa, page_size=5, concurrency=8, relogin=client._login)
+    run(exp.generate_manifest(previous=previous, since=since))
+    return exp, metrics.asdict()
+
+  def test_same_manifest_as_blocking_exporter(self):
+    exp, blocking = self.async_export()
+    self.assertEqual(exp.manifest, self.sync_export())
+    # every response was prefetched by the async fetchers
+    self.assertEqual(blocking, {})
+
+  def test_same_manifest_with_bulk_roles(self):
+    exp, blocking = self.async_export(bulk_roles=True)
+    self.assertEqual(exp.manifest, self.sync_export(bulk_roles=True))
+    self.assertEqual(blocking, {})
+
+  def test_same_manifest_with_selected_orgs(self):
+    for kwargs in ({}, {"bulk_roles": True}):
+      selection = Selection(include_orgs="org-0001", exclude_types="feature_flags")
+      exp, blocking = self.async_export(selection=selection, **kwargs)
+      self.assertEqual(exp.manifest, self.sync_export(selection=selection, **kwargs))
+      self.assertEqual([org["name"] for org in exp.manifest["cf_orgs"]], ["org-0001"])
+      self.assertEqual(blocking, {})
+
+  def test_same_manifest_incremental(self):
+    exp = Exporter(self.client(), page_size=5)
+    exp.generate_manifest()
+    for kwargs in ({}, {"bulk_roles": True}):
+      inc, blocking = self.async_export(previous=exp.manifest, since=exp.exported_at, **kwargs)
+      self.assertEqual(inc.manifest, exp.manifest)
+      self.assertEqual(blocking, {})
+
+  def test_manifest_built_off_the_loop(self):
+    exp, _ = self.async_export(exporter=ThreadRecordingExporter)
+    self.assertIsNot(exp.thread, threading.current_thread())
+
+  def test_exported_at_stamped_before_the_prefetch(self):
+    exp, _ = self.async_export(exporter=StampRecordingExporter)
+    self.assertIsNotNone(exp.stamped_before_prefetch)
+    # not stamped again once the responses are prefetched
+    self.assertEqual(exp.exported_at, "2000-01-01T00:00:00Z")
+
+  def test_token_renewed_once(self):
+    fetcher = ExpiringTokenFetcher(ClientMock())
+
+    async def fetch():
+      return await asyncio.gather(*[fetcher.get_entities("/v2/spaces/%i" % i)
+                                    for i in range(5)])
+
+    entities = run(fetch())
+    self.assertEqual([e["name"] for e in entities],
+                     ["https://api.test.example.com/v2/spaces/%i" % i for i in range(5)])
+    self.assertEqual(fetcher.logins, 1)
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+class TestAiohttpExporter(unittest.TestCase):
+
+  def setUp(self):
+    foundation = FakeFoundation(orgs=2, spaces=2, users=8, security_groups=2)
+    self.server = FakeAPIServer(foundation).start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_same_manifest_as_blocking_exporter(self):
+    client = CF(self.server.url)
+    client.login("admin", "admin")
+    exp = Exporter(client, page_size=3)
+    exp.generate_manifest()
+
+    metrics = RequestMetrics()
+    aexp = AsyncExporter(client, concurrency=4, page_size=3, uaa_page_size=3,
+                         transport=Transport(metrics=metrics))
+
+    async def export():
+      try:
+        await aexp.generate_manifest()
+      finally:
+        await aexp.close()
+
+    run(export())
+    self.assertEqual(aexp.manifest, exp.manifest)
+    self.assertEqual(metrics.asdict(), {})
@@ -0,0 +1,142 @@
+import time
+import threading
+import unittest
+from exporter.cache import ResponseCache, ResponseStore, parse_ttls
+from exporter.exceptions import ExporterException
+
+
+class TestResponseCache(unittest.TestCase):
+
+  def test_lru_eviction_by_entries(self):
+    cache = ResponseCache(max_entries=2, sizer=None)
+    cache.put("/v2/a", ({}, 200))
+    cache.put("/v2/b", ({}, 200))
+    cache.get_or_fetch("/v2/a", lambda: self.fail("cached"))
+    cache.put("/v2/c", ({}, 200))
+
+    self.assertIn("/v2/a", cache)
+    self.assertNotIn("/v2/b", cache)
+    self.assertEqual(cache.stats.evictions, 1)
+
+  def test_eviction_by_bytes(self):
+    cache = ResponseCache(max_bytes=50)
+    cache.put("/v2/a", ({"name": "x" * 20}, 200))
+    cache.put("/v2/b", ({"name": "y" * 20}, 200))
+
+    self.assertNotIn("/v2/a", cache)
+    self.assertIn("/v2/b", cache)
+    self.assertEqual(cache.stats.bytes, len('{"name": "%s"}' % ("y" * 20)))
+
+  def test_ttl_by_longest_prefix(self):
+    now = [0]
+    ttls = parse_ttls("/v2=100, /v2/spaces=10")
+    cache = ResponseCache(ttls=ttls, clock=lambda: now[0])
+    cache.put("/v2/spaces/1", ({}, 200))
+    cache.put("/v2/quota_definitions", ({}, 200))
+
+    now[0] = 50
+    self.assertNotIn("/v2/spaces/1", cache)
+    self.assertIn("/v2/quota_definitions", cache)
+
+  def test_failed_responses_are_not_cached(self):
+    cache = ResponseCache()
+    cache.get_or_fetch("/v2/missing", lambda: ({}, 404))
+    self.assertNotIn("/v2/missing", cache)
+    self.assertEqual(cache.stats.misses, 1)
+
+  def test_concurrent_requests_are_deduplicated(self):
+    cache = ResponseCache()
+    calls = []
+
+    def fetch():
+      calls.append(1)
+      time.sleep(0.05)
+      return ({"name": "space"}, 200)
+
+    results = []
+    threads = [threading.Thread(
+      target=lambda: results.append(cache.get_or_fetch("/v2/spaces/1", fetch)))
+      for _ in range(5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertEqual(len(calls), 1)
+    self.assertEqual(results, [({"name": "space"}, 200)] * 5)
+    self.assertEqual((cache.stats.hits, cache.stats.misses), (4, 1))
+
+  def test_waiters_get_the_leader_exception(self):
+    cache = ResponseCache()
+    started = threading.Event()
+
+    def fetch():
+      started.set()
+      time.sleep(0.05)
+      raise ExporterException("not recorded")
+
+    errors = []
+
+    def get():
+      try:
+        cache.get_or_fetch("/v2/spaces/1", fetch)
+      except ExporterException as e:
+        errors.append(e)
+
+    leader = threading.Thread(target=get)
+    leader.start()
+    started.wait()
+    waiter = threading.Thread(target=get)
+    waiter.start()
+    leader.join(2)
+    waiter.join(2)
+
+    self.assertFalse(waiter.is_alive())
+    self.assertEqual(len(errors), 2)
+    self.assertNotIn("/v2/spaces/1", cache)
+    # the failed fetch is not in flight anymore
+    self.assertEqual(cache.get_or_fetch("/v2/spaces/1", lambda: ({}, 200)), ({}, 200))
+
+
+class TestResponseStore(unittest.TestCase):
+
+  def setUp(self):
+    self.now = [1000]
+    self.store = ResponseStore(":memory:", max_age=60,
+                               ttls={"/v2/quota_definitions": 3600},
+                               clock=lambda: self.now[0])
+    self.requested = []
+
+  def tearDown(self):
+    self.store.close()
+
+  def request(self, body, code=200):
+    def fn(url):
+      self.requested.append(url)
+      return body, code
+    return fn
+
+  def test_fresh_responses_are_reused(self):
+    body = {"metadata": {"updated_at": "2016-06-08T16:41:26Z"}, "entity": {"name": "default"}}
+    self.store.fetch("/v2/quota_definitions/1", self.request(body))
+
+    self.now[0] += 1800
+    response = self.store.fetch("/v2/quota_definitions/1", self.request(None))
+    self.assertEqual(response, (body, 200))
+    self.assertEqual(len(self.requested), 1)
+    self.assertEqual(self.store.stats.fresh, 1)
+
+  def test_stale_responses_are_requested_again(self):
+    body = {"metadata": {"updated_at": "2016-06-08T16:41:26Z"}, "entity": {"name": "space"}}
+    self.store.fetch("/v2/spaces/1", self.request(body))
+
+    self.now[0] += 120
+    self.assertEqual(self.store.fetch("/v2/spaces/1", self.request(body)), (body, 200))
+    self.now[0] += 120
+    renamed = {"metadata": body["metadata"], "entity": {"name": "renamed"}}
+    self.assertEqual(self.store.fetch("/v2/spaces/1", self.request(renamed)), (renamed, 200))
+    self.assertEqual(self.requested, ["/v2/spaces/1"] * 3)
+    self.assertEqual((self.store.stats.unchanged, self.store.stats.changed), (1, 1))
+
+    self.now[0] += 30
+    self.assertEqual(self.store.fetch("/v2/spaces/1", self.request(None)), (renamed, 200))
@@ -0,0 +1,21 @@
+import time
+import unittest
+from exporter.concurrency import TaskRunner
+
+
+class TestTaskRunner(unittest.TestCase):
+
+  def test_results_keep_submission_order(self):
+    runner = TaskRunner(4)
+
+    def slow_identity(item):
+      # later items complete first
+      time.sleep((10 - item) * 0.001)
+      return item
+
+    self.assertEqual(runner.map(slow_identity, range(10)), list(range(10)))
+    runner.shutdown()
+
+  def test_single_worker_runs_in_caller_thread(self):
+    runner = TaskRunner(1)
+    self.assertEqual(runner.map(lambda x: x * 2, [1, 2, 3]), [2, 4, 6])
@@ -0,0 +1,44 @@
+import unittest
+
+from cfconfigurator.cf import CF
+
+from exporter.exporter import Exporter
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+class TestFakeAPI(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    foundation = FakeFoundation(orgs=2, spaces=2, users=6, security_groups=2)
+    cls.server = FakeAPIServer(foundation).start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.stop()
+
+  def export(self, **kwargs):
+    client = CF(self.server.url)
+    client.login("admin", "admin")
+    exp = Exporter(client, page_size=2, **kwargs)
+    exp.generate_manifest()
+    return exp.manifest
+
+  def test_export(self):
+    manifest = self.export()
+    self.assertEqual(len(manifest["cf_orgs"]), 2)
+    self.assertEqual(sum(len(o["spaces"]) for o in manifest["cf_orgs"]), 4)
+    self.assertEqual(len(manifest["cf_users"]), 6)
+    self.assertEqual(len(manifest["cf_security_groups"]), 2)
+
+  def test_no_lookup_by_space(self):
+    before = self.server.stats()["endpoints"]
+    self.export()
+    after = self.server.stats()["endpoints"]
+    # the security groups and default spaces come from foundation wide listings
+    for endpoint in ("/v2/spaces/:guid/security_groups", "/v2/spaces/:guid",
+                     "/v2/organizations/:guid"):
+      self.assertEqual(after.get(endpoint, 0), before.get(endpoint, 0))
+
+  def test_concurrent_export(self):
+    self.assertEqual(self.export(), self.export(concurrency=4))
@@ -0,0 +1,53 @@
+import unittest
+from exporter.exporter import ResourceFetcher
+
+
+class PagedClientMock:
+
+  api_url = "https://api.test.example.com"
+
+  def __init__(self, resources, per_page):
+    self.requested = []
+    self._resources = resources
+    self._per_page = per_page
+
+  def _request(self, method, url, params=None, http_headers=None, data=None):
+    self.requested.append(url)
+    page = int(url.split("&page=")[1]) if "&page=" in url else 1
+    start = (page - 1) * self._per_page
+    resources = self._resources[start:start + self._per_page]
+    next_url = None
+    if start + self._per_page < len(self._resources):
+      next_url = "/v2/users?results-per-page=%i&page=%i" % (self._per_page, page + 1)
+    body = {
+      "total_results": len(self._resources),
+      "next_url": next_url,
+      "resources": [{"metadata": {"guid": r}, "entity": {"name": r}} for r in resources]
+    }
+    return body, 200
+
+
+class TestResourceFetcher(unittest.TestCase):
+
+  def test_paged_url_adds_page_size(self):
+    fetcher = ResourceFetcher(None, page_size=50)
+    self.assertEqual(fetcher.paged_url("/v2/users"), "/v2/users?results-per-page=50")
+    self.assertEqual(fetcher.paged_url("/v2/users?q=name:a"),
+                     "/v2/users?q=name:a&results-per-page=50")
+    self.assertEqual(ResourceFetcher(None).paged_url("/v2/users"), "/v2/users")
+
+  def test_iter_resources_follows_next_url_lazily(self):
+    client = PagedClientMock(["user-%i" % i for i in range(5)], 2)
+    fetcher = ResourceFetcher(client, page_size=2)
+
+    stream = fetcher.iter_entities("/v2/users")
+    self.assertEqual(next(stream), {"name": "user-0"})
+    self.assertEqual(len(client.requested), 1)
+
+    names = [entity["name"] for entity in stream]
+    self.assertEqual(names, ["user-1", "user-2", "user-3", "user-4"])
+    self.assertEqual(client.requested, [
+      "https://api.test.example.com/v2/users?results-per-page=2",
+      "https://api.test.example.com/v2/users?results-per-page=2&page=2",
+      "https://api.test.example.com/v2/users?results-per-page=2&page=3"
+    ])
@@ -0,0 +1,125 @@
+import os
+import shutil
+import collections
+import tempfile
+import unittest
+from exporter.manifest import save_raw_manifest, load_raw_manifest
+from exporter.exceptions import ExporterException
+from exporter.exporter import Exporter, PreviousExport
+from benchmark.fake_api import FakeFoundation, FakeAPIServer, listing
+from cfconfigurator.cf import CF
+
+
+def resource(guid, updated_at, **entity):
+  return {"metadata": {"guid": guid, "updated_at": updated_at}, "entity": entity}
+
+manifest = {
+  "cf_users": [{"guid": "user-1", "name": "user@example.com"}],
+  "cf_orgs": [
+    {"guid": "org-1", "name": "org-1", "spaces": [{"guid": "space-1", "name": "dev"}]},
+    {"guid": "org-2", "name": "org-2", "spaces": [{"guid": "space-2", "name": "dev"}]},
+    {"guid": "org-3", "name": "org-3", "spaces": []}
+  ]
+}
+
+
+class TestRawManifest(unittest.TestCase):
+
+  def setUp(self):
+    self.folder = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.folder)
+
+  def test_raw_manifest_round_trip(self):
+    path = os.path.join(self.folder, "raw.json")
+    save_raw_manifest(path, manifest, "2017-01-01T00:00:00Z")
+    self.assertEqual(load_raw_manifest(path), (manifest, "2017-01-01T00:00:00Z"))
+
+  def test_binary_raw_manifest_round_trip(self):
+    path = os.path.join(self.folder, "raw.bin")
+    ordered = collections.OrderedDict([
+      ("cf_orgs", [collections.OrderedDict([("name", "org-1"), ("guid", "org-1")])]),
+      ("cf_users", manifest["cf_users"])
+    ])
+    save_raw_manifest(path, ordered, "2017-01-01T00:00:00Z")
+    with open(path, "rb") as stream:
+      self.assertTrue(stream.read().startswith(b"cf-exporter raw manifest 1 "))
+
+    loaded, exported_at = load_raw_manifest(path)
+    self.assertEqual(exported_at, "2017-01-01T00:00:00Z")
+    self.assertEqual(loaded, ordered)
+    self.assertEqual(list(loaded), ["cf_orgs", "cf_users"])
+    self.assertEqual(list(loaded["cf_orgs"][0]), ["name", "guid"])
+
+  def test_binary_raw_manifest_of_another_version(self):
+    path = os.path.join(self.folder, "raw.bin")
+    save_raw_manifest(path, manifest, None)
+    with open(path, "rb") as stream:
+      data = stream.read()
+    with open(path, "wb") as stream:
+      stream.write(data.replace(b"manifest 1 ", b"manifest 2 ", 1))
+    with self.assertRaises(ExporterException):
+      load_raw_manifest(path)
+
+
+class TestPreviousExport(unittest.TestCase):
+
+  def test_detect_changed_orgs(self):
+    previous = PreviousExport(manifest, "2017-01-01T00:00:00Z")
+    spaces = [
+      resource("space-1", "2016-01-01T00:00:00Z", organization_guid="org-1"),
+      resource("space-2", "2017-06-01T00:00:00Z", organization_guid="org-2"),
+      resource("space-3", "2016-01-01T00:00:00Z", organization_guid="org-3")
+    ]
+    quotas = [resource("quota-1", "2017-06-01T00:00:00Z")]
+    previous.detect_changed_orgs(spaces, quotas)
+
+    self.assertEqual(previous.changed_orgs, set(["org-2", "org-3"]))
+    self.assertEqual(previous.changed_quotas, set(["quota-1"]))
+
+    unchanged = resource("org-1", "2016-01-01T00:00:00Z", quota_definition_guid="quota-2")
+    self.assertIs(previous.previous_org(unchanged), manifest["cf_orgs"][0])
+    other_quota = resource("org-1", "2016-01-01T00:00:00Z", quota_definition_guid="quota-1")
+    self.assertIsNone(previous.previous_org(other_quota))
+
+
+class TestIncrementalExport(unittest.TestCase):
+
+  def setUp(self):
+    self.foundation = FakeFoundation(orgs=2, spaces=2, users=6, security_groups=2)
+    self.server = FakeAPIServer(self.foundation).start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def export(self, previous=None, since=None, **kwargs):
+    client = CF(self.server.url)
+    client.login("admin", "admin")
+    exp = Exporter(client, **kwargs)
+    exp.generate_manifest(previous=previous, since=since)
+    return exp.manifest, exp.exported_at
+
+  def test_unchanged_orgs_read_their_roles_again(self):
+    previous, exported_at = self.export()
+    # none of these updates the org or its spaces
+    responses = self.foundation.responses
+    responses["/v2/organizations/org-0000-guid/private_domains"] = listing([])
+    responses["/v2/organizations/org-0000-guid/auditors"] = listing([])
+    responses["/v2/spaces/space-0000-0000-guid/developers"] = listing([])
+    responses["/v2/security_groups/asg-0001-guid/spaces"] = listing([])
+
+    before = self.server.stats()["endpoints"]
+    manifest, _ = self.export(previous, exported_at)
+    after = self.server.stats()["endpoints"]
+    full, _ = self.export()
+    # the spaces are copied, not listed again
+    self.assertEqual(after.get("/v2/organizations/:guid/spaces", 0),
+                     before.get("/v2/organizations/:guid/spaces", 0))
+    self.assertEqual(manifest["cf_orgs"], full["cf_orgs"])
+    self.assertNotEqual(manifest["cf_orgs"], previous["cf_orgs"])
+    org = manifest["cf_orgs"][0]
+    self.assertEqual(org["domains_private"], [])
+    self.assertNotIn("auditors", org)
+    self.assertNotIn("developers", org["spaces"][0])
+    self.assertEqual(org["spaces"][0]["security_groups"], [])
@@ -0,0 +1,86 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from exporter.metrics import RequestMetrics, endpoint_template, percentile
+from exporter.transport import Transport
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+class TestRequestMetrics(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp)
+
+  def test_endpoint_template(self):
+    self.assertEqual(
+      endpoint_template("GET", "https://api.example.com/v2/spaces/"
+                               "3e7c9f0d-8e1a-4b2c-9d3e-1f2a3b4c5d6e/developers?results-per-page=100"),
+      "GET /v2/spaces/:guid/developers")
+    self.assertEqual(endpoint_template("GET", "https://uaa.example.com/Users/"
+                                              "0F1E2D3C-4B5A-6978-8796-A5B4C3D2E1F0"),
+                     "GET /Users/:guid")
+    # other segments with a dash are endpoints of their own
+    self.assertEqual(endpoint_template("GET", "https://uaa.example.com/.well-known/openid-configuration"),
+                     "GET /.well-known/openid-configuration")
+    self.assertEqual(endpoint_template("GET", "/v2/spaces/3e7c9f0d-8e1a-4b2c-9d3e-1f2a3b4c5d6e-x"),
+                     "GET /v2/spaces/3e7c9f0d-8e1a-4b2c-9d3e-1f2a3b4c5d6e-x")
+    self.assertEqual(endpoint_template("GET", "/v2/config/feature_flags"),
+                     "GET /v2/config/feature_flags")
+
+  def test_percentile(self):
+    values = [float(i) for i in range(1, 101)]
+    self.assertEqual(percentile(values, 50), 50.0)
+    self.assertEqual(percentile(values, 99), 99.0)
+    self.assertEqual(percentile([], 50), 0.0)
+
+  def test_record_and_dump(self):
+    metrics = RequestMetrics()
+    metrics.record("GET", "/v2/spaces/3e7c9f0d-8e1a-4b2c-9d3e-1f2a3b4c5d6e/developers", 0.02, 100)
+    metrics.record("GET", "/v2/spaces/5a6b7c8d-9e0f-4a1b-8c2d-3e4f5a6b7c8d/developers", 0.04, 300)
+    metrics.record("GET", "/v2/users", 0.5, 10, 500)
+
+    stats = metrics.asdict()
+    self.assertEqual(stats["GET /v2/spaces/:guid/developers"]["count"], 2)
+    self.assertEqual(stats["GET /v2/spaces/:guid/developers"]["bytes"], 400)
+    self.assertEqual(stats["GET /v2/spaces/:guid/developers"]["p99"], 0.04)
+    self.assertEqual(stats["GET /v2/users"]["errors"], 1)
+    # the slowest endpoint comes first
+    self.assertTrue(metrics.summary().splitlines()[1].startswith("GET /v2/users"))
+
+    json_path = os.path.join(self.tmp, "metrics.json")
+    metrics.dump(json_path)
+    with open(json_path) as stream:
+      self.assertEqual(json.load(stream), json.loads(json.dumps(stats)))
+
+    prom_path = os.path.join(self.tmp, "metrics.prom")
+    metrics.dump(prom_path)
+    with open(prom_path) as stream:
+      prom = stream.read()
+    self.assertIn('exporter_requests_total{method="GET",endpoint="/v2/spaces/:guid/developers"} 2', prom)
+    self.assertIn('exporter_request_duration_seconds_bucket{method="GET",endpoint="/v2/users",le="0.5"} 1', prom)
+    self.assertIn('exporter_request_duration_seconds_bucket{method="GET",endpoint="/v2/users",le="0.25"} 0', prom)
+
+  def test_transport_records_requests(self):
+    server = FakeAPIServer(FakeFoundation(orgs=1, spaces=1, users=1)).start()
+    try:
+      metrics = RequestMetrics()
+      session = requests.Session()
+      Transport(metrics=metrics).install(session)
+      body = session.get(server.url + "/v2/organizations/8d3f2a1b-0c9e-4f7d-a6b5-c4d3e2f1a0b9").content
+      session.get(server.url + "/v2/users")
+    finally:
+      server.stop()
+
+    stats = metrics.asdict()
+    self.assertEqual(stats["GET /v2/organizations/:guid"]["count"], 1)
+    self.assertEqual(stats["GET /v2/organizations/:guid"]["errors"], 1)
+    self.assertEqual(stats["GET /v2/organizations/:guid"]["bytes"], len(body))
+    self.assertEqual(stats["GET /v2/users"]["count"], 1)
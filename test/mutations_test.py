@@ -1,6 +1,6 @@
 import unittest
 
-from exporter.mutations import TerraformMutation, ManifestMutation
+from exporter.mutations import TerraformMutation, CFConfiguratorMutation, ManifestMutation, FieldMapping
 from exporter.exceptions import FieldNotOptionalException
 
 cf_dict = {
@@ -96,3 +96,75 @@ class TestMutations(unittest.TestCase):
 
 		self.assertIn("list_item", dest_dict)
 		self.assertEqual(["mapped", "mapped"], dest_dict["list_item"])
+
+	def test_field_mapping_matches_map_fields(self):
+		values = [True, False, None, 0, "None", "a@b.c"]
+		for mutation in (TerraformMutation, CFConfiguratorMutation):
+			for spec in ("space_fields", "org_fields", "user_fields", "quota_fields",
+				"security_rule_fields", "security_group_fields"):
+				mapping = getattr(mutation({}), spec)
+				sources = [options.get("source_field", field)
+					for field, options in mapping.fields.items()]
+				records = [{}] + [{source: value for source in sources} for value in values]
+				for source in sources:
+					records.append({other: "value" for other in sources if other != source})
+				for record in records:
+					for field, options in mapping.list_fields.items():
+						record[options.get("source_field", field)] = [{"name": "x.y@z"}]
+					expected, actual = {}, {}
+					tm = ManifestMutation(record)
+					try:
+						tm.map_fields(expected, record, mapping.fields)
+						tm.map_list_fields(expected, record, mapping.list_fields)
+					except FieldNotOptionalException:
+						with self.assertRaises(FieldNotOptionalException):
+							mapping.apply(actual, record)
+						continue
+					mapping.apply(actual, record)
+					self.assertEqual(list(expected.items()), list(actual.items()))
+
+		mapping = FieldMapping(fields={"total": {"optional": True, "default": 0},
+			"log": {"optional": True, "default": "false"}},
+			list_fields={"users": {"fmt": "user_{}"}})
+		self.assertEqual({"total": 0, "log": "false", "users": ["user_1"]},
+			mapping.apply({}, {"total": 0, "users": [1]}))
+		self.assertEqual({"log": "false", "users": []}, mapping.apply({}, {}))
+
+	def test_resource_names(self):
+		cf_dict = {
+			"cf_users": [{"guid": "1", "name": "a.b@c"}, {"guid": "2", "name": "a_b@c"},
+				{"guid": "3", "name": "a_b_c"}],
+			"cf_orgs": [{"guid": "4", "name": "org", "quota": "default",
+				"managers": [{"name": "a_b@c"}, {"name": "a.b@c"}],
+				"spaces": [
+					{"guid": "5", "name": "dev.1", "allow_ssh": True},
+					{"guid": "6", "name": "dev_1", "allow_ssh": True}]}]
+		}
+		tm = TerraformMutation(cf_dict)
+		users = tm.mutate_users(cf_dict)
+		self.assertEqual(["a_b_c", "a_b_c_e9f1de0d", "a_b_c_1680e5e1"],
+			[user["resource_name"] for user in users])
+
+		org = tm.mutate_orgs(cf_dict)[0]
+		self.assertEqual(["${cf_user.user_a_b_c_e9f1de0d.id}", "${cf_user.user_a_b_c.id}"],
+			org["managers"])
+		self.assertEqual(["org_dev_1", "org_dev_1_f61ce3fd"],
+			[space["resource_name"] for space in org["spaces"]])
+		# every name is translated once
+		self.assertEqual(3, len(tm.user_names))
+
+		# the suffix does not depend on the other names
+		del cf_dict["cf_users"][1]
+		users = TerraformMutation(cf_dict).mutate_users(cf_dict)
+		self.assertEqual(["a_b_c", "a_b_c_1680e5e1"],
+			[user["resource_name"] for user in users])
+
+	def test_space_resource_names_across_orgs(self):
+		tm = TerraformMutation({})
+		self.assertEqual("a_b_c", tm.space_resource_name("a", "b_c"))
+		self.assertEqual("a_b_c_9eddecd1", tm.space_resource_name("a_b", "c"))
+		# named after the resource name of their org
+		self.assertEqual("my_org_dev", tm.space_resource_name("my.org", "dev"))
+		org = tm.org_names.resource_name("my_org")
+		self.assertNotEqual("my_org", org)
+		self.assertEqual(org + "_dev", tm.space_resource_name("my_org", "dev"))
@@ -1,6 +1,7 @@
 import unittest
 import json
-from exporter.exporter import ResourceParser, Organization
+from exporter.exporter import ResourceParser, Organization, RoleIndex, SecurityGroupIndex
+from exporter.concurrency import TaskRunner
 from test.test_helper import (
                         ResourceUsersAPIMock, OrgSpacesAPIMock, 
                         OrganizationAPIMock, QuotaAPIMock, 
@@ -115,3 +116,67 @@ class TestOrgDefinition(unittest.TestCase):
     self.assertEqual(o['billing_managers'][0], {'name': 'user@example.com'})
     self.assertEqual(o['quota'], 'default')
 
+
+  def test_org_loads_spaces_concurrently(self):
+
+    sequential = Organization(self.organization_definition, fetcher=self.fetcher)
+    sequential.load()
+
+    org = Organization(self.organization_definition, fetcher=self.fetcher,
+                       runner=TaskRunner(4))
+    org.load()
+    self.assertEqual(org.asdict(), sequential.asdict())
+
+  def test_org_reads_roles_from_index(self):
+
+    sequential = Organization(self.organization_definition, {'guid': organization['guid']},
+                              fetcher=self.fetcher)
+    sequential.load()
+
+    org_ref = [{'metadata': {'guid': organization['guid']}}]
+    space_ref = [{'metadata': {'guid': spaces[0]['guid']}}]
+    roles = RoleIndex()
+    for user in users:
+      self.fetcher.register_response(
+        '/v2/users/%s/audited_organizations' % user['guid'], {'resources': org_ref})
+      roles.add_user({
+        'metadata': {'guid': user['guid']},
+        'entity': {
+          'username': user['userName'],
+          'organizations': org_ref,
+          'managed_organizations': org_ref,
+          'billing_managed_organizations': org_ref,
+          'audited_organizations_url': '/v2/users/%s/audited_organizations' % user['guid'],
+          'spaces': space_ref,
+          'managed_spaces': space_ref,
+          'audited_spaces': space_ref
+        }
+      }, self.fetcher)
+    roles.add_user({'metadata': {'guid': 'client'}, 'entity': {'spaces': space_ref}},
+                   self.fetcher)
+
+    org = Organization(self.organization_definition, {'guid': organization['guid']},
+                       fetcher=self.fetcher, roles=roles)
+    org.load()
+    self.assertEqual(org.asdict(), sequential.asdict())
+
+  def test_org_reads_security_groups_from_index(self):
+
+    sequential = Organization(self.organization_definition, fetcher=self.fetcher)
+    sequential.load()
+
+    space_ref = [{'metadata': {'guid': spaces[0]['guid']}}]
+    self.fetcher.register_response(
+      '/v2/security_groups/%s/spaces' % sgs[0]['guid'], {'resources': space_ref})
+    groups = SecurityGroupIndex([
+      # the space listing is too long to be inlined
+      {'entity': {'name': 'secg-1', 'running_default': False,
+                  'spaces_url': '/v2/security_groups/%s/spaces' % sgs[0]['guid']}},
+      {'entity': {'name': 'secg-2', 'running_default': True, 'spaces': space_ref}},
+      {'entity': {'name': 'secg-3', 'running_default': False, 'spaces': []}}
+    ], self.fetcher)
+
+    org = Organization(self.organization_definition, fetcher=self.fetcher,
+                       security_groups=groups)
+    org.load()
+    self.assertEqual(org.asdict(), sequential.asdict())
@@ -0,0 +1,82 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyaml
+from cfconfigurator.cf import CF
+
+from exporter.run import env
+from exporter.exporter import Exporter
+from exporter.mutations import TerraformMutation, CFConfiguratorMutation
+from exporter.pipeline import MutationPipeline, ManifestCollector
+from exporter.writers import TerraformWriter, ManifestWriter, TERRAFORM_TEMPLATES, write_tfstate
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+class TestMutationPipeline(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    foundation = FakeFoundation(orgs=2, spaces=2, users=5, security_groups=3)
+    server = FakeAPIServer(foundation).start()
+    try:
+      client = CF(server.url)
+      client.login("admin", "admin")
+      exp = Exporter(client)
+      exp.generate_manifest()
+      cls.manifest = exp.manifest
+    finally:
+      server.stop()
+
+  def setUp(self):
+    self.output = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.output)
+
+  def test_collected_records_match_mutate_manifest(self):
+    tf, cc = ManifestCollector(), ManifestCollector()
+    pipeline = MutationPipeline()
+    pipeline.register(TerraformMutation(self.manifest), tf)
+    pipeline.register(CFConfiguratorMutation(self.manifest), cc)
+    pipeline.run(self.manifest)
+
+    self.assertEqual(dict(tf.manifest), TerraformMutation(self.manifest).mutate_manifest())
+    self.assertEqual(dict(cc.manifest), dict(CFConfiguratorMutation(self.manifest).mutate_manifest()))
+
+  def test_streamed_outputs_match_whole_renders(self):
+    stream = io.StringIO()
+    pipeline = MutationPipeline()
+    pipeline.register(TerraformMutation(self.manifest),
+                      TerraformWriter(self.output, env, "lineage", batch_size=2))
+    pipeline.register(CFConfiguratorMutation(self.manifest),
+                      ManifestWriter(stream, env.get_template("manifest.j2"), batch_size=2))
+    pipeline.run(self.manifest)
+
+    tf_manifest = TerraformMutation(self.manifest).mutate_manifest()
+    for template_name in TERRAFORM_TEMPLATES:
+      template = env.get_template('terraform/' + template_name + ".j2")
+      with open(os.path.join(self.output, template_name + ".tf")) as tf_file:
+        self.assertEqual(tf_file.read(), template.render(manifest=tf_manifest))
+    tfstate = io.StringIO()
+    write_tfstate(tfstate, tf_manifest, "lineage")
+    with open(os.path.join(self.output, "terraform.tfstate")) as tfstate_file:
+      self.assertEqual(tfstate_file.read(), tfstate.getvalue())
+
+    cc_manifest = CFConfiguratorMutation(self.manifest).mutate_manifest()
+    rendered = env.get_template('manifest.j2').render(manifest={
+        key: pyaml.dump({key: value}) for key, value in cc_manifest.items()})
+    self.assertEqual(stream.getvalue(), rendered)
+
+  def test_empty_manifest(self):
+    manifest = {"cf_feature_flags": [], "cf_security_groups": [], "cf_quotas": [],
+                "cf_users": [], "cf_orgs": []}
+    stream = io.StringIO()
+    pipeline = MutationPipeline()
+    pipeline.register(CFConfiguratorMutation(manifest),
+                      ManifestWriter(stream, env.get_template("manifest.j2"), batch_size=2))
+    pipeline.run(manifest)
+    self.assertIn("\ncf_users: []\n", stream.getvalue())
+    self.assertNotIn("\x00", stream.getvalue())
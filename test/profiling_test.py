@@ -0,0 +1,85 @@
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import unittest
+
+from exporter.exceptions import ExporterException
+from exporter.profiling import PhaseTimer, timings, timed_phases, profiled, recording
+
+
+@timed_phases("add_")
+class Loader(object):
+
+  def add_things(self, count):
+    return [self.load_thing(i) for i in range(count)]
+
+  def load_thing(self, i):
+    return i
+
+
+class FakeClock(object):
+
+  def __init__(self, step):
+    self.now = 0.0
+    self.step = step
+
+  def __call__(self):
+    self.now += self.step
+    return self.now
+
+
+class TestProfiling(unittest.TestCase):
+
+  def test_phase_timer(self):
+    timer = PhaseTimer(clock=FakeClock(1.0), cpu_clock=FakeClock(0.5))
+    with timer.phase("load"):
+      pass
+    with timer.phase("load"):
+      pass
+    with timer.phase("render"):
+      pass
+
+    phases = timer.asdict()
+    self.assertEqual(list(phases), ["load", "render"])
+    self.assertEqual(phases["load"]["calls"], 2)
+    self.assertEqual(phases["load"]["wall"], 2.0)
+    self.assertEqual(phases["load"]["cpu"], 1.0)
+    self.assertIn("66.7%", timer.report().splitlines()[1])
+
+  def test_timed_phases(self):
+    timings.reset()
+    self.assertEqual(Loader().add_things(3), [0, 1, 2])
+    self.assertEqual(Loader.add_things.__name__, "add_things")
+    self.assertEqual(timings.asdict()["Loader.add_things"]["calls"], 1)
+    self.assertNotIn("Loader.load_thing", timings.asdict())
+
+  def test_recording(self):
+    timings.reset()
+    timer = PhaseTimer()
+    with recording(timer):
+      Loader().add_things(1)
+      thread = threading.Thread(target=Loader().add_things, args=(1,))
+      thread.start()
+      thread.join()
+
+    self.assertEqual(timer.asdict()["Loader.add_things"]["calls"], 1)
+    # the other threads still account to the module timer
+    self.assertEqual(timings.asdict()["Loader.add_things"]["calls"], 1)
+
+  def test_cprofile(self):
+    tmp = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tmp, "exporter.prof")
+      with profiled("cprofile", path):
+        Loader().add_things(10)
+      stats = pstats.Stats(path)
+      self.assertTrue(any(f[2] == "load_thing" for f in stats.stats))
+    finally:
+      shutil.rmtree(tmp)
+
+  def test_unknown_profiler(self):
+    with self.assertRaises(ExporterException):
+      with profiled("yappi", "out"):
+        pass
@@ -0,0 +1,159 @@
+import io
+import threading
+import contextlib
+import unittest
+from unittest import mock
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from exporter.ratelimit import (
+  TokenBucket, AdaptiveLimit, RateLimiter, RetryPolicy, retry_after
+)
+from exporter.transport import Transport
+
+
+class FakeTime(object):
+
+  def __init__(self):
+    self.now = 1000.0
+    self.slept = []
+
+  def clock(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.slept.append(seconds)
+    self.now += seconds
+
+
+def response(status_code, headers=None):
+  resp = requests.Response()
+  resp.status_code = status_code
+  resp.headers.update(headers or {})
+  resp.raw = io.BytesIO(b"{}")
+  return resp
+
+
+def no_jitter(low, high):
+  return high
+
+
+class TestRateLimit(unittest.TestCase):
+
+  def test_token_bucket_paces_requests(self):
+    fake = FakeTime()
+    bucket = TokenBucket(rate=2, burst=2, clock=fake.clock, sleep=fake.sleep)
+    for _ in range(4):
+      bucket.acquire()
+    # the burst goes through, then one request every half second
+    self.assertEqual(fake.slept, [0.5, 0.5])
+
+  def test_token_bucket_pause(self):
+    fake = FakeTime()
+    bucket = TokenBucket(rate=0, clock=fake.clock, sleep=fake.sleep)
+    bucket.acquire()
+    bucket.pause_until(fake.now + 30)
+    bucket.acquire()
+    self.assertEqual(fake.slept, [30])
+
+  def test_adaptive_limit(self):
+    limit = AdaptiveLimit(8)
+    limit.acquire()
+    limit.release(throttled=True)
+    self.assertEqual(limit.limit, 4)
+    for _ in range(4):
+      limit.acquire()
+      limit.release()
+    self.assertEqual(limit.limit, 5)
+    for _ in range(5):
+      limit.acquire()
+      limit.release(throttled=True)
+    self.assertEqual(limit.limit, 1)
+
+  def test_rate_limiter_pauses_when_no_request_is_left(self):
+    fake = FakeTime()
+    limiter = RateLimiter(clock=fake.clock, sleep=fake.sleep)
+    with limiter.slot() as observe:
+      observe(response(200, {"X-RateLimit-Remaining": "0",
+                             "X-RateLimit-Reset": str(fake.now + 12)}))
+    with limiter.slot():
+      pass
+    self.assertEqual(fake.slept, [12])
+
+  def test_retry_policy(self):
+    policy = RetryPolicy(max_retries=3, backoff=1, max_backoff=5, jitter=no_jitter)
+    self.assertEqual(policy.delay("GET", 0, response(429)), 1)
+    self.assertEqual(policy.delay("GET", 2, response(503)), 4)
+    self.assertEqual(policy.delay("GET", 1, response(503, {"Retry-After": "3"})), 3)
+    self.assertEqual(policy.delay("GET", 2, None), 4)
+    self.assertIsNone(policy.delay("GET", 3, response(429)))
+    self.assertIsNone(policy.delay("GET", 0, response(404)))
+    self.assertIsNone(policy.delay("POST", 0, response(429)))
+
+  def test_retry_after_date(self):
+    self.assertEqual(retry_after({"Retry-After": "Thu, 01 Jan 1970 00:01:40 GMT"},
+                                 clock=lambda: 90), 10)
+    self.assertIsNone(retry_after({}))
+
+  def test_transport_retries_throttled_gets(self):
+    fake = FakeTime()
+    transport = Transport(rate_limiter=RateLimiter(max_concurrency=4),
+                          retry=RetryPolicy(backoff=1, jitter=no_jitter),
+                          sleep=fake.sleep)
+    session = requests.Session()
+    transport.install(session)
+    responses = [response(429, {"Retry-After": "2"}), response(503), response(200)]
+    with mock.patch.object(HTTPAdapter, "send", side_effect=responses) as send, \
+        mock.patch("exporter.transport.logger"):
+      resp = session.get("https://api.test.example.com/v2/info")
+    self.assertEqual(resp.status_code, 200)
+    self.assertEqual(send.call_count, 3)
+    self.assertEqual(fake.slept, [2, 2])
+    # halved twice, then raised by the successful request
+    self.assertEqual(transport.rate_limiter.concurrency.limit, 2)
+
+  def test_throttled_target_does_not_hold_the_shared_limiter(self):
+    released = threading.Event()
+
+    class PausedRateLimiter(object):
+
+      @contextlib.contextmanager
+      def slot(self):
+        # like a bucket paused until X-RateLimit-Reset
+        released.wait(5)
+        yield lambda response: None
+
+    limiter = threading.BoundedSemaphore(1)
+    throttled = Transport(limiter=limiter, rate_limiter=PausedRateLimiter())
+    other = Transport(limiter=limiter)
+    sessions = [requests.Session(), requests.Session()]
+    throttled.install(sessions[0])
+    other.install(sessions[1])
+
+    codes = []
+
+    def get(session):
+      codes.append(session.get("https://api.test.example.com/v2/info").status_code)
+
+    with mock.patch.object(HTTPAdapter, "send", side_effect=lambda *a, **kw: response(200)):
+      waiting = threading.Thread(target=get, args=(sessions[0],))
+      waiting.start()
+      try:
+        sending = threading.Thread(target=get, args=(sessions[1],))
+        sending.start()
+        sending.join(2)
+        self.assertFalse(sending.is_alive())
+        self.assertEqual(codes, [200])
+      finally:
+        released.set()
+        waiting.join(2)
+    self.assertEqual(codes, [200, 200])
+
+  def test_transport_does_not_retry_posts(self):
+    transport = Transport(retry=RetryPolicy())
+    session = requests.Session()
+    transport.install(session)
+    with mock.patch.object(HTTPAdapter, "send", side_effect=[response(429)]):
+      resp = session.post("https://api.test.example.com/v2/organizations")
+    self.assertEqual(resp.status_code, 429)
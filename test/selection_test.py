@@ -0,0 +1,92 @@
+import unittest
+
+from cfconfigurator.cf import CF
+
+from exporter.exporter import Exporter
+from exporter.exceptions import ExporterException
+from exporter.selection import Selection
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+class TestSelection(unittest.TestCase):
+
+  def test_everything_by_default(self):
+    selection = Selection()
+    self.assertFalse(selection.selects_orgs)
+    self.assertTrue(selection.includes_type("users"))
+    self.assertTrue(selection.includes_org("anything"))
+    self.assertEqual(selection.orgs_url(), "/v2/organizations")
+
+  def test_orgs(self):
+    selection = Selection(include_orgs="team-*, ops", exclude_orgs="team-legacy")
+    self.assertTrue(selection.includes_org("team-a"))
+    self.assertTrue(selection.includes_org("ops"))
+    self.assertFalse(selection.includes_org("team-legacy"))
+    self.assertFalse(selection.includes_org("other"))
+    # globs can not be pushed down to the API
+    self.assertEqual(selection.orgs_url(), "/v2/organizations")
+
+  def test_plain_org_names_are_pushed_down(self):
+    self.assertEqual(Selection(include_orgs="ops").orgs_url(),
+                     "/v2/organizations?q=name:ops")
+    self.assertEqual(Selection(include_orgs="ops;dev team").orgs_url(),
+                     "/v2/organizations?q=name%20IN%20ops,dev%20team")
+
+  def test_types(self):
+    selection = Selection(include_types="users,orgs", exclude_types="users")
+    self.assertTrue(selection.includes_type("orgs"))
+    self.assertFalse(selection.includes_type("users"))
+    self.assertFalse(selection.includes_type("quotas"))
+    with self.assertRaises(ExporterException):
+      Selection(exclude_types="apps")
+
+
+class TestSelectedExport(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.server = FakeAPIServer(FakeFoundation(orgs=4, spaces=2, users=40)).start()
+    cls.full = cls.export(Selection())
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.stop()
+
+  @classmethod
+  def export(cls, selection, **kwargs):
+    client = CF(cls.server.url)
+    client.login("admin", "admin")
+    exp = Exporter(client, selection=selection, **kwargs)
+    exp.generate_manifest()
+    return exp.manifest
+
+  def requests(self, selection, **kwargs):
+    before = self.server.stats()["endpoints"]
+    manifest = self.export(selection, **kwargs)
+    after = self.server.stats()["endpoints"]
+    return manifest, {endpoint: count - before.get(endpoint, 0)
+                      for endpoint, count in after.items()
+                      if count != before.get(endpoint, 0)}
+
+  def test_single_org(self):
+    for kwargs in ({}, {"bulk_roles": True}, {"uaa_bulk": False}):
+      manifest, requests = self.requests(Selection(include_orgs="org-0001"), **kwargs)
+
+      self.assertEqual(manifest["cf_orgs"], self.full["cf_orgs"][1:2])
+      members = set(user["name"] for user in manifest["cf_orgs"][0]["users"])
+      self.assertEqual(manifest["cf_users"],
+                       [user for user in self.full["cf_users"] if user["name"] in members])
+      self.assertEqual(manifest["cf_quotas"], self.full["cf_quotas"])
+      self.assertNotIn("/v2/users", requests)
+      self.assertEqual(requests["/v2/organizations"], 1)
+      self.assertEqual(requests["/v2/organizations/:guid/users"], 1)
+
+  def test_org_globs_and_types(self):
+    selection = Selection(exclude_orgs="org-000[02]", include_types="orgs")
+    manifest, requests = self.requests(selection)
+
+    self.assertEqual([org["name"] for org in manifest["cf_orgs"]], ["org-0001", "org-0003"])
+    self.assertEqual(manifest["cf_users"], [])
+    self.assertEqual(manifest["cf_feature_flags"], [])
+    self.assertNotIn("/v2/config/feature_flags", requests)
+    self.assertNotIn("/uaa/Users", requests)
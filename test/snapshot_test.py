@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cfconfigurator.cf import CF, CFException
+
+from exporter.exporter import Exporter
+from exporter.exceptions import ExporterException
+from exporter.snapshot import SnapshotWriter, SnapshotReader, ReplayCF
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+class TestSnapshot(unittest.TestCase):
+
+  def setUp(self):
+    self.output = tempfile.mkdtemp()
+    self.path = os.path.join(self.output, "snapshot.zip")
+
+  def tearDown(self):
+    shutil.rmtree(self.output)
+
+  def record(self, **kwargs):
+    foundation = FakeFoundation(orgs=2, spaces=2, users=5, security_groups=2)
+    server = FakeAPIServer(foundation).start()
+    try:
+      client = CF(server.url)
+      client.login("admin", "admin")
+      snapshot = SnapshotWriter(self.path)
+      exp = Exporter(client, snapshot=snapshot, **kwargs)
+      try:
+        exp.generate_manifest()
+      finally:
+        snapshot.close()
+      return server.url, exp.manifest
+    finally:
+      server.stop()
+
+  def test_replay_without_the_api(self):
+    for kwargs in ({}, {"page_size": 1, "uaa_bulk": False}, {"bulk_roles": True}):
+      api_url, manifest = self.record(**kwargs)
+
+      client = ReplayCF(SnapshotReader(self.path))
+      client.login()
+      exp = Exporter(client, **kwargs)
+      exp.generate_manifest()
+      self.assertEqual(client.api_url, api_url)
+      self.assertEqual(exp.manifest, manifest)
+
+  def test_missing_response(self):
+    api_url, _ = self.record()
+    reader = SnapshotReader(self.path)
+    self.assertGreater(len(reader), 0)
+    with self.assertRaises(ExporterException):
+      reader.response("GET", api_url + "/v2/not_recorded")
+
+    # a snapshot recorded with other settings can not be replayed
+    with self.assertRaises(ExporterException):
+      Exporter(ReplayCF(reader), page_size=1).generate_manifest()
+
+  def test_errors_are_replayed(self):
+    writer = SnapshotWriter(self.path)
+    writer.record("GET http://api/v2/missing", {
+        "exception": "CFException", "code": 404,
+        "body": {"description": "Not found", "code": 10000, "error_code": "CF-NotFound"}})
+    writer.close()
+
+    with self.assertRaises(CFException) as raised:
+      SnapshotReader(self.path).response("GET", "http://api/v2/missing")
+    self.assertEqual(raised.exception.http_code, 404)
+    self.assertEqual(raised.exception.error_code, "CF-NotFound")
+
+  def test_invalid_snapshot(self):
+    with open(self.path, "w") as f:
+      f.write("not a snapshot")
+    with self.assertRaises(ExporterException):
+      SnapshotReader(self.path)
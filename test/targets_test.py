@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from exporter import run
+from exporter import config as cfg
+from exporter.exceptions import ExporterException
+from exporter.profiling import timings
+from exporter.targets import Target, load_targets
+from benchmark.fake_api import FakeFoundation, FakeAPIServer
+
+
+class TestTargets(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp)
+
+  def write_targets(self, content):
+    path = os.path.join(self.tmp, "targets.yml")
+    with open(path, "w") as stream:
+      stream.write(content)
+    return path
+
+  def test_load_targets(self):
+    path = self.write_targets("""
+- name: eu
+  api_url: https://api.eu.example.com
+  admin_user: admin
+  admin_password_env: EU_PASSWORD
+- name: us
+  api_url: https://api.us.example.com
+  admin_user: admin
+  admin_password: secret
+  output_dir: exports/us
+""")
+    eu, us = load_targets(path, environ={"EU_PASSWORD": "from-env"})
+    self.assertEqual(eu.admin_password, "from-env")
+    self.assertEqual(eu.path("output"), os.path.join("eu", "output"))
+    self.assertEqual(us.path("output"), os.path.join("exports/us", "output"))
+    self.assertIsNone(us.path(None))
+    self.assertEqual(Target("default", "url", "admin", "pwd").path("output"), "output")
+
+  def test_invalid_targets(self):
+    for content in ["", "name: eu", "- https://api.eu.example.com", "- [eu, url]",
+                    "- {name: eu, api_url: url}",
+                    "- {name: eu, api_url: url, admin_user: admin}",
+                    "- {name: eu, api_url: url, admin_user: admin, admin_password: p}\n"
+                    "- {name: eu, api_url: url, admin_user: admin, admin_password: p}"]:
+      with self.assertRaises(ExporterException):
+        load_targets(self.write_targets(content), environ={})
+
+  def test_entry_which_is_not_a_mapping(self):
+    path = self.write_targets("- {name: eu, api_url: url, admin_user: admin, admin_password: p}\n"
+                              "- https://api.us.example.com")
+    with self.assertRaises(ExporterException) as raised:
+      load_targets(path, environ={})
+    self.assertIn("Target 2", str(raised.exception))
+    self.assertIn("https://api.us.example.com", str(raised.exception))
+
+  def test_export_targets_to_their_own_directory(self):
+    servers = [FakeAPIServer(FakeFoundation(orgs=orgs, spaces=1, users=3)).start()
+               for orgs in (1, 2)]
+    targets = [Target(name, server.url, "admin", "admin", os.path.join(self.tmp, name))
+               for name, server in zip(("eu", "us"), servers)]
+    timings.reset()
+    try:
+      with mock.patch.multiple(cfg, max_requests=2, raw_manifest="raw.json"), \
+          self.assertLogs("exporter.run", level="INFO") as logs:
+        self.assertEqual(run.export_targets(targets), [])
+    finally:
+      for server in servers:
+        server.stop()
+
+    # every target reports its own phases
+    for name in ("eu", "us"):
+      report, = [line for line in logs.output if "Time spent by phase for %s:" % name in line]
+      self.assertRegex(report, r"Exporter.add_orgs +1 ")
+    self.assertNotIn("Exporter.add_orgs", timings.asdict())
+
+    for target, orgs in zip(targets, (1, 2)):
+      self.assertTrue(os.path.exists(target.path("raw.json")))
+      self.assertTrue(os.path.exists(target.path("output_terraform/terraform.tfstate")))
+      with open(target.path("output")) as stream:
+        self.assertEqual(stream.read().count("- name: org-"), orgs)
+
+  def test_failed_target_does_not_stop_the_others(self):
+    server = FakeAPIServer(FakeFoundation(orgs=1, spaces=1, users=1)).start()
+    targets = [Target("down", "http://127.0.0.1:1", "admin", "admin", os.path.join(self.tmp, "down")),
+               Target("up", server.url, "admin", "admin", os.path.join(self.tmp, "up"))]
+    try:
+      with mock.patch("exporter.run.logger"):
+        self.assertEqual(run.export_targets(targets), ["down"])
+    finally:
+      server.stop()
+    self.assertTrue(os.path.exists(targets[1].path("output")))
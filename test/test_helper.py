@@ -1,5 +1,6 @@
 from jinja2 import Environment, PackageLoader, select_autoescape
 from exporter.exporter import ResourceParser
+from cfconfigurator.uaa import UAAException
 import json
 
 env = Environment(
@@ -24,6 +25,51 @@ class MockResourceFetcher:
         body = self.responses[resource_url]
         return ResourceParser.extract_resources(body)
 
+    def iter_pages(self, resource_url):
+        yield self.get_resources(resource_url)
+
+    def iter_resources(self, resource_url):
+        for page in self.iter_pages(resource_url):
+            for resource in page:
+                yield resource
+
+class UAAClientMock:
+
+    api_url = "https://uaa.test.example.com"
+    user_url = "/Users"
+
+    def __init__(self):
+        self.users = []
+        self.requested = []
+
+    def register_user(self, user):
+        self.users.append(user)
+
+    def _request(self, method, url, params=None, http_headers=None, data=None):
+        self.requested.append((url, params))
+        start = params['startIndex'] - 1
+        body = {
+            'resources': self.users[start:start + params['count']],
+            'startIndex': params['startIndex'],
+            'totalResults': len(self.users)
+        }
+        return body, 200
+
+    def user_get(self, id, version='*'):
+        self.requested.append((self.api_url + self.user_url + '/' + id, None))
+        for user in self.users:
+            if user['id'] == id:
+                return user
+        raise UAAException({'description': "ID not found"}, 404)
+
+
+class CFClientMock:
+
+    api_url = "https://api.test.example.com"
+
+    def __init__(self, uaa):
+        self.uaa = uaa
+
 class BasicMock:
 
   def get_response(self, resource):
@@ -0,0 +1,17 @@
+import unittest
+import requests
+from exporter.transport import Transport
+
+
+class TestTransport(unittest.TestCase):
+
+  def test_transport_is_installed_on_session(self):
+    session = requests.Session()
+    transport = Transport(pool_size=32, compress=False)
+    transport.install(session)
+
+    self.assertIs(session.get_adapter("https://api.test.example.com/v2/info"), transport)
+    self.assertIs(session.get_adapter("http://uaa.test.example.com/Users"), transport)
+    self.assertEqual(session.headers["Accept-Encoding"], "identity")
+    self.assertEqual(transport.poolmanager.connection_pool_kw["maxsize"], 32)
+    self.assertTrue(transport.poolmanager.connection_pool_kw["block"])
@@ -1,10 +1,10 @@
 import unittest
 import json
 from test.test_helper import (
-    MockResourceFetcher, UserAPIMock, UserUAAAPIMock,
-    SpaceAPIMock, OrganizationAPIMock
+    MockResourceFetcher, UserAPIMock, UserUAAAPIMock, SpaceAPIMock,
+    OrganizationAPIMock, OrgSpacesAPIMock, UAAClientMock, CFClientMock
 )
-from exporter.exporter import User, ResourceParser
+from exporter.exporter import User, ResourceParser, Exporter, PreviousExport, SpaceDirectory
 
 user = {
     'userName': "Z5qRBj@test.org",
@@ -63,4 +63,101 @@ class TestUserDefinition(unittest.TestCase):
     self.assertEqual(u["family_name"], "family name")
 
     self.assertEqual(u["default_space"], "name-2064")
-    self.assertEqual(u["default_organization"], "name-1716")
\ No newline at end of file
+    self.assertEqual(u["default_organization"], "name-1716")
+
+  def test_user_reads_its_default_space_from_directory(self):
+    directory = SpaceDirectory()
+    directory.add_org({'metadata': {'guid': organization['guid']},
+                       'entity': {'name': 'listed-org'}})
+    directory.add_space({'metadata': {'guid': space['guid']},
+                         'entity': {'name': 'listed-space', 'organization_guid': organization['guid']}})
+
+    user = User(self.uaa_user_definition, cf_response=self.user_definition,
+                fetcher=MockResourceFetcher(None), spaces=directory)
+    user.load()
+    self.assertEqual(user.asdict()["default_space"], "listed-space")
+    self.assertEqual(user.asdict()["default_organization"], "listed-org")
+
+    # a space missing from the directory is requested
+    user = User(self.uaa_user_definition, cf_response=self.user_definition,
+                fetcher=self.fetcher, spaces=SpaceDirectory())
+    user.load()
+    self.assertEqual(user.asdict()["default_space"], "name-2064")
+
+  def test_user_releases_its_config_once_loaded(self):
+    user = User(
+        self.uaa_user_definition,
+        cf_response=self.user_definition,
+        fetcher=self.fetcher)
+    user.load()
+
+    self.assertFalse(hasattr(user, "__dict__"))
+    self.assertIsNone(user._fetcher)
+    with self.assertRaises(AttributeError):
+      user.userName
+    self.assertEqual(list(user.asdict()),
+                     [p for p in User.properties if p in user.asdict()])
+
+class TestBulkUAAUsers(unittest.TestCase):
+
+  def setUp(self):
+    self.fetcher = MockResourceFetcher(None)
+    SpaceAPIMock(space, self.fetcher).dump()
+    org = OrganizationAPIMock(organization, self.fetcher).dump()
+    # listed for the default spaces and orgs of the users
+    self.fetcher.register_response("/v2/organizations", {'resources': [org]})
+    self.fetcher.register_response(
+      "/v2/spaces", json.loads(OrgSpacesAPIMock().get_response([space])))
+
+    self.uaa = UAAClientMock()
+    cf_users = []
+    for i in range(3):
+      definition = dict(user, guid="uaa-id-%i" % i, userName="user-%i@test.org" % i)
+      cf_users.append(json.loads(UserAPIMock().get_response(definition)))
+      self.uaa.register_user(json.loads(UserUAAAPIMock().get_response(definition)))
+    self.fetcher.register_response("/v2/users", {'resources': cf_users})
+
+  def export_users(self, uaa_bulk):
+    exp = Exporter(CFClientMock(self.uaa), uaa_bulk=uaa_bulk, uaa_page_size=2)
+    exp.fetcher = self.fetcher
+    return exp.add_users()
+
+  def test_bulk_users_match_single_lookups(self):
+    bulk_users = self.export_users(True)
+    self.assertEqual(len(self.uaa.requested), 2)
+
+    self.uaa.requested = []
+    self.assertEqual(self.export_users(False), bulk_users)
+    self.assertEqual(len(self.uaa.requested), 3)
+    self.assertEqual([u["name"] for u in bulk_users],
+                     ["user-0@test.org", "user-1@test.org", "user-2@test.org"])
+
+  def test_bulk_falls_back_to_single_lookup(self):
+    missing = self.uaa.users.pop(1)
+    self.uaa.user_get = lambda id, version='*': missing
+
+    users = self.export_users(True)
+    self.assertEqual([u["guid"] for u in users], ["uaa-id-0", "uaa-id-1", "uaa-id-2"])
+
+  def test_incremental_export_reuses_unchanged_users(self):
+    previous = {"cf_users": [{"guid": "uaa-id-1", "name": "previous"}]}
+    # only the users modified since the previous export are listed
+    self.uaa.users.pop(1)
+    exp = Exporter(CFClientMock(self.uaa), uaa_page_size=2)
+    exp.fetcher = self.fetcher
+    exp._previous = PreviousExport(previous, "2017-01-01T00:00:00Z")
+
+    users = exp.add_users()
+    self.assertEqual(users[1], {"guid": "uaa-id-1", "name": "previous"})
+    self.assertEqual(users[2]["name"], "user-2@test.org")
+    self.assertEqual(len(self.uaa.requested), 1)
+
+  def test_incremental_export_without_uaa_bulk_reloads_users(self):
+    previous = {"cf_users": [{"guid": "uaa-id-1", "name": "previous"}]}
+    exp = Exporter(CFClientMock(self.uaa), uaa_bulk=False)
+    exp.fetcher = self.fetcher
+    exp._previous = PreviousExport(previous, "2017-01-01T00:00:00Z")
+
+    users = exp.add_users()
+    self.assertEqual(users[1]["name"], "user-1@test.org")
+    self.assertEqual(len(self.uaa.requested), 3)
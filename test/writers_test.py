@@ -0,0 +1,48 @@
+import io
+import json
+import unittest
+from exporter.run import env
+from exporter.writers import write_tfstate
+
+manifest = {
+  "cf_security_groups": [{"name": "public", "guid": "asg-guid"}],
+  "cf_quotas": [],
+  "cf_users": [{"resource_name": "user_example_com", "guid": "user-guid", "name": "user@example.com"}],
+  "cf_orgs": [{
+    "resource_name": "my_org", "guid": "org-guid", "name": "my.org",
+    "spaces": [{"resource_name": "my_org_dev", "guid": "space-guid", "name": "dev",
+                "allow_ssh": "true"}]
+  }]
+}
+
+
+class TestTfstateWriter(unittest.TestCase):
+
+  def test_tfstate_is_valid_json(self):
+    stream = io.StringIO()
+    write_tfstate(stream, manifest, "lineage")
+    state = json.loads(stream.getvalue())
+
+    self.assertEqual(state["lineage"], "lineage")
+    resources = state["modules"][0]["resources"]
+    self.assertEqual(list(resources), [
+      "cf_config.cf_config", "cf_asg.asg_public", "cf_user.user_user_example_com",
+      "cf_org.org_my_org", "cf_space.space_my_org_dev"
+    ])
+    self.assertEqual(resources["cf_user.user_user_example_com"]["primary"]["id"], "user-guid")
+    self.assertEqual(resources["cf_space.space_my_org_dev"]["primary"]["attributes"],
+                     {"name": "dev", "org": "${cf_org.org_my_org.id}"})
+    self.assertNotIn("depends_on", resources["cf_space.space_my_org_dev"])
+
+  def test_spaces_reference_the_org_resource(self):
+    # the same address in the configuration as in the state
+    rendered = env.get_template("terraform/org.j2").render(manifest=manifest)
+    self.assertIn('resource "cf_org" "org_my_org"', rendered)
+    self.assertIn('org = "${cf_org.org_my_org.id}"', rendered)
+
+  def test_tfstate_without_resources(self):
+    stream = io.StringIO()
+    write_tfstate(stream, {"cf_security_groups": [], "cf_quotas": [],
+                           "cf_users": [], "cf_orgs": []}, "lineage")
+    resources = json.loads(stream.getvalue())["modules"][0]["resources"]
+    self.assertEqual(list(resources), ["cf_config.cf_config"])
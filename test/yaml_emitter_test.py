@@ -0,0 +1,58 @@
+import unittest
+import collections
+
+import pyaml
+
+from exporter.yaml_emitter import dump_section, format_scalar, pyaml_scalar
+
+OrderedDict = collections.OrderedDict
+
+SCALARS = [None, True, False, 0, -1, 1.5, "", "-", "true", "yes", "123", "1e3", "a: b",
+           "#x", "x#y", "!tag", "&anchor", "*alias", "[list]", "{dict}", "'quoted'",
+           "trailing ", " leading", "multi\nline", "multi\nline\n", "tab\there",
+           "café", "user@example.com", "x" * 120, "word " * 30, "null", "~"]
+
+
+class TestYamlEmitter(unittest.TestCase):
+
+  def assertSameAsPyaml(self, section, records):
+    self.assertEqual(dump_section(section, records), pyaml.dump({section: records}))
+
+  def test_scalars(self):
+    for value in SCALARS:
+      self.assertSameAsPyaml("cf_users", [OrderedDict([("name", value), ("x", 1)])])
+      self.assertSameAsPyaml("cf_users", [{"list": [value, value]}])
+
+  def test_common_strings_without_pyaml(self):
+    for value in ["user-000001@example.com", "Given 1", "a b", "true", "null", "1e3",
+                  "2017-01-01", "0x1F", "=", "a--b", "a  b", "x/y+z", "__init__"]:
+      self.assertEqual(format_scalar(value), pyaml_scalar(str, value))
+
+  def test_nested_records(self):
+    records = [OrderedDict([
+        ("name", "org-%i" % i),
+        ("quota", None),
+        ("managers", [{"name": "user-%i@example.com" % j} for j in range(i)]),
+        ("spaces", [OrderedDict([
+            ("org", "org-%i" % i),
+            ("name", "space"),
+            ("allow_ssh", bool(i % 2)),
+            ("security_groups", ["public", "dns"]),
+            ("developers", []),
+            ("meta", {"b": 1, "a": {}})])])
+    ]) for i in range(3)]
+    self.assertSameAsPyaml("cf_orgs", records)
+    self.assertSameAsPyaml("cf_orgs", [])
+    self.assertSameAsPyaml("cf_orgs", [[]])
+
+  def test_falls_back_to_pyaml(self):
+    shared = {"name": "shared"}
+    self.assertSameAsPyaml("cf_orgs", [{"a": shared, "b": shared}])
+    self.assertSameAsPyaml("cf_orgs", [{"a": [["nested"]]}])
+    self.assertSameAsPyaml("cf_orgs", [{"description": "word " * 15}])
+
+  def test_without_header(self):
+    records = [{"name": "a"}, {"name": "b"}]
+    self.assertEqual(dump_section("cf_users", records[:1]) +
+                     dump_section("cf_users", records[1:], header=False),
+                     pyaml.dump({"cf_users": records}))